@@ -0,0 +1,89 @@
+"""
+Бенчмарк формата MQTT-сообщения платы: прежний JSON (BLData -> dict ->
+json.dumps) против бинарного кадра BLFrame, кодирование и разбор.
+Кодировщик берётся из board/models.py; пик памяти, выделенной
+за цикл кодирования, меряется через tracemalloc (на хосте, для сравнения).
+
+    python bench_payload.py [beacons] [iterations]
+"""
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import bl_frame
+import rssi_position
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "board"))
+from models import BLData, BLFrame, bl_list_to_json  # noqa: E402
+
+
+def decode_json(payload: bytes) -> list[rssi_position.StationRssi]:
+    # прежний путь mqtt_server.on_board_message
+    res = []
+    for i in json.loads(payload.decode()):
+        try:
+            res.append(rssi_position.StationRssi(i["name"], i["rssi"]))
+        except Exception:
+            pass
+    return res
+
+
+def decode_binary(payload: bytes) -> list[rssi_position.StationRssi]:
+    return [rssi_position.StationRssi(name, rssi) for name, rssi in bl_frame.decode_frame(payload)]
+
+
+def encode_json(window):
+    data = [BLData(f"beacon_{index}", rssi) for index, rssi in window]
+    data.sort(key=lambda i: i.get_index())
+    return bl_list_to_json(data).encode()
+
+
+def encode_binary(window, frame=BLFrame(32)):
+    frame.clear()
+    for index, rssi in window:
+        frame.add(index, rssi)
+    return frame.payload()
+
+
+def timed(func, args, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(*args)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def peak_bytes(func, args):
+    """Пик памяти, выделенной за один вызов"""
+    func(*args)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - base
+
+
+def main() -> None:
+    beacons = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    rng = random.Random(0)
+    window = [(i + 1, rng.randint(-95, -45)) for i in range(beacons)]
+
+    json_payload = encode_json(window)
+    binary_payload = bytes(encode_binary(window))
+    assert [(s.name, s.rssi) for s in decode_json(json_payload)] == \
+           [(s.name, s.rssi) for s in decode_binary(binary_payload)]
+
+    print(f"{beacons} beacons, {iterations} iterations")
+    print(f"{'':8s} {'bytes':>6s} {'encode us':>10s} {'peak B':>7s} {'decode us':>10s}")
+    for label, enc, dec, payload in (("json", encode_json, decode_json, json_payload),
+                                     ("binary", encode_binary, decode_binary, binary_payload)):
+        print(f"{label:8s} {len(payload):6d} {timed(enc, (window,), iterations):10.2f} "
+              f"{peak_bytes(enc, (window,)):7d} {timed(dec, (payload,), iterations):10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Бенчмарк реестра трекеров: 20 плат одновременно шлют RSSI со своим
+интервалом, каждая в своём потоке. Печатает задержку обновления по платам.
+
+    python bench_trackers.py [boards] [messages_per_board]
+"""
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+import rssi_position
+
+
+def simulate_rssi(x: float, y: float, rng: random.Random) -> dict[str, float]:
+    res = {}
+    for name, (bx, by) in rssi_position.BEACONS.items():
+        d = max(np.hypot(x - bx, y - by), 0.1)
+        rssi = rssi_position.RSSI0[name] - 10 * rssi_position.N[name] * np.log10(d)
+        res[name] = rssi + rng.gauss(0, 2.0)
+    return res
+
+
+def replay_board(board_id: str, messages: int, errors: list[float]) -> None:
+    rng = random.Random(board_id)
+    interval = rng.uniform(0.05, 0.3)
+    x, y = rng.uniform(-10, 6), rng.uniform(-4, 8)
+    now = 0.0
+    tracker = rssi_position.trackers.get(board_id)
+    for _ in range(messages):
+        now += interval * rng.uniform(0.8, 1.2)
+        x += rng.gauss(0, 0.1)
+        y += rng.gauss(0, 0.1)
+        ex, ey = tracker.locate(simulate_rssi(x, y, rng), now=now)
+        errors.append(float(np.hypot(ex - x, ey - y)))
+
+
+def main() -> None:
+    boards = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    rssi_position.load_stations()
+    if not rssi_position.BEACONS:
+        raise SystemExit(f"нет маячков в {rssi_position.STATIONS_PATH}")
+
+    errors: list[float] = []
+    threads = [
+        threading.Thread(target=replay_board, args=(f"board_{i}", messages, errors))
+        for i in range(boards)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    total = boards * messages
+    print(f"{boards} плат x {messages} сообщений: {total / elapsed:.0f} msg/s, {elapsed:.2f} s")
+    print(f"средняя ошибка: {np.mean(errors[len(errors) // 10:]):.2f} м")
+    for s in sorted(rssi_position.trackers.stats(), key=lambda s: s["board"]):
+        print(
+            f"{s['board']:>10}: {s['updates']} обн., "
+            f"mean {s['latency_mean_ms']:.2f} ms, max {s['latency_max_ms']:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Разбор бинарного кадра платы (board/models.py, BLFrame).
+
+Кадр: [FRAME_MAGIC, FRAME_VERSION, count] + count * [index, rssi (int8)].
+Имя маячка восстанавливается как beacon_<index>. JSON начинается с '[',
+поэтому по первому байту форматы не путаются.
+"""
+import struct
+from typing import Optional
+
+FRAME_MAGIC = 0xB1
+FRAME_VERSION = 1
+FRAME_HEADER = 3
+RECORD = struct.Struct("<Bb")
+
+BEACON_NAMES = [f"beacon_{i}" for i in range(256)]
+
+
+def is_frame(payload: bytes) -> bool:
+    return len(payload) >= FRAME_HEADER and payload[0] == FRAME_MAGIC
+
+
+def decode_frame(payload: bytes) -> Optional[list[tuple[str, int]]]:
+    """[(имя, rssi)] или None, если payload не бинарный кадр"""
+    if not is_frame(payload):
+        return None
+    if payload[1] != FRAME_VERSION:
+        raise ValueError(f"Неизвестная версия кадра: {payload[1]}")
+    count = payload[2]
+    end = FRAME_HEADER + RECORD.size * count
+    if len(payload) != end:
+        raise ValueError(f"Длина кадра {len(payload)}, ожидалось {end}")
+    return [(BEACON_NAMES[index], rssi)
+            for index, rssi in RECORD.iter_unpack(payload[FRAME_HEADER:end])]
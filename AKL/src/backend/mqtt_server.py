@@ -4,6 +4,7 @@ from typing import Any
 from datetime import datetime, timedelta
 import math
 
+import bl_frame
 import rssi_position
 from app_state import GlobalState, AppStates
 from data import db
@@ -29,6 +30,8 @@ class LastPoints():
 BROKER = "localhost"
 PORT = 1883
 TOPIC = "test/beacons"
+# boards may publish to TOPIC/<board_id>; bare TOPIC maps to the default board
+SUBSCRIBE_TOPIC = TOPIC + "/#"
 
 global_state = GlobalState()
 last_points = LastPoints()
@@ -36,7 +39,7 @@ last_points = LastPoints()
 
 def on_connect(client: mqtt.Client, userdata: Any, flags: dict, rc: int) -> None:
     print("Подключено к брокеру с кодом:", rc)
-    client.subscribe(TOPIC)
+    client.subscribe(SUBSCRIBE_TOPIC)
 
 
 def json_data_to_station_rssi(data) -> list[rssi_position.StationRssi]:
@@ -50,6 +53,22 @@ def json_data_to_station_rssi(data) -> list[rssi_position.StationRssi]:
     return res
 
 
+def payload_to_station_rssi(payload: bytes) -> list[rssi_position.StationRssi]:
+    """Принимает и бинарный кадр платы, и прежний JSON-список"""
+    frame = bl_frame.decode_frame(payload)
+    if frame is not None:
+        return [rssi_position.StationRssi(name, rssi) for name, rssi in frame]
+    return json_data_to_station_rssi(json.loads(payload.decode()))
+
+
+def board_id_from_topic(topic: str) -> str:
+    if topic.startswith(TOPIC + "/"):
+        board_id = topic[len(TOPIC) + 1:]
+        if board_id:
+            return board_id
+    return rssi_position.DEFAULT_BOARD
+
+
 def print_station(station: rssi_position.StationRssi):
     print(f"{station.name} = {station.rssi}")
 
@@ -73,9 +92,7 @@ def on_board_message(client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage)
     # if global_state.get_state() == AppStates.WAITING:
     #     return
     try:
-        payload_str: str = msg.payload.decode()
-        data = json.loads(payload_str)
-        stations = json_data_to_station_rssi(data)
+        stations = payload_to_station_rssi(msg.payload)
     except Exception as e:
         print("Ошибка обработки:", e)
         return
@@ -83,7 +100,9 @@ def on_board_message(client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage)
     # stations.sort(key=lambda i: i.rssi > - 70)
     # if len(stations) < 3:
     #     return
-    pos = rssi_position.get_board_pos(stations)
+    pos = rssi_position.get_board_pos(stations, board_id_from_topic(msg.topic))
+    if pos is None:
+        return
     # if not is_valid_pos(pos):
     #     return
     db_pos = db.BoardPosition(x=pos.x, y=pos.y)
@@ -1,6 +1,7 @@
 import os
 import csv
-import math
+import threading
+import time
 from dataclasses import dataclass
 from typing import Optional, List
 
@@ -28,29 +29,70 @@ N = {}
 SIGMA_RSSI = {}
 BEACONS = {}
 
+
+@dataclass(frozen=True)
+class StationTable:
+    """Parsed beacons.txt; replaced as a whole, never mutated."""
+    version: tuple
+    beacons: dict
+    rssi0: dict
+    n: dict
+    sigma_rssi: dict
+
+
+_table = StationTable(None, {}, {}, {}, {})
+_table_lock = threading.Lock()
+_bad_version: Optional[tuple] = None
+
 # -----------------------------
 # file/stations
 # -----------------------------
 def check_stations_path() -> bool:
     return os.path.exists(STATIONS_PATH)
 
+def _stations_version() -> Optional[tuple]:
+    try:
+        st = os.stat(STATIONS_PATH)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
 def load_stations() -> dict[str, Position]:
+    global _table, BEACONS, RSSI0, N, SIGMA_RSSI
+    version = _stations_version()
     stations: dict[str, Position] = {}
-    if not check_stations_path():
-        return stations
-    with open(STATIONS_PATH, newline="", encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile, delimiter=";")
-        for row in reader:
-            name = row["Name"]
-            x = float(row["X"])
-            y = float(row["Y"])
-            stations[name] = Position(x, y)
-            BEACONS[name] = (x, y)
-            RSSI0[name] = -59
-            N[name] = 2.0
-            SIGMA_RSSI[name] = 3.0
+    if version is not None:
+        with open(STATIONS_PATH, newline="", encoding="utf-8") as csvfile:
+            reader = csv.DictReader(csvfile, delimiter=";")
+            for row in reader:
+                stations[row["Name"]] = Position(float(row["X"]), float(row["Y"]))
+    table = StationTable(
+        version,
+        {name: (p.x, p.y) for name, p in stations.items()},
+        {name: -59 for name in stations},
+        {name: 2.0 for name in stations},
+        {name: 3.0 for name in stations},
+    )
+    # new dicts are swapped in, readers keep whichever table they already hold
+    _table = table
+    BEACONS, RSSI0, N, SIGMA_RSSI = table.beacons, table.rssi0, table.n, table.sigma_rssi
     return stations
 
+def stations_table() -> StationTable:
+    """Current beacon table; beacons.txt is re-read only when its mtime or size changes."""
+    global _bad_version
+    version = _stations_version()
+    if version != _table.version and version != _bad_version:
+        with _table_lock:
+            if version != _table.version and version != _bad_version:
+                try:
+                    load_stations()
+                except (OSError, ValueError, KeyError) as e:
+                    # half-written or broken file: keep the previous table until it changes again
+                    _bad_version = version
+                    print(f"не удалось прочитать {STATIONS_PATH}: {e}")
+    return _table
+
 # -----------------------------
 # distance calculations
 # -----------------------------
@@ -64,18 +106,22 @@ def var_distance_from_rssi(d: float, n: float, sigma_rssi: float) -> float:
 # -----------------------------
 # robust WLS
 # -----------------------------
-def robust_wls(rssi_dict: dict[str, float]) -> tuple[Optional[Position], Optional[np.ndarray]]:
-    stations_pos = load_stations()
+def robust_wls(rssi_dict: dict[str, float],
+               table: Optional[StationTable] = None) -> tuple[Optional[Position], Optional[np.ndarray]]:
+    if table is None:
+        table = stations_table()
     beacons = []
     dists = []
     vars_ = []
 
     for b, rssi in rssi_dict.items():
-        if b not in BEACONS:
+        pos = table.beacons.get(b)
+        if pos is None:
             continue
-        d = rssi_to_distance(rssi, RSSI0[b], N[b])
-        var_d = var_distance_from_rssi(d, N[b], SIGMA_RSSI[b])
-        beacons.append(BEACONS[b])
+        n = table.n[b]
+        d = rssi_to_distance(rssi, table.rssi0[b], n)
+        var_d = var_distance_from_rssi(d, n, table.sigma_rssi[b])
+        beacons.append(pos)
         dists.append(d)
         vars_.append(var_d)
 
@@ -97,29 +143,22 @@ def robust_wls(rssi_dict: dict[str, float]) -> tuple[Optional[Position], Optiona
 
     x = np.mean(beacons[:, 0])
     y = np.mean(beacons[:, 1])
+    w0 = 1.0 / vars_
+    H = np.diag([1.0 / np.sum(w0)] * 2)
 
     for _ in range(10):
-        A = []
-        b_vec = []
-        for (bx, by), di in zip(beacons, dists):
-            r_est = math.hypot(x - bx, y - by)
-            if r_est < 1e-6:
-                r_est = 1e-6
-            A.append([(x - bx) / r_est, (y - by) / r_est])
-            b_vec.append(di - r_est)
-
-        A = np.array(A)
-        b_vec = np.array(b_vec)
-
-        w = 1.0 / vars_
-        sigma = np.std(b_vec) if np.std(b_vec) > 1e-3 else 1.0
+        diff = np.array([x, y]) - beacons
+        r_est = np.maximum(np.hypot(diff[:, 0], diff[:, 1]), 1e-6)
+        A = diff / r_est[:, None]
+        b_vec = dists - r_est
+
+        std = np.std(b_vec)
+        sigma = std if std > 1e-3 else 1.0
         c = 1.5 * sigma
-        for i in range(len(b_vec)):
-            if abs(b_vec[i]) > c:
-                w[i] *= c / abs(b_vec[i])
+        abs_b = np.abs(b_vec)
+        w = np.where(abs_b > c, w0 * c / np.maximum(abs_b, 1e-12), w0)
 
-        W = np.diag(w)
-        AtW = A.T @ W
+        AtW = A.T * w
         H = AtW @ A
         g = AtW @ b_vec
 
@@ -150,8 +189,9 @@ class EKF:
                            [0, 1, 0, 0]])
         self.R = np.eye(2) * 2.0
 
-    def predict(self):
-        dt = self.dt
+    def predict(self, dt: Optional[float] = None):
+        if dt is None:
+            dt = self.dt
         F = np.array([
             [1, 0, dt, 0],
             [0, 1, 0, dt],
@@ -173,22 +213,123 @@ class EKF:
     def get_state(self) -> tuple[float, float]:
         return float(self.x[0, 0]), float(self.x[1, 0])
 
-ekf = EKF(dt=0.1)
+# -----------------------------
+# per-board trackers
+# -----------------------------
+DEFAULT_BOARD = "default"
+MIN_DT = 0.01
+MAX_DT = 5.0
+IDLE_TIMEOUT = 60.0
+
+
+class BoardTracker:
+    """EKF state of one board plus inter-arrival and latency bookkeeping."""
+
+    def __init__(self, board_id: str, dt: float = 0.1):
+        self.board_id = board_id
+        self.ekf = EKF(dt=dt)
+        self.last_seen: Optional[float] = None
+        self.updates = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_last = 0.0
+        self.lock = threading.Lock()
+
+    def measured_dt(self, now: float) -> float:
+        if self.last_seen is None:
+            return self.ekf.dt
+        return min(max(now - self.last_seen, MIN_DT), MAX_DT)
+
+    def locate(self, rssi_dict: dict[str, float], now: Optional[float] = None) -> tuple[float, float]:
+        started = time.perf_counter()
+        if now is None:
+            now = time.monotonic()
+        table = stations_table()
+        with self.lock:
+            self.ekf.predict(self.measured_dt(now))
+            self.last_seen = now
+            pos, cov = robust_wls(rssi_dict, table)
+            if pos is not None:
+                R = cov if cov is not None else np.eye(2) * 5.0
+                self.ekf.update(np.array([pos.x, pos.y]), R=R)
+            state = self.ekf.get_state()
+
+            elapsed = time.perf_counter() - started
+            self.updates += 1
+            self.latency_total += elapsed
+            self.latency_last = elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+        return state
+
+    def stats(self) -> dict:
+        mean = self.latency_total / self.updates if self.updates else 0.0
+        return {
+            "board": self.board_id,
+            "updates": self.updates,
+            "latency_last_ms": self.latency_last * 1000,
+            "latency_mean_ms": mean * 1000,
+            "latency_max_ms": self.latency_max * 1000,
+        }
+
+
+class TrackerRegistry:
+    """Board id -> BoardTracker, evicting boards that went silent."""
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._trackers: dict[str, BoardTracker] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def get(self, board_id: str) -> BoardTracker:
+        with self._lock:
+            tracker = self._trackers.get(board_id)
+            if tracker is None:
+                tracker = BoardTracker(board_id)
+                self._trackers[board_id] = tracker
+            return tracker
+
+    def evict_idle(self, now: Optional[float] = None) -> list[str]:
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._last_sweep = now
+            stale = [
+                board_id for board_id, tracker in self._trackers.items()
+                if tracker.last_seen is not None and now - tracker.last_seen > self.idle_timeout
+            ]
+            for board_id in stale:
+                del self._trackers[board_id]
+        return stale
+
+    def maybe_evict(self, now: Optional[float] = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_sweep >= self.idle_timeout / 2:
+            self.evict_idle(now)
+
+    def boards(self) -> list[str]:
+        with self._lock:
+            return list(self._trackers)
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            trackers = list(self._trackers.values())
+        return [t.stats() for t in trackers]
+
+
+trackers = TrackerRegistry()
 
 # -----------------------------
 # locate
 # -----------------------------
-def locate_from_rssi(rssi_dict: dict[str, float]) -> tuple[float, float]:
-    ekf.predict()
-    pos, cov = robust_wls(rssi_dict)
-    if pos is not None:
-        R = cov if cov is not None else np.eye(2) * 5.0
-        ekf.update(np.array([pos.x, pos.y]), R=R)
-    return ekf.get_state()
-
-def get_board_pos(data: List[StationRssi]) -> Optional[Position]:
+def locate_from_rssi(rssi_dict: dict[str, float], board_id: str = DEFAULT_BOARD) -> tuple[float, float]:
+    trackers.maybe_evict()
+    return trackers.get(board_id).locate(rssi_dict)
+
+def get_board_pos(data: List[StationRssi], board_id: str = DEFAULT_BOARD) -> Optional[Position]:
     if len(data) < 3:
         return None
     rssi_dict = {s.name: s.rssi for s in data}
-    x, y = locate_from_rssi(rssi_dict)
+    x, y = locate_from_rssi(rssi_dict, board_id)
     return Position(x, y)
@@ -1,12 +1,19 @@
 import time
 import bluetooth
 import network
+from array import array
 
-from models import BLData
+from models import BLFrame
 import mqtt
 
 SCAN_MS = 2000
-ATOM_SCAN_TIME = 100 
+SCAN_INTERVAL_US = 30000
+SCAN_WINDOW_US = 30000   # окно = интервал: радио слушает эфир непрерывно
+MAX_BEACONS = 32
+MAX_IGNORED = 64
+IDLE_WINDOWS = 5   # окон без пакетов, после которых слот маячка освобождается
+_IRQ_SCAN_RESULT = 5
+DEBUG = False   # печатать каждое окно (выделяет память на каждом цикле)
 
 SSID = "OnePlus"       
 PASSWORD = "1234abcd"
@@ -51,53 +58,146 @@ def decode_name(adv):
         i += 1 + length
     return None
 
-def scan_once(scan_ms=ATOM_SCAN_TIME):
-    devices = {}
-
-    def bt_irq(event, data):
-        if event == 5:  
-            addr_type, addr, adv_type, rssi, adv_data = data
-            mac = ":".join("{:02x}".format(b) for b in addr)
-            name = decode_name(adv_data) or ""
-            
-            if name.startswith("beacon_"):
-                devices[mac] = (rssi, name)
-
-    ble.irq(bt_irq)
-    ble.gap_scan(scan_ms)
-    time.sleep_ms(scan_ms + 10) 
-    return devices
-
-def find_stations():
-    res = []
-    aggregated = {}  
-    
-    iterations = int(SCAN_MS/ATOM_SCAN_TIME)
-    for _ in range(iterations):
-        found = scan_once()
-        for mac, (rssi, name) in found.items():
-            if mac not in aggregated:
-                aggregated[mac] = [0, 0, name]
-            aggregated[mac][0] += rssi
-            aggregated[mac][1] += 1
-    
-    for mac, (rssi_sum, count, name) in aggregated.items():
-        avg_rssi = rssi_sum // count
-        res.append(BLData(name, avg_rssi))      
-    return res
+class BeaconAccumulator:
+    """
+    Один непрерывный gap_scan на всё время работы. IRQ складывает RSSI в
+    заранее выделенные массивы сумм/счётчиков по слоту маячка; слот
+    ищется по сырым байтам адреса, имя декодируется только при первой
+    встрече адреса. Массивов два: главный цикл переключает активный и
+    читает окно из второго, пока IRQ пишет в первый.
+
+    Слот адреса, от которого idle_windows окон подряд не было пакетов,
+    освобождается и достаётся следующему новому маячку, поэтому смена
+    маячков (или их адресов) не исчерпывает max_beacons до перезагрузки.
+    """
+
+    def __init__(self, max_beacons=MAX_BEACONS, idle_windows=IDLE_WINDOWS):
+        self.max_beacons = max_beacons
+        self.idle_windows = idle_windows
+        self.slots = {}      # адрес (bytes) -> номер слота
+        self.keys = [None] * max_beacons   # адрес по слоту, None - слот свободен
+        self.free = []       # освобождённые слоты
+        self.used = 0        # слоты [0, used) уже выдавались
+        self.indices = array("B", bytes(max_beacons))  # N из beacon_N по слоту
+        self.idle = array("B", bytes(max_beacons))     # окон подряд без пакетов
+        self.ignored = {}    # адреса не-маячков, чтобы не декодировать их снова
+        self.sums = (array("i", bytes(4 * max_beacons)), array("i", bytes(4 * max_beacons)))
+        self.counts = (array("H", bytes(2 * max_beacons)), array("H", bytes(2 * max_beacons)))
+        self.active = 0
+
+    def irq(self, event, data):
+        if event != _IRQ_SCAN_RESULT:
+            return
+        addr_type, addr, adv_type, rssi, adv_data = data
+        key = bytes(addr)
+        slot = self.slots.get(key)
+        if slot is None:
+            if key in self.ignored:
+                return
+            slot = self._register(key, adv_data)
+            if slot is None:
+                return
+        i = self.active
+        self.sums[i][slot] += rssi
+        self.counts[i][slot] += 1
+
+    def _register(self, key, adv_data):
+        name = decode_name(adv_data) or ""
+        index = beacon_index(name)
+        if index is None:
+            if len(self.ignored) >= MAX_IGNORED:
+                self.ignored.clear()
+            self.ignored[key] = True
+            return None
+        if self.free:
+            slot = self.free.pop()
+        elif self.used < self.max_beacons:
+            slot = self.used
+            self.used += 1
+        else:
+            # все слоты заняты: маячок не запоминаем в ignored, он получит
+            # слот, когда освободится чей-нибудь
+            return None
+        # пакет, пришедший в слот между проверкой и освобождением, не должен
+        # попасть в окно нового маячка
+        for i in (0, 1):
+            self.sums[i][slot] = 0
+            self.counts[i][slot] = 0
+        self.keys[slot] = key
+        self.indices[slot] = index
+        self.idle[slot] = 0
+        self.slots[key] = slot
+        return slot
+
+    def take_window(self, frame: BLFrame):
+        """Переключает буферы и записывает средние за прошедшее окно в frame"""
+        i = self.active
+        self.active = 1 - i
+        sums, counts = self.sums[i], self.counts[i]
+        frame.clear()
+        for slot in range(self.used):
+            key = self.keys[slot]
+            if key is None:
+                continue
+            if counts[slot]:
+                frame.add(self.indices[slot], sums[slot] // counts[slot])
+                sums[slot] = 0
+                counts[slot] = 0
+                self.idle[slot] = 0
+                continue
+            idle = self.idle[slot] + 1
+            if idle >= self.idle_windows and not self.counts[self.active][slot]:
+                # маячок пропал: слот отдаём новым адресам
+                del self.slots[key]
+                self.keys[slot] = None
+                self.free.append(slot)
+            else:
+                self.idle[slot] = idle
+
+
+def start_scan(acc):
+    ble.irq(acc.irq)
+    # duration 0 - сканировать без остановки
+    ble.gap_scan(0, SCAN_INTERVAL_US, SCAN_WINDOW_US)
+
+
+def beacon_index(name):
+    """N из имени beacon_N, None для прочих устройств"""
+    if not name.startswith("beacon_"):
+        return None
+    try:
+        index = int(name[7:])
+    except ValueError:
+        return None
+    return index if 0 <= index <= 255 else None
+
+
+def find_stations(acc, frame, deadline):
+    """Ждёт конца окна и записывает агрегированные данные за него в frame"""
+    delay = time.ticks_diff(deadline, time.ticks_ms())
+    if delay > 0:
+        time.sleep_ms(delay)
+    acc.take_window(frame)
 
 ble = bluetooth.BLE()
 ble.active(True)
 connect_wifi()
 mqtt.mqtt_connect()
 
-while True:
-    res: list[BLData] = find_stations()
-    res.sort(key=lambda i: i.get_index())
-    print(res)
-            
-    mqtt.mqtt_send_bldata(res)
-
-
-
+accumulator = BeaconAccumulator()
+frame = BLFrame(MAX_BEACONS)
+start_scan(accumulator)
+deadline = time.ticks_add(time.ticks_ms(), SCAN_MS)
 
+while True:
+    find_stations(accumulator, frame, deadline)
+    # следующее окно отсчитывается от предыдущего дедлайна, а не от конца
+    # отправки, чтобы период публикации не уплывал
+    deadline = time.ticks_add(deadline, SCAN_MS)
+    if time.ticks_diff(deadline, time.ticks_ms()) < 0:
+        # отправка заняла больше окна - начинаем отсчёт заново
+        deadline = time.ticks_add(time.ticks_ms(), SCAN_MS)
+    if DEBUG:
+        print(frame.to_bldata())
+
+    mqtt.mqtt_send_frame(frame)
@@ -1,4 +1,12 @@
-import ujson as json
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+# Бинарный кадр: [FRAME_MAGIC, FRAME_VERSION, count] + count * [index, rssi (int8)]
+FRAME_MAGIC = 0xB1
+FRAME_VERSION = 1
+FRAME_HEADER = 3
 
 class BLData():
     def __init__(self, name: str, rssi: int):
@@ -20,4 +28,40 @@ def bl_list_to_json(data: list[BLData]) -> str:
         dict_data.append(i.to_dict())
     res = json.dumps(dict_data)
     return res
-    
+
+
+class BLFrame():
+    """
+    Кадр для MQTT в заранее выделенном буфере: на каждый маячок два байта
+    (номер из имени beacon_N и RSSI), без объектов, словарей и JSON.
+    """
+    def __init__(self, max_beacons: int):
+        self.max_beacons = max_beacons
+        self.buf = bytearray(FRAME_HEADER + 2 * max_beacons)
+        self.buf[0] = FRAME_MAGIC
+        self.buf[1] = FRAME_VERSION
+        self.view = memoryview(self.buf)
+        self.count = 0
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, index: int, rssi: int):
+        if self.count >= self.max_beacons:
+            return
+        o = FRAME_HEADER + 2 * self.count
+        self.buf[o] = index
+        self.buf[o + 1] = rssi & 0xFF
+        self.count += 1
+
+    def payload(self):
+        self.buf[2] = self.count
+        return self.view[:FRAME_HEADER + 2 * self.count]
+
+    def to_bldata(self) -> list[BLData]:
+        res = []
+        for k in range(self.count):
+            o = FRAME_HEADER + 2 * k
+            rssi = self.buf[o + 1]
+            res.append(BLData("beacon_" + str(self.buf[o]), rssi - 256 if rssi > 127 else rssi))
+        return res
@@ -1,10 +1,12 @@
-from models import BLData, bl_list_to_json
+from models import BLData, BLFrame, bl_list_to_json
 from umqtt.simple import MQTTClient
 import ujson
 MQTT_BROKER = "5.35.88.189"   # публичный брокер
 MQTT_PORT   = 1883
 CLIENT_ID   = "esp32_micropython"
 TOPIC       = "test/beacons"
+# "binary" - компактный кадр BLFrame, "json" - прежний список {"name", "rssi"}
+PAYLOAD_FORMAT = "binary"
 
 client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
 
@@ -28,6 +30,12 @@ def mqtt_send_bldata(data: list[BLData]):
 
     client.publish(TOPIC, json_res)
     #print("Отправлено:", json_res)
+
+def mqtt_send_frame(frame: BLFrame):
+    if PAYLOAD_FORMAT == "json":
+        mqtt_send_bldata(frame.to_bldata())
+        return
+    client.publish(TOPIC, frame.payload())
     
 def connect_mqtt():
     client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT)
@@ -0,0 +1,82 @@
+"""
+Общий кэш калибровки alpha/beta для AdvancedPositioningEngine.
+
+Калибровка зависит только от карты, набора маяков (имена и координаты),
+базовой точки устройства и калибровочных измерений, поэтому устройства
+на одной карте с одной базовой точкой получают готовый результат, а не
+пересчитывают его для каждого нового MAC. Кэш сохраняется в JSON
+(CALIBRATION_CACHE_PATH) и подхватывается при перезапуске.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Tuple
+
+from app.advanced_positioning import AdvancedPositioningEngine
+
+CALIBRATION_CACHE_PATH = os.getenv("CALIBRATION_CACHE_PATH", "calibration_cache.json")
+
+
+def beacons_hash(beacons: Dict[str, Tuple[float, float]]) -> str:
+    """Хэш набора маяков, не зависящий от порядка"""
+    items = sorted((name, round(float(x), 4), round(float(y), 4)) for name, (x, y) in beacons.items())
+    return hashlib.sha1(json.dumps(items).encode("utf-8")).hexdigest()
+
+
+class CalibrationCache:
+    def __init__(self, path: str = CALIBRATION_CACHE_PATH):
+        self.path = path
+        self._entries: Dict[str, Tuple[float, float]] = {}
+        self._measurements = hashlib.sha1(json.dumps(
+            AdvancedPositioningEngine.CALIBRATION_MEASUREMENTS, sort_keys=True
+        ).encode("utf-8")).hexdigest()[:12]
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def key(self, map_id: int, beacons: Dict[str, Tuple[float, float]],
+            base_point: Tuple[float, float]) -> str:
+        bx, by = base_point
+        return f"{map_id}:{beacons_hash(beacons)}:{float(bx):.4f},{float(by):.4f}:{self._measurements}"
+
+    def calibrate(self, engine: AdvancedPositioningEngine, map_id: int,
+                  beacons: Dict[str, Tuple[float, float]]) -> bool:
+        """
+        Выставляет engine.alpha/beta из кэша либо калибрует и запоминает.
+        Возвращает True, если результат взят из кэша.
+        """
+        key = self.key(map_id, beacons, engine.known_calibration_point)
+        cached = self._entries.get(key)
+        if cached is not None:
+            engine.alpha, engine.beta = cached
+            self.hits += 1
+            return True
+
+        engine.calibrate(beacons)
+        self._entries[key] = (engine.alpha, engine.beta)
+        self.misses += 1
+        self.save()
+        return False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries = {k: (float(v[0]), float(v[1])) for k, v in data.items()}
+        except (OSError, ValueError, TypeError, IndexError) as e:
+            print(f"[calibration_cache] failed to load {self.path}: {e}")
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({k: list(v) for k, v in self._entries.items()}, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[calibration_cache] failed to save {self.path}: {e}")
+
+
+calibration_cache = CalibrationCache()
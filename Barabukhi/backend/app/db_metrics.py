@@ -0,0 +1,194 @@
+"""
+Метрики SQL вместо echo=True.
+
+События движка before/after_cursor_execute замеряют каждый запрос и
+относят его к текущему эндпоинту (contextvar, который выставляет
+DBMetricsMiddleware). По эндпоинтам копятся: число запросов к API,
+число SQL-запросов, суммарное время в БД и гистограммы; отдельно
+хранятся самые медленные запросы. Всё в памяти, отдаётся на /metrics/db.
+
+Подробный лог SQL включается по требованию: SQL_ECHO=1 при старте или
+POST /metrics/db/echo во время работы.
+"""
+
+import heapq
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Границы корзин гистограмм, мс
+TIME_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+# Границы корзин по числу SQL-запросов на один запрос к API
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+SLOWEST_SIZE = 20
+STATEMENT_PREVIEW = 300
+NO_ENDPOINT = "-"  # запросы вне HTTP/WS (старт, фоновые задачи)
+UNMATCHED_PATH = "<unmatched>"  # ни один маршрут не подошёл (404, сканеры)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+
+    def add(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+
+    def to_dict(self) -> Dict[str, int]:
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return dict(zip(labels, self.counts))
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.db_time = 0.0
+        self.statement_ms = Histogram(TIME_BUCKETS_MS)
+        self.request_db_ms = Histogram(TIME_BUCKETS_MS)
+        self.statements_per_request = Histogram(COUNT_BUCKETS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "statements": self.statements,
+            "db_time_ms": round(self.db_time * 1e3, 3),
+            "avg_statements": round(self.statements / self.requests, 2) if self.requests else None,
+            "avg_db_ms": round(self.db_time * 1e3 / self.requests, 3) if self.requests else None,
+            "statement_ms": self.statement_ms.to_dict(),
+            "request_db_ms": self.request_db_ms.to_dict(),
+            "statements_per_request": self.statements_per_request.to_dict(),
+        }
+
+
+class RequestStats:
+    """Счётчики одного запроса к API; эндпоинт известен после роутинга"""
+
+    __slots__ = ("endpoint", "statements", "db_time", "statement_ms")
+
+    def __init__(self):
+        self.endpoint = NO_ENDPOINT
+        self.statements = 0
+        self.db_time = 0.0
+        self.statement_ms = Histogram(TIME_BUCKETS_MS)
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("db_metrics_request", default=None)
+
+
+class DBMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self._slowest: List[tuple] = []  # min-heap (duration, seq, RequestStats, statement)
+        self._seq = 0
+
+    def reset(self):
+        self.__init__()
+
+    def endpoint(self, name: str) -> EndpointStats:
+        stats = self.endpoints.get(name)
+        if stats is None:
+            stats = self.endpoints[name] = EndpointStats()
+        return stats
+
+    def record_statement(self, statement: str, duration: float):
+        req = current_request.get()
+        if req is None:
+            # вне запроса к API - сразу в общий счётчик
+            stats = self.endpoint(NO_ENDPOINT)
+            stats.statements += 1
+            stats.db_time += duration
+            stats.statement_ms.add(duration * 1e3)
+        else:
+            req.statements += 1
+            req.db_time += duration
+            req.statement_ms.add(duration * 1e3)
+
+        # req.endpoint станет известен к концу запроса, поэтому храним сам req
+        self._seq += 1
+        item = (duration, self._seq, req, statement[:STATEMENT_PREVIEW])
+        if len(self._slowest) < SLOWEST_SIZE:
+            heapq.heappush(self._slowest, item)
+        elif duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def finish_request(self, req: RequestStats):
+        stats = self.endpoint(req.endpoint)
+        stats.requests += 1
+        stats.statements += req.statements
+        stats.db_time += req.db_time
+        stats.request_db_ms.add(req.db_time * 1e3)
+        stats.statements_per_request.add(req.statements)
+        for i, c in enumerate(req.statement_ms.counts):
+            stats.statement_ms.counts[i] += c
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        return [
+            {"duration_ms": round(d * 1e3, 3),
+             "endpoint": req.endpoint if req is not None else NO_ENDPOINT,
+             "statement": st}
+            for d, _, req, st in sorted(self._slowest, key=lambda item: item[:2], reverse=True)
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "since": self.started_at,
+            "endpoints": {name: s.to_dict() for name, s in sorted(self.endpoints.items())},
+            "slowest": self.slowest(),
+        }
+
+
+db_metrics = DBMetrics()
+
+
+def instrument_engine(engine: Engine, metrics: DBMetrics = db_metrics):
+    """Вешает замеры на sync-движок (для AsyncEngine - engine.sync_engine)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("db_metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["db_metrics_start"].pop()
+        metrics.record_statement(statement, time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("db_metrics_start"):
+            conn.info["db_metrics_start"].pop()
+
+
+class DBMetricsMiddleware:
+    """
+    ASGI middleware: заводит RequestStats на каждый HTTP/WS запрос и после
+    ответа сводит их в метрики эндпоинта (шаблон пути из роутера).
+    """
+
+    def __init__(self, app, metrics: DBMetrics = db_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        req = RequestStats()
+        token = current_request.set(req)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            # сырой URL в ключ не берём: число эндпоинтов в метриках ограничено
+            # числом маршрутов
+            path = getattr(route, "path", None) or UNMATCHED_PATH
+            req.endpoint = f"{scope.get('method', 'WS')} {path}"
+            self.metrics.finish_request(req)
@@ -0,0 +1,147 @@
+"""
+Кэш необработанных изменений устройств (map / freq / status).
+
+Триггер track_device_changes пишет строки в device_changes, а триггер из
+миграции 004 отправляет pg_notify в канал device_changes. Слушатель держит
+отдельное asyncpg-соединение с LISTEN и складывает изменения в память,
+поэтому /ping и /send_signal узнают об изменениях без запроса в БД.
+Пока слушатель не подключён или в базе нет триггера (миграция 004 не
+применена), listening = False и эндпоинты читают таблицу как раньше.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Set
+
+import asyncpg
+
+from app.database import DATABASE_URL
+
+CHANNEL = "device_changes"
+TRIGGER = "notify_device_change_trigger"
+RECONNECT_DELAY = 5.0  # секунд между попытками переподключения
+TRIGGER_RECHECK_DELAY = 60.0  # секунд между проверками, не появился ли триггер
+
+TRIGGER_EXISTS_SQL = """
+    SELECT EXISTS (
+        SELECT 1 FROM pg_trigger
+        WHERE tgname = $1
+          AND tgrelid = to_regclass('device_changes')
+          AND NOT tgisinternal
+    )
+"""
+
+
+class DeviceChangeCache:
+    """device_id -> множество типов изменений, ещё не отданных устройству"""
+
+    def __init__(self):
+        self._pending: Dict[int, Set[str]] = {}
+        self._mac_ids: Dict[str, int] = {}
+        self.listening = False
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[asyncpg.Connection] = None
+
+    # ---- MAC -> device_id ----
+
+    def device_id(self, mac: str) -> Optional[int]:
+        return self._mac_ids.get(mac)
+
+    def remember(self, mac: str, device_id: int):
+        self._mac_ids[mac] = device_id
+
+    def forget_device(self, device_id: int):
+        """Устройство удалено: убираем его MAC и изменения"""
+        self._pending.pop(device_id, None)
+        for mac in [m for m, d in self._mac_ids.items() if d == device_id]:
+            del self._mac_ids[mac]
+
+    # ---- изменения ----
+
+    def push(self, device_id: int, change_type: str):
+        self._pending.setdefault(device_id, set()).add(change_type)
+
+    def peek(self, device_id: int) -> List[str]:
+        """Изменения устройства (отсортированный список, как в /ping), без удаления"""
+        changes = self._pending.get(device_id)
+        return sorted(changes) if changes else []
+
+    def ack(self, device_id: int, change_list: List[str]):
+        """
+        Изменения отданы устройству и commit прошёл: убираем их из памяти.
+        До этого они остаются, как строки с is_notified = false в БД,
+        и при ошибке будут отданы повторно.
+        """
+        changes = self._pending.get(device_id)
+        if changes is None:
+            return
+        changes.difference_update(change_list)
+        if not changes:
+            del self._pending[device_id]
+
+    def _on_notify(self, conn, pid, channel, payload: str):
+        # payload: "<device_id>:<change_type>"
+        device_id, _, change_type = payload.partition(":")
+        try:
+            self.push(int(device_id), change_type)
+        except ValueError:
+            print(f"[device_changes] bad payload: {payload!r}")
+
+    # ---- слушатель ----
+
+    async def start(self, dsn: str = DATABASE_URL):
+        if self._task is None:
+            dsn = dsn.replace("postgresql+asyncpg://", "postgresql://")
+            self._task = asyncio.create_task(self._listen(dsn))
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+        self.listening = False
+
+    async def _listen(self, dsn: str):
+        while True:
+            try:
+                self._conn = conn = await asyncpg.connect(dsn)
+                if not await conn.fetchval(TRIGGER_EXISTS_SQL, TRIGGER):
+                    # без триггера NOTIFY не придёт ни разу: остаёмся на чтении таблицы
+                    print(f"[device_changes] trigger {TRIGGER} not found "
+                          f"(migration 004 not applied), reading the table instead")
+                    await conn.close()
+                    await asyncio.sleep(TRIGGER_RECHECK_DELAY)
+                    continue
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda c: lost.set())
+                self._pending.clear()
+                await conn.add_listener(CHANNEL, self._on_notify)
+
+                # LISTEN уже включён, поэтому уведомления не теряются:
+                # догружаем то, что накопилось, пока слушателя не было
+                rows = await conn.fetch("""
+                    SELECT DISTINCT device_id, change_type
+                    FROM device_changes
+                    WHERE is_notified = false
+                """)
+                for row in rows:
+                    self.push(row["device_id"], row["change_type"])
+
+                self.listening = True
+                print(f"[device_changes] listening on '{CHANNEL}'")
+                await lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[device_changes] listener error: {e}")
+            finally:
+                self.listening = False
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+device_changes = DeviceChangeCache()
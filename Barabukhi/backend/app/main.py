@@ -1,12 +1,18 @@
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from typing import List
+from datetime import datetime, timedelta
+from typing import List, Optional
+import numpy as np
 import time
 import json
 
-from app.database import get_db
+from app.database import get_db, engine
+from app.db_metrics import db_metrics, DBMetricsMiddleware
+from app.device_changes import device_changes
+from app.map_snapshot import map_snapshot
+from app.path_simplify import douglas_peucker
 from app.models import (
     # Device API models (BLE devices)
     MacRequest, FreqResponse, StatusRoadResponse, MapResponse,
@@ -21,6 +27,7 @@ from app.models import (
 )
 from app.positioning import PositioningEngine, BeaconData
 from app.advanced_positioning import AdvancedPositioningEngine
+from app.calibration_cache import calibration_cache
 
 # Словарь движков позиционирования для каждого устройства (по MAC адресу)
 advanced_engines: dict = {}
@@ -41,6 +48,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Учёт SQL-запросов по эндпоинтам (/metrics/db)
+app.add_middleware(DBMetricsMiddleware)
+
+
+@app.on_event("startup")
+async def startup():
+    # LISTEN device_changes: изменения устройств приходят push-ем
+    await device_changes.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await device_changes.stop()
+
 
 @app.get("/")
 async def root():
@@ -66,48 +87,109 @@ async def health_check(db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=503, detail=f"Database connection failed: {str(e)}")
 
 
+@app.get("/metrics/db")
+async def get_db_metrics():
+    """Число SQL-запросов, время в БД и самые медленные запросы по эндпоинтам"""
+    data = db_metrics.to_dict()
+    data["sql_echo"] = bool(engine.echo)
+    return data
+
+
+@app.post("/metrics/db/reset")
+async def reset_db_metrics():
+    db_metrics.reset()
+    return {"status": "reset"}
+
+
+@app.post("/metrics/db/echo")
+async def set_sql_echo(enabled: bool = True):
+    """Включить/выключить подробный лог SQL без перезапуска"""
+    engine.echo = enabled
+    return {"sql_echo": enabled}
+
+
 # ==================== HELPER FUNCTIONS ====================
 
 async def get_or_create_device(mac: str, db: AsyncSession) -> int:
     """
     Получить или создать устройство по MAC адресу.
     Возвращает device_id.
-    """
-    # Проверяем существование устройства
-    result = await db.execute(
-        text("SELECT id FROM devices WHERE mac = :mac"),
-        {"mac": mac}
-    )
-    device = result.first()
 
-    if device:
-        return device.id
+    Известные MAC берутся из памяти (device_changes), иначе один запрос:
+    INSERT ... ON CONFLICT DO NOTHING, а если устройство уже есть - его id.
+    """
+    device_id = device_changes.device_id(mac)
+    if device_id is not None:
+        return device_id
 
     # Создаём устройство с дефолтными настройками
     # Привязываем к дефолтной карте если она есть
-    map_result = await db.execute(
-        text("SELECT id FROM maps ORDER BY id LIMIT 1")
-    )
-    map_data = map_result.first()
-    map_id = map_data.id if map_data else None
-
-    insert_result = await db.execute(
-        text("""
+    params = {
+        "name": f"Device_{mac}",
+        "mac": mac,
+        "poll_frequency": 1.0,
+        "write_road": False,
+        "color": "#3b82f6"
+    }
+    upsert_sql = text("""
+        WITH ins AS (
             INSERT INTO devices (name, mac, map_id, poll_frequency, write_road, color)
-            VALUES (:name, :mac, :map_id, :poll_frequency, :write_road, :color)
+            VALUES (:name, :mac, (SELECT id FROM maps ORDER BY id LIMIT 1),
+                    :poll_frequency, :write_road, :color)
+            ON CONFLICT (mac) DO NOTHING
             RETURNING id
+        )
+        SELECT id, true AS inserted FROM ins
+        UNION ALL
+        SELECT id, false AS inserted FROM devices WHERE mac = :mac
+        LIMIT 1
+    """)
+    row = (await db.execute(upsert_sql, params)).first()
+    if row is None:
+        # устройство вставили параллельно и оно не видно в снимке запроса - повторяем
+        row = (await db.execute(upsert_sql, params)).first()
+
+    if row.inserted:
+        await db.commit()
+    device_changes.remember(mac, row.id)
+    return row.id
+
+
+async def pop_device_changes(device_id: int, db: AsyncSession) -> List[str]:
+    """
+    Забрать необработанные изменения устройства и пометить их отправленными.
+    Если слушатель LISTEN работает, список берётся из памяти и при отсутствии
+    изменений в БД не ходим. Commit делает вызывающий, после успешного
+    commit - device_changes.ack(device_id, change_list): при ошибке изменения
+    остаются в памяти, как и непомеченные строки в БД.
+    """
+    if device_changes.listening:
+        change_list = device_changes.peek(device_id)
+    else:
+        changes_result = await db.execute(
+            text("""
+                SELECT DISTINCT change_type
+                FROM device_changes
+                WHERE device_id = :device_id AND is_notified = false
+                ORDER BY change_type
+            """),
+            {"device_id": device_id}
+        )
+        change_list = [row.change_type for row in changes_result.fetchall()]
+
+    if not change_list:
+        return []
+
+    # Помечаем все изменения как отправленные
+    await db.execute(
+        text("""
+            UPDATE device_changes
+            SET is_notified = true
+            WHERE device_id = :device_id AND is_notified = false
         """),
-        {
-            "name": f"Device_{mac}",
-            "mac": mac,
-            "map_id": map_id,
-            "poll_frequency": 1.0,
-            "write_road": False,
-            "color": "#3b82f6"
-        }
+        {"device_id": device_id}
     )
-    await db.commit()
-    return insert_result.scalar()
+    return change_list
 
 
 # ==================== DEVICE API (BLE устройства) ====================
@@ -197,35 +279,12 @@ async def ping(request: MacRequest, db: AsyncSession = Depends(get_db)):
     # Автоматически создаём устройство если не существует
     device_id = await get_or_create_device(request.mac, db)
 
-    # Получаем необработанные изменения для устройства
-    changes_result = await db.execute(
-        text("""
-            SELECT DISTINCT change_type
-            FROM device_changes
-            WHERE device_id = :device_id AND is_notified = false
-            ORDER BY change_type
-        """),
-        {"device_id": device_id}
-    )
-    changes = changes_result.fetchall()
-
-    if not changes:
+    change_list = await pop_device_changes(device_id, db)
+    if not change_list:
         return PingResponse(change=False, change_list=[])
 
-    # Формируем список изменений
-    change_list = [row.change_type for row in changes]
-
-    # Помечаем все изменения как отправленные
-    await db.execute(
-        text("""
-            UPDATE device_changes
-            SET is_notified = true
-            WHERE device_id = :device_id AND is_notified = false
-        """),
-        {"device_id": device_id}
-    )
     await db.commit()
-
+    device_changes.ack(device_id, change_list)
     return PingResponse(change=True, change_list=change_list)
 
 
@@ -283,6 +342,8 @@ async def set_map_to_device(request: SetMapToDeviceRequest, db: AsyncSession = D
         )
 
     await db.commit()
+    if not map_data:
+        map_snapshot.invalidate()
     return SetMapToDeviceResponse(success=True)
 
 
@@ -379,6 +440,7 @@ async def add_map(request: AddMapRequest, db: AsyncSession = Depends(get_db)):
         )
 
     await db.commit()
+    map_snapshot.invalidate()
     return AddMapResponse(success=True, map_id=map_id)
 
 
@@ -390,13 +452,6 @@ async def send_signal(request: SendSignalRequest, db: AsyncSession = Depends(get
     """
     global advanced_engines, engines_calibrated
 
-    # Получаем или создаём устройство
-    result = await db.execute(
-        text("SELECT id, map_id, write_road, current_road_session_id, base_x, base_y FROM devices WHERE mac = :mac"),
-        {"mac": request.mac}
-    )
-    device = result.first()
-
     # Получаем или создаём карту
     map_result = await db.execute(
         text("SELECT id FROM maps WHERE name = :map_name"),
@@ -405,31 +460,53 @@ async def send_signal(request: SendSignalRequest, db: AsyncSession = Depends(get
     map_data = map_result.first()
 
     if not map_data:
-        # Создаём карту если не существует
+        # Создаём карту если не существует; если её вставили параллельно,
+        # ON CONFLICT дождётся той транзакции и id берём повторным SELECT
         map_insert = await db.execute(
-            text("INSERT INTO maps (name) VALUES (:map_name) RETURNING id"),
+            text("INSERT INTO maps (name) VALUES (:map_name) ON CONFLICT (name) DO NOTHING RETURNING id"),
             {"map_name": request.map}
         )
         map_id = map_insert.scalar()
+        if map_id is None:
+            map_id = (await db.execute(
+                text("SELECT id FROM maps WHERE name = :map_name"),
+                {"map_name": request.map}
+            )).scalar()
     else:
         map_id = map_data.id
 
-    if not device:
-        # Создаём устройство если не существует
-        device_insert = await db.execute(
+    # Получаем или создаём устройство. Известный MAC - выборка по первичному
+    # ключу, иначе один upsert: параллельные первые запросы не падают на
+    # UNIQUE (mac), а road_session создаёт только тот, кто реально вставил строку
+    device = None
+    device_id = device_changes.device_id(request.mac)
+    if device_id is not None:
+        device = (await db.execute(
+            text("""
+                SELECT id, write_road, current_road_session_id, base_x, base_y, false AS inserted
+                FROM devices WHERE id = :device_id
+            """),
+            {"device_id": device_id}
+        )).first()
+    if device is None:
+        device = (await db.execute(
             text("""
                 INSERT INTO devices (name, mac, map_id, write_road)
                 VALUES (:name, :mac, :map_id, :write_road)
-                RETURNING id, base_x, base_y
+                ON CONFLICT (mac) DO UPDATE SET mac = EXCLUDED.mac
+                RETURNING id, write_road, current_road_session_id, base_x, base_y,
+                          (xmax = 0) AS inserted
             """),
             {"name": f"Device_{request.mac}", "mac": request.mac, "map_id": map_id, "write_road": True}
-        )
-        device_data = device_insert.first()
-        device_id = device_data.id
-        base_x = float(device_data.base_x)
-        base_y = float(device_data.base_y)
-        write_road = True
+        )).first()
 
+    device_id = device.id
+    write_road = device.write_road
+    road_session_id = device.current_road_session_id
+    base_x = float(device.base_x)
+    base_y = float(device.base_y)
+
+    if device.inserted:
         # Создаём road_session для нового устройства
         session_name = f"road_{int(time.time())}"
         session_result = await db.execute(
@@ -449,12 +526,6 @@ async def send_signal(request: SendSignalRequest, db: AsyncSession = Depends(get
         )
 
         await db.commit()
-    else:
-        device_id = device.id
-        write_road = device.write_road
-        road_session_id = device.current_road_session_id
-        base_x = float(device.base_x)
-        base_y = float(device.base_y)
 
     # Получаем или создаём движок для этого устройства
     if request.mac not in advanced_engines:
@@ -494,11 +565,13 @@ async def send_signal(request: SendSignalRequest, db: AsyncSession = Depends(get
         for row in beacons_data
     }
 
-    # Калибруем продвинутый движок при первом запросе для этого устройства
+    # Калибруем продвинутый движок при первом запросе для этого устройства;
+    # результат общий для устройств с той же картой, маяками и базовой точкой
     if not engines_calibrated.get(request.mac, False) and beacons_map_tuples:
-        advanced_engine.calibrate(beacons_map_tuples)
+        cached = calibration_cache.calibrate(advanced_engine, map_id, beacons_map_tuples)
         engines_calibrated[request.mac] = True
-        print(f"[Calibration for {request.mac}] alpha={advanced_engine.alpha:.3f}, beta={advanced_engine.beta:.3f}")
+        print(f"[Calibration for {request.mac}] alpha={advanced_engine.alpha:.3f}, "
+              f"beta={advanced_engine.beta:.3f}{' (cached)' if cached else ''}")
 
     # Формируем данные для calculate_position_with_samples
     # report_data: {beacon_name: {'rssi': value, 'samples': count}}
@@ -548,9 +621,16 @@ async def send_signal(request: SendSignalRequest, db: AsyncSession = Depends(get
             "timestamp": time.time()
         })
 
+    # Изменения устройства отдаём в ответе, отдельный /ping не нужен
+    device_changes.remember(request.mac, device_id)
+    change_list = await pop_device_changes(device_id, db)
+
     # Commit должен быть всегда, чтобы сохранить измерения сигналов
     await db.commit()
-    return SendSignalResponse(accept=True)
+    device_changes.ack(device_id, change_list)
+    if not map_data:
+        map_snapshot.invalidate()
+    return SendSignalResponse(accept=True, change=bool(change_list), change_list=change_list)
 
 
 # ==================== WEBSOCKET API ====================
@@ -639,38 +719,7 @@ async def websocket_endpoint(websocket: WebSocket, db: AsyncSession = Depends(ge
 
                 # Обработка запроса get_list_map
                 elif msg_type == "get_list_map":
-                    maps_result = await db.execute(
-                        text("SELECT id, name, created_at FROM maps ORDER BY created_at DESC")
-                    )
-                    maps = maps_result.fetchall()
-
-                    maps_list = []
-                    for map_row in maps:
-                        # Получаем маяки для каждой карты
-                        beacons_result = await db.execute(
-                            text("""
-                                SELECT id, name, x_coordinate, y_coordinate
-                                FROM beacons
-                                WHERE map_id = :map_id
-                                ORDER BY id
-                            """),
-                            {"map_id": map_row.id}
-                        )
-                        beacons = [
-                            {
-                                "id": b.id,
-                                "name": b.name,
-                                "x": float(b.x_coordinate),
-                                "y": float(b.y_coordinate)
-                            }
-                            for b in beacons_result.fetchall()
-                        ]
-
-                        maps_list.append({
-                            "id": map_row.id,
-                            "name": map_row.name,
-                            "beacons": beacons
-                        })
+                    maps_list = await map_snapshot.ws_maps(db)
 
                     await websocket.send_text(json.dumps({
                         "type": "list_map",
@@ -728,39 +777,10 @@ async def websocket_endpoint(websocket: WebSocket, db: AsyncSession = Depends(ge
                         )
 
                     await db.commit()
+                    map_snapshot.invalidate()
 
                     # Отправляем обновлённый список карт всем клиентам
-                    maps_result = await db.execute(
-                        text("SELECT id, name, created_at FROM maps ORDER BY created_at DESC")
-                    )
-                    maps = maps_result.fetchall()
-
-                    maps_list = []
-                    for map_row in maps:
-                        beacons_result = await db.execute(
-                            text("""
-                                SELECT id, name, x_coordinate, y_coordinate
-                                FROM beacons
-                                WHERE map_id = :map_id
-                                ORDER BY id
-                            """),
-                            {"map_id": map_row.id}
-                        )
-                        beacons_data = [
-                            {
-                                "id": b.id,
-                                "name": b.name,
-                                "x": float(b.x_coordinate),
-                                "y": float(b.y_coordinate)
-                            }
-                            for b in beacons_result.fetchall()
-                        ]
-
-                        maps_list.append({
-                            "id": map_row.id,
-                            "name": map_row.name,
-                            "beacons": beacons_data
-                        })
+                    maps_list = await map_snapshot.ws_maps(db)
 
                     await websocket.send_text(json.dumps({
                         "type": "list_map",
@@ -1207,44 +1227,27 @@ async def websocket_endpoint(websocket: WebSocket, db: AsyncSession = Depends(ge
 
 @app.get("/api/maps", response_model=List[MapResponse2])
 async def get_maps(db: AsyncSession = Depends(get_db)):
-    """Получить список всех карт с маяками"""
-    result = await db.execute(text("SELECT id, name, created_at FROM maps ORDER BY created_at DESC"))
-    maps = result.fetchall()
-
-    maps_response = []
-    for map_row in maps:
-        # Получаем маяки для каждой карты
-        beacons_result = await db.execute(
-            text("""
-                SELECT id, map_id, name, x_coordinate, y_coordinate, created_at
-                FROM beacons
-                WHERE map_id = :map_id
-                ORDER BY id
-            """),
-            {"map_id": map_row.id}
-        )
-        beacons = [
-            BeaconResponse(
-                id=b.id,
-                map_id=b.map_id,
-                name=b.name,
-                x_coordinate=float(b.x_coordinate),
-                y_coordinate=float(b.y_coordinate),
-                created_at=b.created_at
-            )
-            for b in beacons_result.fetchall()
-        ]
-
-        maps_response.append(
-            MapResponse2(
-                id=map_row.id,
-                name=map_row.name,
-                created_at=map_row.created_at,
-                beacons=beacons
-            )
+    """Получить список всех карт с маяками (один запрос, дальше из снимка)"""
+    maps = await map_snapshot.maps(db)
+    return [
+        MapResponse2(
+            id=m["id"],
+            name=m["name"],
+            created_at=m["created_at"],
+            beacons=[
+                BeaconResponse(
+                    id=b["id"],
+                    map_id=b["map_id"],
+                    name=b["name"],
+                    x_coordinate=b["x"],
+                    y_coordinate=b["y"],
+                    created_at=b["created_at"]
+                )
+                for b in m["beacons"]
+            ]
         )
-
-    return maps_response
+        for m in maps
+    ]
 
 
 @app.post("/api/maps", response_model=MapResponse2, status_code=201)
@@ -1287,6 +1290,7 @@ async def create_map(map_data: MapCreateRequest, db: AsyncSession = Depends(get_
         )
 
     await db.commit()
+    map_snapshot.invalidate()
 
     return MapResponse2(
         id=map_row.id,
@@ -1304,6 +1308,7 @@ async def delete_map(map_id: int, db: AsyncSession = Depends(get_db)):
         {"map_id": map_id}
     )
     await db.commit()
+    map_snapshot.invalidate()
     if not result.first():
         raise HTTPException(status_code=404, detail="Map not found")
 
@@ -1482,6 +1487,7 @@ async def delete_device(device_id: int, db: AsyncSession = Depends(get_db)):
         {"device_id": device_id}
     )
     await db.commit()
+    device_changes.forget_device(device_id)
     if not result.first():
         raise HTTPException(status_code=404, detail="Device not found")
 
@@ -1537,9 +1543,66 @@ async def get_position(request: PositionRequest, db: AsyncSession = Depends(get_
     )
 
 
+# Ограничения /api/path: размер страницы и допустимые режимы упрощения
+MAX_PATH_LIMIT = 5000
+PATH_SIMPLIFY_MODES = ("bucket", "dp")
+
+
+PATH_EPOCH = datetime(1970, 1, 1)
+# simplify=bucket: усреднение по интервалам внутри окна страницы [start, курсор)
+PATH_BUCKET_SQL = """
+    SELECT avg(x_coordinate) AS x_coordinate,
+           avg(y_coordinate) AS y_coordinate,
+           avg(accuracy) AS accuracy,
+           min(created_at) AS created_at
+    FROM positions
+    WHERE {where} AND created_at >= :start
+    GROUP BY floor(extract(epoch FROM created_at)::float8 / CAST(:bucket AS float8))
+    ORDER BY created_at DESC
+    LIMIT :limit
+"""
+
+
+def path_bucket_start(anchor: datetime, bucket_seconds: float, limit: int) -> datetime:
+    """
+    Начало самого раннего из limit интервалов, последний из которых содержит
+    anchor. Граница совпадает с границей интервала в GROUP BY
+    (floor(epoch / bucket)), поэтому крайний интервал страницы всегда полный.
+    """
+    k = (anchor - PATH_EPOCH).total_seconds() // bucket_seconds
+    return PATH_EPOCH + timedelta(seconds=(k - limit + 1) * bucket_seconds)
+
+
+def parse_path_cursor(cursor: str):
+    """cursor = "<created_at ISO>,<id>" (id может отсутствовать)"""
+    try:
+        ts, _, pos_id = cursor.partition(",")
+        return datetime.fromisoformat(ts), int(pos_id) if pos_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @app.get("/api/path/{device_id}", response_model=DevicePathResponse)
-async def get_device_path(device_id: int, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    """Получить историю пути устройства"""
+async def get_device_path(
+    device_id: int,
+    limit: int = Query(100, ge=1, le=MAX_PATH_LIMIT),
+    cursor: Optional[str] = None,
+    simplify: Optional[str] = None,
+    bucket_seconds: float = Query(5.0, gt=0),
+    tolerance: float = Query(0.1, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Получить историю пути устройства (новые точки первыми).
+
+    Постраничная выдача по ключу (created_at, id): в ответе next_cursor,
+    который передаётся в cursor для следующей страницы.
+    simplify=bucket - усреднение по интервалам bucket_seconds, limit - число интервалов;
+    simplify=dp - Дуглас-Пекер с допуском tolerance (м) по странице из limit точек.
+    """
+    if simplify is not None and simplify not in PATH_SIMPLIFY_MODES:
+        raise HTTPException(status_code=400, detail=f"simplify must be one of {PATH_SIMPLIFY_MODES}")
+
     # Получаем устройство
     device_result = await db.execute(
         text("SELECT id, name, mac FROM devices WHERE id = :device_id"),
@@ -1550,18 +1613,68 @@ async def get_device_path(device_id: int, limit: int = 100, db: AsyncSession = D
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
 
-    # Получаем историю позиций
-    positions_result = await db.execute(
-        text("""
-            SELECT x_coordinate, y_coordinate, accuracy, created_at
-            FROM positions
-            WHERE device_id = :device_id
-            ORDER BY created_at DESC
-            LIMIT :limit
-        """),
-        {"device_id": device_id, "limit": limit}
-    )
-    positions = positions_result.fetchall()
+    params = {"device_id": device_id, "limit": limit}
+    where = "device_id = :device_id"
+    if cursor:
+        before, before_id = parse_path_cursor(cursor)
+        params["before"] = before
+        if before_id is None:
+            where += " AND created_at < :before"
+        else:
+            params["before_id"] = before_id
+            where += " AND (created_at, id) < (:before, :before_id)"
+
+    next_cursor = None
+    if simplify == "bucket":
+        # Интервалы по времени. Окно страницы - limit интервалов, считая от
+        # последней точки до курсора: обе выборки идут по индексу
+        # (device_id, created_at) и читают не больше limit интервалов, а не
+        # всю историю устройства. Курсор - начало окна.
+        anchor_result = await db.execute(
+            text(f"SELECT max(created_at) AS anchor FROM positions WHERE {where}"),
+            params
+        )
+        anchor = anchor_result.scalar()
+        positions = []
+        if anchor is not None:
+            start = path_bucket_start(anchor, bucket_seconds, limit)
+            params["bucket"] = bucket_seconds
+            params["start"] = start
+            positions_result = await db.execute(
+                text(PATH_BUCKET_SQL.format(where=where)), params
+            )
+            positions = positions_result.fetchall()
+            # в окне могут быть пустые интервалы: есть ли что-то раньше окна
+            older_result = await db.execute(
+                text("""
+                    SELECT EXISTS (
+                        SELECT 1 FROM positions
+                        WHERE device_id = :device_id AND created_at < :start
+                    )
+                """),
+                {"device_id": device_id, "start": start}
+            )
+            if older_result.scalar():
+                next_cursor = start.isoformat()
+    else:
+        positions_result = await db.execute(
+            text(f"""
+                SELECT id, x_coordinate, y_coordinate, accuracy, created_at
+                FROM positions
+                WHERE {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT :limit
+            """),
+            params
+        )
+        positions = positions_result.fetchall()
+        if len(positions) == limit:
+            last = positions[-1]
+            next_cursor = f"{last.created_at.isoformat()},{last.id}"
+
+        if simplify == "dp" and len(positions) > 2:
+            xy = np.array([(float(p.x_coordinate), float(p.y_coordinate)) for p in positions])
+            positions = [positions[i] for i in douglas_peucker(xy, tolerance)]
 
     path = [
         PathPoint(
@@ -1577,5 +1690,6 @@ async def get_device_path(device_id: int, limit: int = 100, db: AsyncSession = D
         device_id=device.id,
         device_name=device.name,
         device_mac=device.mac,
-        path=path
+        path=path,
+        next_cursor=next_cursor
     )
@@ -0,0 +1,114 @@
+"""
+Снимок карт с маяками для /api/maps и WS get_list_map.
+
+Карты и их маяки читаются одним запросом (LEFT JOIN + json_agg) и хранятся
+в памяти с номером версии. Любая запись в maps/beacons вызывает
+invalidate() после commit, и следующий запрос перечитывает снимок.
+Пока записей нет, список карт отдаётся без обращения к БД.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+MAPS_WITH_BEACONS_SQL = text("""
+    SELECT m.id, m.name, m.created_at,
+           COALESCE(
+               json_agg(
+                   json_build_object(
+                       'id', b.id,
+                       'map_id', b.map_id,
+                       'name', b.name,
+                       'x', b.x_coordinate,
+                       'y', b.y_coordinate,
+                       'created_at', b.created_at
+                   ) ORDER BY b.id
+               ) FILTER (WHERE b.id IS NOT NULL),
+               '[]'
+           ) AS beacons
+    FROM maps m
+    LEFT JOIN beacons b ON b.map_id = m.id
+    GROUP BY m.id
+    ORDER BY m.created_at DESC
+""")
+
+
+class MapSnapshot:
+    """Версионированный снимок: список карт, у каждой список маяков"""
+
+    def __init__(self):
+        self.version = 0
+        self._loaded_version = -1
+        self._maps: List[Dict[str, Any]] = []
+        self._ws_maps: Optional[List[Dict[str, Any]]] = None
+
+    def invalidate(self):
+        """Вызывать после commit любой записи в maps или beacons"""
+        self.version += 1
+
+    async def maps(self, db: AsyncSession) -> List[Dict[str, Any]]:
+        if self._loaded_version == self.version:
+            return self._maps
+
+        version = self.version
+        result = await db.execute(MAPS_WITH_BEACONS_SQL)
+        maps = []
+        for row in result.fetchall():
+            beacons = row.beacons
+            if isinstance(beacons, str):
+                beacons = json.loads(beacons)
+            maps.append({
+                "id": row.id,
+                "name": row.name,
+                "created_at": row.created_at,
+                "beacons": [
+                    {
+                        "id": b["id"],
+                        "map_id": b["map_id"],
+                        "name": b["name"],
+                        "x": float(b["x"]),
+                        "y": float(b["y"]),
+                        "created_at": _parse_ts(b["created_at"])
+                    }
+                    for b in beacons
+                ]
+            })
+
+        # если за время запроса была запись, снимок уже устарел - не запоминаем
+        if version == self.version:
+            self._maps = maps
+            self._ws_maps = None
+            self._loaded_version = version
+        return maps
+
+    async def ws_maps(self, db: AsyncSession) -> List[Dict[str, Any]]:
+        """Формат WS list_map: id, name, beacons[{id, name, x, y}]"""
+        maps = await self.maps(db)
+        if maps is self._maps and self._ws_maps is not None:
+            return self._ws_maps
+        ws_maps = [
+            {
+                "id": m["id"],
+                "name": m["name"],
+                "beacons": [
+                    {"id": b["id"], "name": b["name"], "x": b["x"], "y": b["y"]}
+                    for b in m["beacons"]
+                ]
+            }
+            for m in maps
+        ]
+        if maps is self._maps:
+            self._ws_maps = ws_maps
+        return ws_maps
+
+
+def _parse_ts(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+map_snapshot = MapSnapshot()
@@ -53,8 +53,10 @@ class SendSignalRequest(BaseModel):
 
 
 class SendSignalResponse(BaseModel):
-    """Ответ на отправку сигналов"""
+    """Ответ на отправку сигналов; заодно отдаёт изменения, как /ping"""
     accept: bool
+    change: bool = False
+    change_list: List[str] = []
 
 
 class SetMapToDeviceRequest(BaseModel):
@@ -200,3 +202,4 @@ class DevicePathResponse(BaseModel):
     device_name: str
     device_mac: str
     path: List[PathPoint]
+    next_cursor: Optional[str] = None  # передать в cursor для следующей (более старой) страницы
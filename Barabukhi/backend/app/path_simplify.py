@@ -0,0 +1,41 @@
+"""
+Упрощение пути устройства для /api/path.
+
+Дуглас-Пекер: оставляет точки, отклоняющиеся от хорды больше чем на
+tolerance метров. Первая и последняя точки сохраняются всегда.
+"""
+
+import numpy as np
+
+
+def douglas_peucker(xy: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Возвращает индексы оставленных точек (по возрастанию).
+    xy - массив (n, 2); рекурсия заменена стеком, чтобы длинные пути
+    не упирались в глубину рекурсии.
+    """
+    n = len(xy)
+    if n <= 2 or tolerance <= 0:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = xy[end] - xy[start]
+        pts = xy[start + 1:end] - xy[start]
+        seg_len = np.hypot(seg[0], seg[1])
+        if seg_len == 0.0:
+            dist = np.hypot(pts[:, 0], pts[:, 1])
+        else:
+            dist = np.abs(seg[0] * pts[:, 1] - seg[1] * pts[:, 0]) / seg_len
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return np.flatnonzero(keep)
@@ -0,0 +1,15 @@
+-- Уведомление backend о новых изменениях устройств (LISTEN device_changes)
+-- payload: '<device_id>:<change_type>', доставляется после commit
+CREATE OR REPLACE FUNCTION notify_device_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('device_changes', NEW.device_id || ':' || NEW.change_type);
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS notify_device_change_trigger ON device_changes;
+CREATE TRIGGER notify_device_change_trigger
+AFTER INSERT ON device_changes
+FOR EACH ROW
+EXECUTE FUNCTION notify_device_change();
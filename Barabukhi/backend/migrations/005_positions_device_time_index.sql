@@ -0,0 +1,8 @@
+-- Индекс для /api/path: выборка по устройству с постраничной выдачей по (created_at, id)
+-- INCLUDE делает его покрывающим для координат, чтение без обращения к таблице
+CREATE INDEX IF NOT EXISTS idx_positions_device_created_at
+    ON positions (device_id, created_at DESC, id DESC)
+    INCLUDE (x_coordinate, y_coordinate, accuracy);
+
+-- Одиночный индекс по device_id покрывается новым составным
+DROP INDEX IF EXISTS idx_positions_device_id;
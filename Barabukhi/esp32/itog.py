@@ -586,6 +586,32 @@ def update_status_road():
         # print(f"Failed to get status_road data. Status: {status}")
         return None
 
+def apply_changes(data):
+    """Применяет изменения из ответа /ping или /send_signal"""
+    if "change" in data and data["change"]:
+        # print("Changes detected on server!")
+
+        if "change_list" in data and isinstance(data["change_list"], list):
+            change_list = data["change_list"]
+            print(f"Changed items: {change_list}")
+
+            if "map" in change_list:
+                print("Updating map...")
+                update_map()
+
+            if "freq" in change_list:
+                print("Updating frequency...")
+                update_freq()
+
+            if "status" in change_list:
+                print("Updating status road...")
+                update_status_road()
+
+            return True
+
+    # print("No changes on server")
+    return False
+
 def ping_server():
     """Пингует сервер для проверки изменений"""
     url_post = HOST_ADDRESS + "/ping"
@@ -594,33 +620,7 @@ def ping_server():
 
     if status == 200 and body:
         try:
-            data = ujson.loads(body)
-            
-            if "change" in data and data["change"]:
-                # print("Changes detected on server!")
-                
-                if "change_list" in data and isinstance(data["change_list"], list):
-                    change_list = data["change_list"]
-                    print(f"Changed items: {change_list}")
-                    
-                    if "map" in change_list:
-                        print("Updating map...")
-                        update_map()
-                    
-                    if "freq" in change_list:
-                        print("Updating frequency...")
-                        update_freq()
-                    
-                    if "status" in change_list:
-                        print("Updating status road...")
-                        update_status_road()
-                        
-                    return True
-                
-            else:
-                # print("No changes on server")
-                return False 
-                
+            return apply_changes(ujson.loads(body))
         except Exception as e:
             print(JSON_PARSE_ERROR, e)
             return None
@@ -629,7 +629,10 @@ def ping_server():
         return None
 
 def run_pingator():
-    """Запускает бесконечный цикл пингатора с интервалом 1 секунда"""
+    """
+    Бесконечный цикл отправки сигналов.
+    Изменения приходят в ответе /send_signal, /ping - только если отправка не удалась
+    """
     # print("Starting pingator...")
     ping_count = 0
     
@@ -638,9 +641,9 @@ def run_pingator():
             ping_count += 1
             # print(f"\n--- Ping #{ping_count} ---")
             
-            result = ping_server()
-
-            send_signal()
+            result = send_signal()
+            if result is None:
+                result = ping_server()
             
             # if result is True:
             #     # print("Server data updated!")
@@ -657,18 +660,27 @@ def run_pingator():
             time.sleep(1)
 
 def send_signal():
+    """Отправляет сигналы; возвращает как ping_server: True/False или None при ошибке"""
     global INDEX_NOW
 
     url_post = HOST_ADDRESS + "/send_signal"
     current_beacon_data = BEACONSDATA[INDEX_NOW]
 
-    payload = {"mac": MAC_ADDRESS,"map_name": map_name, "list": current_beacon_data}
+    payload = {"mac": MAC_ADDRESS, "map": map_name, "list": current_beacon_data}
     INDEX_NOW += 1
 
     if INDEX_NOW >= len(BEACONSDATA):
         INDEX_NOW = 0
     status, body = do_post(url_post, json_dict=payload)
 
+    if status == 200 and body:
+        try:
+            return apply_changes(ujson.loads(body))
+        except Exception as e:
+            print(JSON_PARSE_ERROR, e)
+            return None
+    return None
+
 if __name__ == "__main__":
     if not wifi_connect(SSID, PASSWORD):
         sys.exit(1)
@@ -0,0 +1,139 @@
+"""
+Микробенчмарк обработки одного MQTT-сообщения: старый путь из app.py
+(np.median(list(deque)) + scipy L-BFGS-B с конечными разностями) против
+positioning.py (RunningMedian + Гаусс-Ньютон с аналитическим якобианом).
+
+Сообщения воспроизводятся по записанному маршруту result.path: для каждой
+точки считаются RSSI до маячков из standart.beacons по той же модели
+затухания плюс шум. Фильтр Калмана одинаков в обоих вариантах и в замер
+не входит.
+
+    python bench_solver.py [--messages 2000] [--window 9]
+"""
+
+import argparse
+import time
+from collections import deque
+
+import numpy as np
+from scipy.optimize import minimize
+
+from positioning import RunningMedian, solve_position
+
+TX_POWER = -56.0
+N_PATH_LOSS = 2.4
+RSSI_NOISE = 3.0
+
+
+def load_beacons(filename):
+    positions = {}
+    with open(filename) as f:
+        next(f)
+        for line in f:
+            parts = line.strip().split(';')
+            if len(parts) == 3:
+                name, x, y = parts
+                positions[name] = (float(x), float(y))
+    return positions
+
+
+def load_path(filename):
+    with open(filename) as f:
+        next(f)
+        return [tuple(map(float, line.strip().split(';'))) for line in f if line.strip()]
+
+
+def make_messages(beacons, path, count, rng):
+    messages = []
+    for i in range(count):
+        x, y = path[i % len(path)]
+        msg = {}
+        for name, (bx, by) in beacons.items():
+            dist = max(np.hypot(x - bx, y - by), 0.1)
+            rssi = TX_POWER - 10 * N_PATH_LOSS * np.log10(dist) + rng.normal(0, RSSI_NOISE)
+            msg[name] = int(round(rssi))
+        messages.append(msg)
+    return messages
+
+
+def rssi_to_distance(rssi):
+    return 10 ** ((TX_POWER - rssi) / (10 * N_PATH_LOSS))
+
+
+def error_function_weighted(point_guess, beacons_data):
+    error = 0.0
+    px, py = point_guess
+    for name, (bx, by, distance, weight) in beacons_data.items():
+        calculated_dist = np.sqrt((px - bx) ** 2 + (py - by) ** 2)
+        error += weight * ((calculated_dist - distance) ** 2)
+    return error
+
+
+def for_calc(beacons, medians):
+    data = {}
+    for name, rssi in medians.items():
+        distance = rssi_to_distance(rssi)
+        bx, by = beacons[name]
+        data[name] = (bx, by, distance, 1.0 / (distance ** 2 + 0.01))
+    return data
+
+
+def run_old(beacons, messages, window):
+    history = {}
+    last = np.array([0.0, 0.0])
+    points = []
+    for msg in messages:
+        medians = {}
+        for name, rssi in msg.items():
+            history.setdefault(name, deque(maxlen=window)).append(rssi)
+            medians[name] = np.median(list(history[name]))
+        result = minimize(error_function_weighted, last, args=(for_calc(beacons, medians),), method='L-BFGS-B')
+        if result.success:
+            last = np.array([result.x[0], result.x[1]])
+        points.append(last)
+    return np.array(points)
+
+
+def run_new(beacons, messages, window):
+    history = {}
+    last = np.array([0.0, 0.0])
+    points = []
+    for msg in messages:
+        medians = {}
+        for name, rssi in msg.items():
+            if name not in history:
+                history[name] = RunningMedian(window)
+            medians[name] = history[name].push(rssi)
+        point, success = solve_position(for_calc(beacons, medians), last)
+        if success:
+            last = point
+        points.append(last)
+    return np.array(points)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--window", type=int, default=9)
+    parser.add_argument("--beacons", default="standart.beacons")
+    parser.add_argument("--path", default="result.path")
+    args = parser.parse_args()
+
+    beacons = load_beacons(args.beacons)
+    messages = make_messages(beacons, load_path(args.path), args.messages, np.random.default_rng(0))
+
+    results = {}
+    for label, func in (("old (deque + L-BFGS-B)", run_old), ("new (RunningMedian + GN)", run_new)):
+        started = time.perf_counter()
+        points = func(beacons, messages, args.window)
+        elapsed = time.perf_counter() - started
+        results[label] = points
+        print(f"{label:26s} {elapsed / len(messages) * 1e6:9.1f} us/message")
+
+    old, new = results.values()
+    diff = np.hypot(*(old - new).T)
+    print(f"position difference: mean {diff.mean():.4f} m, max {diff.max():.4f} m")
+
+
+if __name__ == "__main__":
+    main()
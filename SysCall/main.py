@@ -7,6 +7,7 @@ import ubluetooth
 import json
 from umqtt.simple import MQTTClient
 import _thread
+from array import array
 
 WIFI_SSID = "Pixel 9"
 WIFI_PASSWORD = "29052006"
@@ -20,20 +21,69 @@ WHITELIST = [
     "beacon_5", "beacon_6", "beacon_7", "beacon_8"
 ]
 
-
-SHARED_QUEUE = []
-QUEUE_LOCK = _thread.allocate_lock()
+QUEUE_CAPACITY = 16     # окон в очереди; при переполнении выбрасывается самое старое
+IDLE_SLEEP_MS = 50      # пауза основного цикла, когда очередь пуста
+STATS_INTERVAL_S = 30   # как часто печатать счётчики очереди
+NO_RSSI = 0             # маячок не был виден в окне
+
+
+class ScanRing:
+    """
+    Очередь окон сканирования фиксированного размера. Окно - array('b') по
+    одному RSSI на маячок из WHITELIST; все слоты выделены заранее, push и
+    pop копируют значения, не выделяя память. Замок держится только на
+    время копирования.
+    """
+
+    def __init__(self, capacity, width):
+        self._slots = [array('b', bytes(width)) for _ in range(capacity)]
+        self._capacity = capacity
+        self._width = width
+        self._head = 0
+        self._count = 0
+        self._lock = _thread.allocate_lock()
+        self.pushed = 0
+        self.dropped = 0
+        self.popped = 0
+
+    def push(self, window):
+        with self._lock:
+            if self._count == self._capacity:
+                # переполнение: теряем самое старое окно
+                self._head = (self._head + 1) % self._capacity
+                self._count -= 1
+                self.dropped += 1
+            slot = self._slots[(self._head + self._count) % self._capacity]
+            for i in range(self._width):
+                slot[i] = window[i]
+            self._count += 1
+            self.pushed += 1
+
+    def pop_into(self, window):
+        with self._lock:
+            if self._count == 0:
+                return False
+            slot = self._slots[self._head]
+            for i in range(self._width):
+                window[i] = slot[i]
+            self._head = (self._head + 1) % self._capacity
+            self._count -= 1
+            self.popped += 1
+            return True
+
+
+SCAN_QUEUE = ScanRing(QUEUE_CAPACITY, len(WHITELIST))
 
 
 def find_adv_name(adv_data):
+    """Имя из рекламного пакета как bytes (без декодирования в str)"""
     i = 0
     while i < len(adv_data):
         length = adv_data[i]
         if length == 0: break
         ad_type = adv_data[i + 1]
         if ad_type == 0x09 or ad_type == 0x08:
-            name_data_view = adv_data[i + 2:i + length + 1]
-            return bytes(name_data_view).decode('utf-8').strip()
+            return bytes(adv_data[i + 2:i + length + 1]).strip()
         i += length + 1
     return None
 
@@ -42,21 +92,30 @@ class BLEScanner:
     def __init__(self, ble, whitelist):
         self._ble = ble
         self._ble.active(True)
-        self._whitelist = whitelist
-        self._found_devices = {}
+        # имя маячка -> индекс в окне
+        self._index = {}
+        for i, name in enumerate(whitelist):
+            self._index[name.encode()] = i
+        self._window = array('b', bytes(len(whitelist)))
+        self._seen = False
         self._ble.irq(self._irq)
 
     def _irq(self, event, data):
         if event == 5:
             addr_type, addr, adv_type, rssi, adv_data = data
-            name = find_adv_name(adv_data)
-            if name and name in self._whitelist:
-                self._found_devices[name] = rssi
-
-    def get_results_and_clear(self):
-        results = self._found_devices.copy()
-        self._found_devices.clear()
-        return results
+            i = self._index.get(find_adv_name(adv_data))
+            if i is not None:
+                self._window[i] = rssi
+                self._seen = True
+
+    def flush_window(self, queue):
+        """Кладёт текущее окно в очередь (если в нём что-то было) и очищает его"""
+        if not self._seen:
+            return
+        self._seen = False
+        queue.push(self._window)
+        for i in range(len(self._window)):
+            self._window[i] = NO_RSSI
 
     def start_scan(self):
         self._ble.gap_scan(0, 80000, 40000)
@@ -70,10 +129,15 @@ def ble_scanner_thread():
     scanner.start_scan()
     while True:
         time.sleep(1 / FREQ)
-        beacons_data = scanner.get_results_and_clear()
-        if beacons_data:
-            with QUEUE_LOCK:
-                SHARED_QUEUE.append(beacons_data)
+        scanner.flush_window(SCAN_QUEUE)
+
+
+def window_to_dict(window):
+    data = {}
+    for i in range(len(window)):
+        if window[i] != NO_RSSI:
+            data[WHITELIST[i]] = window[i]
+    return data
 
 
 
@@ -103,16 +167,21 @@ if wlan.isconnected():
         _thread.start_new_thread(ble_scanner_thread, ())
 
         print("[Main Thread] Запуск основного цикла...")
+        window = array('b', bytes(len(WHITELIST)))
+        last_stats = time.time()
         while True:
-            data_to_send = None
-            with QUEUE_LOCK:
-                if SHARED_QUEUE:
-                    data_to_send = SHARED_QUEUE.pop(0)
-
-            if data_to_send:
-                message = json.dumps(data_to_send)
+            if SCAN_QUEUE.pop_into(window):
+                message = json.dumps(window_to_dict(window))
                 client.publish(TOPIC_PUB, message.encode())
                 print(f"[Main Thread] Отправлено: {message}")
+            else:
+                # очередь пуста: спим, а не крутим цикл вхолостую
+                time.sleep_ms(IDLE_SLEEP_MS)
+
+            if time.time() - last_stats >= STATS_INTERVAL_S:
+                last_stats = time.time()
+                print(f"[Main Thread] Очередь: принято {SCAN_QUEUE.pushed}, "
+                      f"отправлено {SCAN_QUEUE.popped}, потеряно {SCAN_QUEUE.dropped}")
 
             client.check_msg()
 
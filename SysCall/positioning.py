@@ -0,0 +1,156 @@
+"""
+Расчёт позиции и фильтрация RSSI без scipy.
+
+RunningMedian - медиана скользящего окна: значения хранятся в порядке
+поступления (deque) и в отсортированном списке, вставка и удаление идут
+через bisect, медиана берётся по индексу без сортировки окна.
+
+solve_position - взвешенный МНК по расстояниям методом Гаусса-Ньютона
+(с демпфированием Левенберга-Марквардта) и аналитическим якобианом.
+Стартует с предыдущей позиции, поэтому обычно сходится за 2-4 итерации.
+Минимизирует ту же функцию, что error_function_weighted:
+sum(w_i * (|p - b_i| - d_i)^2).
+
+Здесь же перевод RSSI в расстояние и фильтры Калмана (перенесены из
+app.py, их использует service.py).
+"""
+
+from bisect import bisect_left, insort
+from collections import deque
+
+import numpy as np
+
+MAX_ITERATIONS = 20
+STEP_TOLERANCE = 1e-4   # м, остановка при шаге меньше этого (0.1 мм)
+MIN_DISTANCE = 1e-9     # защита от деления на ноль, когда точка совпала с маячком
+
+
+def rssi_to_distance(rssi, tx_power_val, n_val):
+    return 10 ** ((tx_power_val - rssi) / (10 * n_val))
+
+
+
+def error_function_weighted(point_guess, beacons_data):
+    error = 0.0
+    px, py = point_guess
+    for name, (bx, by, distance, weight) in beacons_data.items():
+        calculated_dist = np.sqrt((px - bx) ** 2 + (py - by) ** 2)
+        error += weight * ((calculated_dist - distance) ** 2)
+    return error
+
+
+def update_kalman_filter_1d(state, measurement, R, Q):
+    x_pred = state['x'];
+    P_pred = state['P'] + Q
+    K = P_pred / (P_pred + R)
+    x_new = x_pred + K * (measurement - x_pred);
+    P_new = (1 - K) * P_pred
+    return {'x': x_new, 'P': P_new}, x_new
+
+
+
+def update_kalman_filter_2d(state, measurement, R_val, Q_val, dt):
+
+    F = np.array([[1, 0, dt, 0], [0, 1, 0, dt], [0, 0, 1, 0], [0, 0, 0, 1]])
+
+    H = np.array([[1, 0, 0, 0], [0, 1, 0, 0]])
+
+    Q = np.eye(4) * Q_val
+
+    R = np.eye(2) * R_val
+
+    x_pred = F @ state['x']
+    P_pred = F @ state['P'] @ F.T + Q
+
+
+    y = measurement - H @ x_pred
+    S = H @ P_pred @ H.T + R
+    K = P_pred @ H.T @ np.linalg.inv(S)
+    x_new = x_pred + K @ y
+    P_new = (np.eye(4) - K @ H) @ P_pred
+
+    return {'x': x_new, 'P': P_new}, (x_new[0], x_new[1])
+
+
+class RunningMedian:
+    def __init__(self, window):
+        self.window = window
+        self._order = deque()
+        self._sorted = []
+
+    def __len__(self):
+        return len(self._order)
+
+    def push(self, value):
+        """Добавляет значение и возвращает медиану окна (как np.median)"""
+        if len(self._order) == self.window:
+            old = self._order.popleft()
+            del self._sorted[bisect_left(self._sorted, old)]
+        self._order.append(value)
+        insort(self._sorted, value)
+        return self.median()
+
+    def median(self):
+        s = self._sorted
+        n = len(s)
+        if n == 0:
+            return None
+        mid = n // 2
+        if n % 2:
+            return float(s[mid])
+        return (s[mid - 1] + s[mid]) / 2.0
+
+    def clear(self):
+        self._order.clear()
+        self._sorted.clear()
+
+
+def solve_position(beacons_data, initial_guess=None):
+    """
+    beacons_data: {name: (bx, by, distance, weight)}, как для error_function_weighted.
+    Возвращает (точка np.array([x, y]), успех).
+    """
+    data = np.array(list(beacons_data.values()), dtype=float)
+    b = data[:, :2]
+    d = data[:, 2]
+    sw = np.sqrt(data[:, 3])
+
+    if initial_guess is None:
+        p = (b * data[:, 3:4]).sum(axis=0) / data[:, 3].sum()
+    else:
+        p = np.array(initial_guess, dtype=float)
+
+    def residuals(point):
+        diff = point - b
+        dist = np.maximum(np.hypot(diff[:, 0], diff[:, 1]), MIN_DISTANCE)
+        return diff, dist, sw * (dist - d)
+
+    diff, dist, r = residuals(p)
+    cost = r @ r
+    lam = 1e-6
+    for _ in range(MAX_ITERATIONS):
+        # d r_i / d p = sqrt(w_i) * (p - b_i) / |p - b_i|
+        J = diff * (sw / dist)[:, None]
+        gx, gy = J.T @ r
+        (axx, axy), (_, ayy) = J.T @ J
+        # демпфирование: увеличиваем lam, пока шаг не уменьшит ошибку.
+        # Система 2x2 решается в явном виде (правило Крамера)
+        while lam < 1e8:
+            mxx = axx * (1 + lam) + 1e-12
+            myy = ayy * (1 + lam) + 1e-12
+            det = mxx * myy - axy * axy
+            if det > 0:
+                step = np.array([(axy * gy - myy * gx) / det, (axy * gx - mxx * gy) / det])
+                new_diff, new_dist, new_r = residuals(p + step)
+                new_cost = new_r @ new_r
+                if new_cost <= cost:
+                    break
+            lam *= 10
+        else:
+            return p, bool(np.isfinite(p).all())
+        p = p + step
+        diff, dist, r, cost = new_diff, new_dist, new_r, new_cost
+        lam = max(lam / 10, 1e-7)
+        if np.hypot(step[0], step[1]) < STEP_TOLERANCE:
+            break
+    return p, bool(np.isfinite(p).all())
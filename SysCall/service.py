@@ -0,0 +1,187 @@
+"""
+Приём данных MQTT и расчёт позиции, не зависящие от сессий Streamlit.
+
+Один PositioningService на процесс (создаётся через st.cache_resource в
+app.py): MQTT-поток paho фильтрует RSSI, считает позицию и после каждого
+сообщения публикует новый неизменяемый Snapshot. UI читает
+service.snapshot() без блокировок - это просто чтение ссылки - и
+перерисовывает карту только при смене snapshot.version. Нагрузка на CPU
+зависит от частоты сообщений, а не от числа открытых вкладок.
+"""
+
+import json
+import threading
+import time
+import traceback
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+from positioning import (RunningMedian, rssi_to_distance, solve_position,
+                         update_kalman_filter_1d, update_kalman_filter_2d)
+
+DEFAULT_PARAMS = {
+    'tx_power': -56.0, 'n_path_loss': 2.4,
+    'median_window': 9,
+    'kalman_R_rssi': 0.8, 'kalman_Q_rssi': 0.005,
+    'pos_kalman_R': 0.5, 'pos_kalman_Q': 0.1,
+}
+
+
+class Snapshot(NamedTuple):
+    version: int
+    recording: bool
+    live_data: Dict[str, dict]
+    path: List[dict]        # список только дополняется; актуальны первые path_len точек
+    path_len: int
+
+    def points(self):
+        return self.path[:self.path_len]
+
+
+class PositioningService:
+    def __init__(self, beacons, broker, topic, port=1883, params=None):
+        self.beacons = beacons
+        self.broker = broker
+        self.topic = topic
+        self.port = port
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.messages = 0
+
+        # состояние фильтров меняет только MQTT-поток и кнопки UI, под _lock
+        self._lock = threading.Lock()
+        self._version = 0
+        self._recording = False
+        self._path: List[dict] = []
+        self._live_data: Dict[str, dict] = {}
+        self._reset_filters()
+        self._snapshot = Snapshot(0, False, {}, self._path, 0)
+        self._client = None
+
+    def _reset_filters(self):
+        self.rssi_history: Dict[str, RunningMedian] = {}
+        self.kalman_states: Dict[str, dict] = {}
+        self.position_kalman_state = None
+        self.last_update_time = time.time()
+        self.last_known_position = np.array([0.0, 0.0])
+
+    # ---- чтение из UI ----
+
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
+
+    def _publish(self):
+        self._version += 1
+        self._snapshot = Snapshot(self._version, self._recording, dict(self._live_data),
+                                  self._path, len(self._path))
+
+    # ---- управление из UI ----
+
+    def set_params(self, params):
+        """Параметры со слайдеров; новое окно медианы применяется к новым окнам"""
+        with self._lock:
+            self.params = dict(self.params, **params)
+
+    def start_route(self):
+        with self._lock:
+            # новый список: старые снимки продолжают ссылаться на прежний путь
+            self._path = []
+            self._live_data = {}
+            self._reset_filters()
+            self._recording = True
+            self._publish()
+
+    def stop_route(self):
+        with self._lock:
+            self._recording = False
+            self._publish()
+
+    # ---- MQTT ----
+
+    def start(self):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        client.on_connect = self._on_connect
+        client.on_message = self._on_message
+        try:
+            client.connect_async(self.broker, self.port, 60)
+            client.loop_start()
+            print("MQTT-поток запущен.")
+        except Exception as e:
+            print(f"Не удалось запустить MQTT-поток: {e}")
+        self._client = client
+        return self
+
+    def stop(self):
+        if self._client is not None:
+            self._client.loop_stop()
+            self._client.disconnect()
+            self._client = None
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        # подписка заново после каждого переподключения
+        client.subscribe(self.topic)
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            raw_rssi_data = json.loads(msg.payload.decode())
+            with self._lock:
+                self.messages += 1
+                self.process(raw_rssi_data)
+                self._publish()
+        except Exception as e:
+            print(f"Ошибка в MQTT-потоке: {e}")
+            traceback.print_exc()
+
+    def process(self, raw_rssi_data) -> Optional[dict]:
+        """Фильтрует RSSI одного сообщения и считает позицию (вызывается под _lock)"""
+        params = self.params
+        filtered_rssi_map = {}
+        for name, rssi in raw_rssi_data.items():
+            if name not in self.beacons: continue
+            if name not in self.rssi_history:
+                self.rssi_history[name] = RunningMedian(params['median_window'])
+                self.kalman_states[name] = {'x': float(rssi), 'P': 1.0}
+            median_filtered_rssi = self.rssi_history[name].push(rssi)
+            new_state, kalman_filtered_rssi = update_kalman_filter_1d(
+                self.kalman_states[name], median_filtered_rssi, params['kalman_R_rssi'], params['kalman_Q_rssi']
+            )
+            self.kalman_states[name] = new_state
+            filtered_rssi_map[name] = kalman_filtered_rssi
+            self._live_data[name] = {'raw_rssi': rssi, 'filtered_rssi': round(kalman_filtered_rssi, 2)}
+
+        beacons_for_calc = {}
+        for name, filtered_rssi in filtered_rssi_map.items():
+            distance = rssi_to_distance(filtered_rssi, params['tx_power'], params['n_path_loss'])
+            weight = 1.0 / (distance ** 2 + 0.01)
+            bx, by = self.beacons[name]
+            beacons_for_calc[name] = (bx, by, distance, weight)
+
+        if len(beacons_for_calc) < 3:
+            return None
+
+        calculated_point, success = solve_position(beacons_for_calc, self.last_known_position)
+        if not success:
+            return None
+
+        current_time = time.time()
+        dt = current_time - self.last_update_time
+        self.last_update_time = current_time
+
+        if self.position_kalman_state is None:
+            self.position_kalman_state = {
+                'x': np.array([calculated_point[0], calculated_point[1], 0, 0]),
+                'P': np.eye(4) * 10.0
+            }
+            filtered_point_coords = (calculated_point[0], calculated_point[1])
+        else:
+            self.position_kalman_state, filtered_point_coords = update_kalman_filter_2d(
+                self.position_kalman_state, calculated_point,
+                params['pos_kalman_R'], params['pos_kalman_Q'], dt
+            )
+
+        final_point = {'x': float(filtered_point_coords[0]), 'y': float(filtered_point_coords[1])}
+        self.last_known_position = np.array([final_point['x'], final_point['y']])
+        if self._recording:
+            self._path.append(final_point)
+        return final_point
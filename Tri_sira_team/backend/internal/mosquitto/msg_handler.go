@@ -13,6 +13,11 @@ type BeaconMsg struct {
 	AvgRssi    float64 `json:"avg_rssi"`
 }
 
+// ScanMsg - все маяки одного интервала одним сообщением
+type ScanMsg struct {
+	Beacons []BeaconMsg `json:"beacons"`
+}
+
 type MqqtMsgHandler struct {
 	storage *s.Storage
 	log     *slog.Logger
@@ -23,12 +28,29 @@ func NewHandler(storage *s.Storage, log *slog.Logger) *MqqtMsgHandler {
 }
 
 func (h *MqqtMsgHandler) HandleMsg(msg []byte) error {
-	var beaconMsg BeaconMsg
-	if err := json.Unmarshal(msg, &beaconMsg); err != nil {
+	var scanMsg ScanMsg
+	if err := json.Unmarshal(msg, &scanMsg); err != nil {
 		h.log.Error("failed to parse MQTT message", "err", err)
 		return err
 	}
 
+	// старый формат: один маяк в сообщении
+	if scanMsg.Beacons == nil {
+		var beaconMsg BeaconMsg
+		if err := json.Unmarshal(msg, &beaconMsg); err != nil {
+			h.log.Error("failed to parse MQTT message", "err", err)
+			return err
+		}
+		scanMsg.Beacons = []BeaconMsg{beaconMsg}
+	}
+
+	for _, beaconMsg := range scanMsg.Beacons {
+		h.store(beaconMsg)
+	}
+	return nil
+}
+
+func (h *MqqtMsgHandler) store(beaconMsg BeaconMsg) {
 	n := 2.4
 	txPower := -43.40
 	distance := math.Pow(10, (float64(txPower)-beaconMsg.AvgRssi)/(10*n))
@@ -39,6 +61,4 @@ func (h *MqqtMsgHandler) HandleMsg(msg []byte) error {
 		"rssi", beaconMsg.AvgRssi,
 		"distance", distance,
 	)
-
-	return nil
 }
@@ -1,5 +1,6 @@
 import time
 import ubluetooth
+from array import array
 import network
 from micropython import const
 from secrets import secrets, mqtt_env, TARGET_BEACONS
@@ -33,8 +34,8 @@ client = MQTTClient(
 client.connect()
 
 # ------------------for calculations------------------
-def normalize_mac(mac):
-    return mac.replace(":", "").lower()
+def mac_bytes(mac):
+    return bytes(int(part, 16) for part in mac.split(":"))
 
 def median(lst):
     n = len(lst)
@@ -49,7 +50,7 @@ def median(lst):
 
 def get_tx_power(adv_data):
     i = 0
-    while i < len(adv_data):
+    while i + 2 < len(adv_data):
         length = adv_data[i]
         if length == 0:
             break
@@ -62,10 +63,29 @@ def get_tx_power(adv_data):
     return None
 
 # ------------------ beacons ------------------
-TARGET_MAP = {name: normalize_mac(mac) for name, mac in TARGET_BEACONS.items()}
-beacon_data = {}
-beacon_filters = {name: SimpleKalmanRSSI() for name in TARGET_BEACONS}
-ema_rssi = {name: None for name in TARGET_BEACONS}
+# Маяк -> номер слота. Таблица строится один раз: ключ - 6 байт адреса,
+# как их отдаёт IRQ. Последний полубайт адреса, как и раньше, не
+# сравниваем, поэтому на маяк приходится 16 ключей.
+SLOT_NAMES = list(TARGET_BEACONS)
+SLOTS = len(SLOT_NAMES)
+BEACON_SLOTS = {}
+for slot, name in enumerate(SLOT_NAMES):
+    mac = mac_bytes(TARGET_BEACONS[name])
+    for low in range(16):
+        BEACON_SLOTS[mac[:5] + bytes(((mac[5] & 0xF0) | low,))] = slot
+
+# Сырые RSSI за интервал: два буфера (в активный пишет IRQ, второй
+# разбирает основной цикл), в каждом по WINDOW_SAMPLES на слот.
+WINDOW_SAMPLES = const(32)
+TX_UNKNOWN = const(127)
+samples = array('b', bytes(2 * SLOTS * WINDOW_SAMPLES))
+counts = [0] * (2 * SLOTS)
+tx_powers = [TX_UNKNOWN] * SLOTS
+active = 0
+
+# фильтры и EMA по слотам; меняются только в основном цикле
+beacon_filters = [SimpleKalmanRSSI() for _ in range(SLOTS)]
+ema_rssi = [None] * SLOTS
 EMA_ALPHA = 0.2
 
 REPORT_INTERVAL = 1
@@ -80,54 +100,81 @@ _IRQ_SCAN_RESULT = const(5)
 def bt_irq(event, data):
     if event == _IRQ_SCAN_RESULT:
         addr_type, addr, adv_type, rssi, adv_data = data
-        nmac = "".join("{:02x}".format(b) for b in addr)
-        for name, mac in TARGET_MAP.items():
-            if mac[:-1] == nmac[:-1]:  
-                if name not in beacon_data:
-                    beacon_data[name] = []
-                tx_power = get_tx_power(adv_data)
-                filtered_rssi = beacon_filters[name].update(rssi)
-                beacon_data[name].append((filtered_rssi, tx_power))
+        slot = BEACON_SLOTS.get(bytes(addr))
+        if slot is None:
+            return
+        i = active * SLOTS + slot
+        n = counts[i]
+        if n < WINDOW_SAMPLES:
+            samples[i * WINDOW_SAMPLES + n] = rssi
+            counts[i] = n + 1
+        tx_power = get_tx_power(adv_data)
+        if tx_power is not None:
+            tx_powers[slot] = tx_power
 
 ble.irq(bt_irq)
 ble.gap_scan(0, 30000, 30000, True)  # активный скан
 
+def take_report():
+    """Сводка по закрытому интервалу: Калман -> медиана -> EMA по каждому слоту"""
+    global active
+    buf = active
+    active = 1 - active  # IRQ дальше пишет во второй буфер
+
+    beacons = []
+    for slot in range(SLOTS):
+        i = buf * SLOTS + slot
+        n = counts[i]
+        if n == 0:
+            continue
+        kf = beacon_filters[slot]
+        base = i * WINDOW_SAMPLES
+        filtered = []
+        for k in range(n):
+            filtered.append(kf.update(samples[base + k]))
+        counts[i] = 0
+
+        med_rssi = median(filtered)
+        # EMA после медианы
+        if ema_rssi[slot] is None:
+            ema_rssi[slot] = med_rssi
+        else:
+            ema_rssi[slot] = EMA_ALPHA * med_rssi + (1 - EMA_ALPHA) * ema_rssi[slot]
+
+        tx_power = tx_powers[slot]
+        beacons.append({
+            "beacon_name": SLOT_NAMES[slot],
+            "avg_rssi": round(ema_rssi[slot], 2),
+            "tx_power": None if tx_power == TX_UNKNOWN else tx_power
+        })
+    return beacons
+
 # ------------------ Основной цикл ------------------
 try:
-    last_report = time.time()
+    next_report = time.ticks_add(time.ticks_ms(), REPORT_INTERVAL * 1000)
     while True:
-        now = time.time()
-        if now - last_report >= REPORT_INTERVAL:
-            print("---- RSSI Report ----")
-            for name, samples in beacon_data.items():
-                if samples:
-                    rssi_values = [r for r, _ in samples]
-                    tx_power = samples[0][1]
-                    med_rssi = median(rssi_values)
-                    # EMA после медианы
-                    if ema_rssi[name] is None:
-                        ema_rssi[name] = med_rssi
-                    else:
-                        ema_rssi[name] = EMA_ALPHA * med_rssi + (1 - EMA_ALPHA) * ema_rssi[name]
-
-        
-
-                    payload = json.dumps({
-                        "beacon_name": name,
-                        "avg_rssi": round(ema_rssi[name], 2),
-                        "tx_power": int(tx_power)
-                    })
-                    client.publish(mqtt_env["topic"], payload)
-                    print("Sent:", payload)
-                    
-                    led.on()
-                    time.sleep(0.1)
-                    led.off()
-                else:
-                    print(f"{name}: no data")
-            print("---------------------\n")
-            beacon_data.clear()
-            last_report = now
+        wait = time.ticks_diff(next_report, time.ticks_ms())
+        if wait > 0:
+            time.sleep_ms(min(wait, 50))
+            continue
+        now = time.ticks_ms()
+        next_report = time.ticks_add(next_report, REPORT_INTERVAL * 1000)
+        if time.ticks_diff(next_report, now) <= 0:
+            # отстали - следующий отчёт через интервал от текущего момента
+            next_report = time.ticks_add(now, REPORT_INTERVAL * 1000)
+
+        print("---- RSSI Report ----")
+        beacons = take_report()
+        if beacons:
+            # все маяки интервала одним сообщением
+            payload = json.dumps({"beacons": beacons})
+            client.publish(mqtt_env["topic"], payload)
+            print("Sent:", payload)
+
+            led.on()
+            time.sleep(0.1)
+            led.off()
+        print("---------------------\n")
 
 except KeyboardInterrupt:
     ble.gap_scan(None)
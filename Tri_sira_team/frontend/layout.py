@@ -1,7 +1,7 @@
 from dash import html, dcc
 
 
-def Layout():
+def Layout(map_figure):
     return html.Div(
         children=[
             html.H1(
@@ -24,6 +24,7 @@ def Layout():
                         children=[
                             dcc.Graph(
                                 id='map_grid',
+                                figure=map_figure,
                                 style={
                                     'height': '100%',
                                     'width': '100%',
@@ -162,7 +163,9 @@ def Layout():
                             dcc.Interval(
                                 id='timer',
                                 n_intervals=0
-                            )
+                            ),
+                            # [поколение, seq] последней точки маршрута, полученной этой вкладкой
+                            dcc.Store(id='feed_cursor')
                         ],
                         style={
                             'width': '320px',
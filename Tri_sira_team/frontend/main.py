@@ -2,15 +2,16 @@ from dash import Dash
 import pandas as pd
 
 from layout import Layout
-from callbacks import register_callbacks
+from callbacks import build_map, register_callbacks
 
 
 class NavigatorApp(Dash):
     def __init__(self, **obsolete):
         super().__init__(**obsolete)
         self.name = "Навигатор"
-        self.layout = Layout()
         self.beacons = pd.read_csv('../standart.beacons', sep=';')
+        self.map_figure = build_map(self.beacons)
+        self.layout = Layout(self.map_figure)
         register_callbacks(self)
 
     def run_app(self, debug=True):
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import deque
+
+# файл, который дописывает recorder бэкенда (backend/data смонтирован в контейнер)
+POSITIONS_FILE = os.getenv('POSITIONS_CSV', '../backend/data/positions.csv')
+ROUTE_MAXLEN = 500
+CHECK_BYTES = 64  # сколько байт начала файла и перед смещением сверяется на каждом чтении
+
+
+class PositionFeed:
+    """
+    Хвост positions.csv, который дописывает recorder бэкенда.
+
+    Файл читается с запомненного смещения в байтах: за тик разбираются
+    только новые строки, недописанная последняя строка ждёт следующего
+    чтения. Точки лежат в кольцевом буфере (seq, x, y) на ROUTE_MAXLEN
+    записей; seq растёт монотонно, по нему каждый клиент забирает только
+    то, чего ещё не видел. Файл считается пересозданным, если сменился
+    inode, он стал короче смещения или изменились уже прочитанные байты:
+    начало файла (заголовок) и последние CHECK_BYTES перед смещением.
+    Последнее ловит и перезапись на месте (os.Create в recorder обрезает
+    тот же inode) до того же или большего размера. Тогда чтение
+    начинается заново и меняется поколение: клиенту со старым
+    поколением в курсоре нужно перерисовать маршрут целиком. Первое
+    поколение берётся от времени запуска, чтобы курсор вкладки, открытой
+    до перезапуска фронтенда, тоже считался устаревшим.
+    """
+
+    def __init__(self, path=POSITIONS_FILE, maxlen=ROUTE_MAXLEN):
+        self.path = path
+        self.points = deque(maxlen=maxlen)
+        self.seq = 0
+        self.generation = int(time.time() * 1000)  # мс: курсор проходит через JS
+        self._offset = 0
+        self._rest = b''
+        self._ino = None
+        self._head = b''  # первые CHECK_BYTES файла
+        self._mark = b''  # последние CHECK_BYTES перед смещением
+        self._lock = threading.Lock()
+
+    def _replaced(self, f, st):
+        if self._ino is None:
+            return False
+        if st.st_ino != self._ino or st.st_size < self._offset:
+            return True
+        f.seek(0)
+        if f.read(len(self._head)) != self._head:
+            return True
+        f.seek(self._offset - len(self._mark))
+        return f.read(len(self._mark)) != self._mark
+
+    def _reset(self):
+        self._offset = 0
+        self._rest = b''
+        self._head = b''
+        self._mark = b''
+        self.points.clear()
+        self.generation += 1
+
+    def poll(self):
+        with self._lock:
+            try:
+                f = open(self.path, 'rb')
+            except OSError:
+                return
+            with f:
+                st = os.fstat(f.fileno())
+                if self._replaced(f, st):
+                    self._reset()
+                self._ino = st.st_ino
+                if st.st_size == self._offset:
+                    return
+                f.seek(self._offset)
+                chunk = f.read(st.st_size - self._offset)
+            self._offset += len(chunk)
+            if len(self._head) < CHECK_BYTES:
+                self._head = (self._head + chunk)[:CHECK_BYTES]
+            self._mark = (self._mark + chunk)[-CHECK_BYTES:]
+
+            lines = (self._rest + chunk).split(b'\n')
+            self._rest = lines.pop()
+            for line in lines:
+                point = self._parse(line)
+                if point is not None:
+                    self.seq += 1
+                    self.points.append((self.seq, point[0], point[1]))
+
+    @staticmethod
+    def _parse(line):
+        parts = line.strip().split(b',')
+        if len(parts) < 2:
+            return None
+        try:
+            return float(parts[0]), float(parts[1])
+        except ValueError:
+            # заголовок "x,y" или мусор
+            return None
+
+    def since(self, cursor):
+        """
+        Точки после курсора [generation, seq] (не больше буфера), новый
+        курсор и признак reset. При reset точки - весь буфер, и маршрут,
+        уже нарисованный по старому курсору, нужно заменить, а не дополнить.
+        """
+        self.poll()
+        with self._lock:
+            current = [self.generation, self.seq]
+            if cursor is None:
+                return list(self.points), current, False
+            generation, seq = cursor
+            if generation != self.generation or seq > self.seq:
+                return list(self.points), current, True
+            new = []
+            for point in reversed(self.points):
+                if point[0] <= seq:
+                    break
+                new.append(point)
+            new.reverse()
+            return new, current, False
+
+    def last(self, n):
+        with self._lock:
+            return list(self.points)[-n:]
@@ -9,6 +9,7 @@ from machine import Pin, reset
 import neopixel
 import _thread
 import math
+from array import array
 
 # --- Settings ---
 WIFI_SSID = "B18104"
@@ -23,32 +24,77 @@ COLOR_GREEN = (0, 15, 0); COLOR_RED = (15, 0, 0); COLOR_BLUE = (0, 0, 15); COLOR
 
 SEND_INTERVAL_MS = 1500
 HEALTH_CHECK_INTERVAL_MS = 15000
-
-
-def calculate_stats(data_list):
-    if not data_list:
-        return None
-    
-    n = len(data_list)
-    
-    mean = sum(data_list) / n
-    
-    variance = sum([(x - mean) ** 2 for x in data_list]) / n
-    
-    std_dev = math.sqrt(variance)
-    
-    data_list.sort()
-    median = data_list[n // 2]
-
-    max_rssi = max(data_list)
-    
-    return {
-        "avg": round(mean, 2),
-        "median": median,
-        "std_dev": round(std_dev, 2),
-        "samples": n,
-        "max_rssi": max_rssi
-    }
+RSSI_WINDOW = 16  # last N RSSI per beacon for the median
+
+
+class BeaconStats:
+    """
+    Fixed-memory stats for one beacon between sends.
+    Sum, sum of squares and max are small ints, the last RSSI_WINDOW values
+    live in a ring buffer plus a sorted copy for the median, so add() from
+    the scan IRQ does not allocate.
+    """
+
+    def __init__(self, name, size=RSSI_WINDOW):
+        self.name = name
+        self.size = size
+        self.ring = array('b', bytes(size))
+        self.sorted = array('b', bytes(size))
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.s = 0
+        self.ss = 0
+        self.max = -128
+        self.pos = 0
+        self.filled = 0
+
+    def add(self, rssi):
+        self.n += 1
+        self.s += rssi
+        self.ss += rssi * rssi
+        if rssi > self.max:
+            self.max = rssi
+
+        srt = self.sorted
+        k = self.filled
+        if k == self.size:
+            # window is full: drop the oldest value from the sorted copy
+            old = self.ring[self.pos]
+            i = 0
+            while srt[i] != old:
+                i += 1
+            while i < k - 1:
+                srt[i] = srt[i + 1]
+                i += 1
+            k -= 1
+        else:
+            self.filled = k + 1
+        self.ring[self.pos] = rssi
+        self.pos += 1
+        if self.pos == self.size:
+            self.pos = 0
+
+        # insertion into the sorted copy
+        i = k
+        while i > 0 and srt[i - 1] > rssi:
+            srt[i] = srt[i - 1]
+            i -= 1
+        srt[i] = rssi
+
+    def item(self):
+        """Payload entry; floats are only created here, at send time"""
+        n = self.n
+        mean = self.s / n
+        variance = self.ss / n - mean * mean
+        return {"name": self.name,
+            'rssi': self.sorted[self.filled // 2],
+            'rssi_avg': round(mean, 2),
+            'rssi_std': round(math.sqrt(variance if variance > 0 else 0), 2),
+            'count': n,
+            'mrssi': self.max
+        }
 
 
 class BLEScanner:
@@ -58,7 +104,10 @@ class BLEScanner:
         self.ble = bluetooth.BLE()
         self.mqtt_client = None
         self.sta_if = network.WLAN(network.STA_IF)
-        self.beacons_buffer = {}
+        # target names as bytes and their preallocated stats, same order;
+        # the scan IRQ compares names against these in place
+        self.target_bytes = [name.encode() for name in target_names]
+        self.target_stats = [BeaconStats(name) for name in target_names]
         self.np = neopixel.NeoPixel(Pin(NEOPIXEL_PIN), 1)
         self._set_led_color(COLOR_OFF)
 
@@ -99,27 +148,39 @@ class BLEScanner:
             time.sleep_ms(250) 
             self._set_led_status() 
 
-    def _decode_adv_payload(self, payload_bytes):
-        i=0; result={};
-        while i < len(payload_bytes):
-            l=payload_bytes[i];
-            if l==0: break
-            t=payload_bytes[i+1]; d=payload_bytes[i+2:i+l+1]
-            if t==9 or t==8:
-                try: result['name']=bytes(d).decode('utf-8')
-                except: pass
-            i+=l+1
-        return result
+    def _match(self, payload_bytes):
+        """
+        Stats of the target whose complete/short local name is in the
+        advertisement, or None. Runs in the scan IRQ, so the name is compared
+        in place (length, then bytes) instead of being sliced out.
+        """
+        i = 0; n = len(payload_bytes)
+        while i + 1 < n:
+            l = payload_bytes[i]
+            if l == 0: break
+            t = payload_bytes[i+1]
+            if t == 9 or t == 8:
+                start = i + 2; size = l - 1
+                if start + size > n: return None
+                names = self.target_bytes
+                for k in range(len(names)):
+                    name = names[k]
+                    if len(name) != size: continue
+                    j = 0
+                    while j < size and payload_bytes[start + j] == name[j]: j += 1
+                    if j == size: return self.target_stats[k]
+                return None
+            i += l + 1
+        return None
 
     def _scan_callback(self, event, data):
         if event == 5:
             addr_type, addr_bytes, adv_type, rssi, adv_data_bytes = data
             if rssi < self.min_rssi: return
-            adv_info = self._decode_adv_payload(adv_data_bytes)
-            if 'name' not in adv_info or adv_info['name'] not in self.target_names: return
-            device_name = adv_info['name']
+            stats = self._match(adv_data_bytes)
+            if stats is None: return
+            stats.add(rssi)
 
-            self.beacons_buffer.setdefault(device_name, []).append(rssi)
     def run(self):
         self._connect_wifi(); self._connect_mqtt()
         self.ble.active(True); self.ble.irq(self._scan_callback)
@@ -137,25 +198,15 @@ class BLEScanner:
                 if time.ticks_diff(now, last_send_time) > SEND_INTERVAL_MS:
                     last_send_time = now
 
-                    if self.beacons_buffer and self.mqtt_client:
-                        batch_payload = []
-
-                        for name, data in self.beacons_buffer.items():
-                            if not data: continue
-                            # Send averaged RSSI values
-                            stats = calculate_stats(data)
-                            if not stats: continue
-                            item = {"name": name, 
-                                #  "rssi": sum(data) / len(data), 
-                                'rssi': stats["median"],
-                                'rssi_avg' : stats["avg"],
-                                'rssi_std' : stats["std_dev"],
-                                'count': stats["samples"],
-                                'mrssi': stats["max_rssi"]
-                            }
-
-                            batch_payload.append(item)
+                    batch_payload = []
+                    if self.mqtt_client:
+                        for stats in self.target_stats:
+                            if not stats.n: continue
+                            # Send median/averaged RSSI values
+                            batch_payload.append(stats.item())
 
+                    # nothing heard in this interval: no empty "pack" on the wire
+                    if batch_payload:
                         batch_timestamp = {"pack": batch_payload, "timestamp": time.time()}
 
                         
@@ -167,7 +218,7 @@ class BLEScanner:
 
                             self._pulse_led(COLOR_BLUE)
 
-                            self.beacons_buffer.clear() # Clear buffer
+                            for stats in self.target_stats: stats.reset() # Clear stats
                         except Exception as e:
 
                             print(f"MQTT publish error: {e}. Data will be resent.")
@@ -0,0 +1,125 @@
+# src/bench_fingerprints.py
+# Запросов в секунду для KNN по отпечаткам в зависимости от размера сетки:
+# прежний цикл по dict против FingerprintIndex (brute и kdtree). Отдельно
+# запросы, где видны все маяки, и запросы с пропущенными маяками (обычный
+# случай для get_pos), на сетке, где часть маяков не видна из части точек, и
+# на сетке, где все точки видят все маяки (только там работает дерево);
+# "расх." - сколько позиций kdtree не совпало с brute.
+#
+#   python bench_fingerprints.py [--sizes 8 100 1000 5000 20000] [--queries 300]
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from main_math import FingerprintIndex
+
+BEACONS = 8
+AREA = 30.0
+DROP_BEACONS = 0.4   # доля маяков, пропущенных в запросе с пропусками
+
+
+def legacy_get_pos(fingerprints, positions, current_rssi_vector, k=3):
+    """Прежний PositionCalculator.get_pos (цикл по точкам и маякам)"""
+    point_errors = []
+    for point_name, fingerprint_vector in fingerprints.items():
+        error = 0
+        common_beacons_count = 0
+        for beacon_name, calibrated_rssi in fingerprint_vector.items():
+            if beacon_name in current_rssi_vector:
+                error += (calibrated_rssi - current_rssi_vector[beacon_name])**2
+                common_beacons_count += 1
+        if common_beacons_count >= 3:
+            point_errors.append({'name': point_name, 'error': error / common_beacons_count})
+    if not point_errors:
+        return float('nan'), float('nan')
+    point_errors.sort(key=lambda x: x['error'])
+    tw = wx = wy = 0
+    for n in point_errors[:k]:
+        w = 1.0 / (n['error'] + 0.001)
+        x, y = positions[n['name']]
+        wx += x * w
+        wy += y * w
+        tw += w
+    return wx / tw, wy / tw
+
+
+def rssi_at(beacon_xy, x, y, rng, noise=2.0):
+    d = np.maximum(np.hypot(beacon_xy[:, 0] - x, beacon_xy[:, 1] - y), 0.5)
+    return -45.0 - 25.0 * np.log10(d) + rng.normal(0, noise, len(d))
+
+
+def make_grid(n, beacon_xy, rng, unseen=0.1):
+    side = max(int(math.ceil(math.sqrt(n))), 1)
+    coords = np.linspace(0, AREA, side)
+    grid = [(x, y) for x in coords for y in coords][:n]
+    fingerprints, positions = {}, {}
+    for i, (x, y) in enumerate(grid):
+        name = f"p_{i}"
+        r = rssi_at(beacon_xy, x, y, rng, noise=0.5)
+        # часть маяков не видна из части точек
+        seen = rng.random(BEACONS) >= unseen
+        fingerprints[name] = {f"beacon_{b + 1}": float(r[b]) for b in range(BEACONS) if seen[b]}
+        positions[name] = (x, y)
+    return fingerprints, positions
+
+
+def qps(fn, queries, budget=2.0):
+    started = time.perf_counter()
+    n = 0
+    for q in queries:
+        fn(q)
+        n += 1
+        if time.perf_counter() - started > budget:
+            break
+    return n / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 100, 1000, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    beacon_xy = rng.uniform(0, AREA, (BEACONS, 2))
+    truth = rng.uniform(0, AREA, (args.queries, 2))
+    full = [{f"beacon_{b + 1}": float(v) for b, v in enumerate(rssi_at(beacon_xy, x, y, rng))}
+            for x, y in truth]
+    partial = []
+    for q in full:
+        names = list(q)
+        keep = [b for b in names if rng.random() > DROP_BEACONS]
+        if len(keep) < 3:
+            keep = list(rng.choice(names, 3, replace=False))
+        partial.append({b: q[b] for b in keep})
+
+    sparse = [(n, make_grid(n, beacon_xy, rng)) for n in args.sizes]
+    dense = [(n, make_grid(n, beacon_xy, rng, unseen=0.0)) for n in args.sizes]
+    for title, grids, queries in (
+            ("сетка с пропусками, все маяки в запросе", sparse, full),
+            (f"сетка с пропусками, ~{DROP_BEACONS:.0%} маяков пропущено", sparse, partial),
+            ("полная сетка, все маяки в запросе", dense, full),
+            (f"полная сетка, ~{DROP_BEACONS:.0%} маяков пропущено", dense, partial)):
+        print(title)
+        print(f"{'точек':>7} {'цикл, q/s':>11} {'brute, q/s':>11} {'kdtree, q/s':>12} "
+              f"{'ошибка brute/kdtree, м':>24} {'расх.':>6}")
+        for n, (fingerprints, positions) in grids:
+            row = [f"{n:7d}", f"{qps(lambda q: legacy_get_pos(fingerprints, positions, q), queries):11.0f}"]
+            errs, ests = [], []
+            for backend in ("brute", "kdtree"):
+                index = FingerprintIndex(fingerprints, positions, backend)
+                row.append(f"{qps(lambda q: index.interpolate(*index.knn(q, 3)), queries):{11 if backend == 'brute' else 12}.0f}")
+                est = np.array([index.interpolate(*index.knn(q, 3)) for q in queries])
+                ests.append(est)
+                errs.append(np.nanmean(np.hypot(*(est - truth).T)))
+            differ = int((np.hypot(*(ests[0] - ests[1]).T) > 1e-6).sum())
+            row.append(f"{errs[0]:11.2f} / {errs[1]:.2f}")
+            row.append(f"{differ:6d}")
+            print(" ".join(row))
+
+
+if __name__ == "__main__":
+    main()
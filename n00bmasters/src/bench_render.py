@@ -0,0 +1,103 @@
+# src/bench_render.py
+# Пропускная способность приёма с отрисовкой: прежний savefig на каждое
+# сообщение против PlotRenderer (отдельный поток, не чаще max_fps кадров).
+# Картинки пишутся во временную папку.
+#
+#   python bench_render.py [--messages 300] [--fps 2]
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from main_math import PositionCalculator
+from render_worker import PlotRenderer
+
+
+def load_setup():
+    points = {}
+    with open('../beacons_kpa.beacons', 'r') as fp:
+        next(fp)
+        for i in fp:
+            st, x, y = i.split(';')
+            points[int(st[-1])] = tuple(map(float, (x, y)))
+    with open('fingerprint_config.json', 'r') as f:
+        fingerprints = json.load(f)
+    return points, fingerprints
+
+
+def make_messages(fingerprints, n, rng):
+    names = list(fingerprints)
+    msgs = []
+    for _ in range(n):
+        fp = fingerprints[names[rng.integers(len(names))]]
+        msgs.append([{"id": int(b.split('_')[1]), "rssi": v + rng.normal(0, 3)} for b, v in fp.items()])
+    return msgs
+
+
+def legacy(points, calc, msgs, out):
+    fig, ax = plt.subplots()
+    ax.plot([p[0] for p in points.values()], [p[1] for p in points.values()], 'b^', markersize=10, label='Beacons')
+    position_plot = ax.plot([], [], 'ro', markersize=8, label='Current')[0]
+    f_plot = ax.plot([], [], 'ko', markersize=5, label='Path')[0]
+    ax.grid(True)
+    ax.legend()
+    pos_x, pos_y = [], []
+    started = time.perf_counter()
+    for m in msgs:
+        x, y = calc.get_pos(m)
+        pos_x.append(x)
+        pos_y.append(y)
+        f_plot.set_data(pos_x[:-1], pos_y[:-1])
+        position_plot.set_data([x], [y])
+        fig.savefig(out)
+    elapsed = time.perf_counter() - started
+    plt.close(fig)
+    return elapsed, len(msgs)
+
+
+def worker(points, calc, msgs, out, fps):
+    renderer = PlotRenderer(points, out_path=out, max_fps=fps).start()
+    started = time.perf_counter()
+    for m in msgs:
+        x, y = calc.get_pos(m)
+        renderer.update(x, y)
+    elapsed = time.perf_counter() - started
+    renderer.stop()
+    return elapsed, renderer.frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--fps", type=float, default=2.0)
+    args = parser.parse_args()
+
+    points, fingerprints = load_setup()
+    calc = PositionCalculator(points, fingerprints)
+    msgs = make_messages(fingerprints, args.messages, np.random.default_rng(0))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "plot.png")
+        t, frames = legacy(points, calc, msgs, out)
+        print(f"savefig на сообщение: {len(msgs) / t:8.1f} msg/s, {frames} кадров")
+        t, frames = worker(points, calc, msgs, out, args.fps)
+        print(f"PlotRenderer ({args.fps} fps): {len(msgs) / t:8.1f} msg/s, {frames} кадров")
+        # одна отрисовка кадра в потоке (фон из кэша)
+        renderer = PlotRenderer(points, out_path=out)
+        for m in msgs:
+            renderer.update(*calc.get_pos(m))
+        started = time.perf_counter()
+        for _ in range(20):
+            renderer.render()
+        print(f"кадр PlotRenderer: {(time.perf_counter() - started) / 20 * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
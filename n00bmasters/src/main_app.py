@@ -1,36 +1,32 @@
 # src/main_app.py
 
 
+import os
 import paho.mqtt.client as mqtt
 import numpy as np
 from main_math import PositionCalculator, Kalman2D
+from render_worker import PlotRenderer
 import json
-import matplotlib.pyplot as plt
 from math import dist
 
 calc = None
 cur_pos = [0,0]
 fl = False
 kalman_filter = None
+renderer = None
+path_file = None
 
 BEACON_COUNT = 8
 MQTT_IP = "127.0.0.1"
-
-plt.ion()  # Turn on interactive mode
-fig, ax = plt.subplots()
-x_data = []
-y_data = []
-pos_x = []
-pos_y = [] 
-ax.set_xlabel('X Position')
-ax.set_ylabel('Y Position')
-ax.set_title('Real-time Position Tracking')
-ax.grid(True)
+PLOT_MAX_FPS = float(os.getenv("PLOT_MAX_FPS", "2"))  # кадров static/plot.png в секунду
 
 def on_connect(client, userdata, flags, reason_code, properties):
-    global calc, kalman_filter, position_plot, f_plot, r_plot, ax, fig
+    global calc, kalman_filter, renderer, path_file
     points = dict()
     client.subscribe("ble_rssi/rssi")
+    if calc is not None:
+        # переподключение: состояние уже есть
+        return
     
     # 1. Загружаем координаты маяков
     with open('../beacons_kpa.beacons', 'r') as fp:
@@ -46,8 +42,9 @@ def on_connect(client, userdata, flags, reason_code, properties):
         print("FATAL: fingerprint_config.json not found! Please run fingerprint calibration first.")
         return
 
-    with open('../path.path', 'w') as f:
-        f.write(f"X;Y\n")
+    # файл пути держим открытым, на диск его сбрасывает поток отрисовки
+    path_file = open('../path.path', 'w')
+    path_file.write(f"X;Y\n")
     calc = PositionCalculator(points, fingerprints)
     print(f"Fingerprints: {fingerprints}")
 
@@ -61,29 +58,12 @@ def on_connect(client, userdata, flags, reason_code, properties):
     kalman_filter.initialize_state(0, 0)
 
 
-    beacon_x = [point[0] for point in points.values()]
-    beacon_y = [point[1] for point in points.values()]
-    beacon_plot = ax.plot(beacon_x, beacon_y, 'b^', markersize=10, label='Beacons')[0]
-    
-    # Initialize current position plot
-    global position_plot, f_plot, r_plot
-    position_plot = ax.plot([], [], 'ro', markersize=8, label='Current')[0]
-    f_plot = ax.plot([cur_pos[0]], [cur_pos[1]], 'ko', markersize=5, label='Path')[0]
-    ax.set_xlabel('X Position')
-    ax.set_ylabel('Y Position')
-    ax.set_title('Real-time Position Tracking')
-    ax.grid(True)
-    ax.legend()
-
-    # Set reasonable axis limits based on beacon positions
-    if beacon_x and beacon_y:
-        margin = 2
-        ax.set_xlim(min(beacon_x) - margin, max(beacon_x) + margin)
-        ax.set_ylim(min(beacon_y) - margin, max(beacon_y) + margin)
+    # Отрисовка в отдельном потоке, не чаще PLOT_MAX_FPS
+    renderer = PlotRenderer(points, max_fps=PLOT_MAX_FPS, on_frame=path_file.flush).start()
 
 
 def on_message(client, userdata, msg):
-    global cur_pos, fl, kalman_filter, position_plot, fig, calc, f_plot, r_plot
+    global cur_pos, fl, kalman_filter, calc
 
     try:
         data = json.loads(msg.payload.decode("utf-8"))
@@ -115,28 +95,28 @@ def on_message(client, userdata, msg):
         if dist(cur_pos, (filtered_state[0], filtered_state[1])) < 7 or not fl:
             cur_pos = [filtered_state[0], filtered_state[1]]
             fl = True
-        pos_x.append(cur_pos[0])
-        pos_y.append(cur_pos[1])
 
         print(f"RAW: ({raw_pos[0]:.2f}, {raw_pos[1]:.2f})  |  FILTERED: ({cur_pos[0]:.2f}, {cur_pos[1]:.2f})")
 
-        with open('../path.path', 'a') as f:
-            f.write(f"{str(cur_pos[0])};{str(cur_pos[1])}\n")
-        # Draw
-        f_plot.set_data(pos_x[:-1], pos_y[:-1]) 
-        position_plot.set_data([cur_pos[0]], [cur_pos[1]])
-        fig.savefig("static/plot.png")
-        fig.canvas.draw(); fig.canvas.flush_events()
-        print(cur_pos)
+        path_file.write(f"{str(cur_pos[0])};{str(cur_pos[1])}\n")
+        # Draw: только новое состояние, картинку рисует renderer
+        renderer.update(cur_pos[0], cur_pos[1])
 
     except Exception as e:
         print(f"Error processing message: {e}")
 
 
-client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-client.on_connect = on_connect
-client.on_message = on_message
+if __name__ == "__main__":
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.on_connect = on_connect
+    client.on_message = on_message
 
-client.connect(MQTT_IP, 1883, 60)
+    client.connect(MQTT_IP, 1883, 60)
 
-client.loop_forever()
+    try:
+        client.loop_forever()
+    finally:
+        if renderer is not None:
+            renderer.stop()
+        if path_file is not None:
+            path_file.close()
@@ -17,57 +17,156 @@ class Kalman2D:
     def update(self, m): self.kf.update(m)
     def initialize_state(self, x, y): self.kf.x = np.array([x, y, 0., 0.])
 
+MISSING_RSSI = -100.0    # заполнитель невидимых маяков в векторе запроса
+MIN_COMMON_BEACONS = 3
+WEIGHT_EPS = 0.001
+KDTREE_MIN_POINTS = 256  # backend="auto": дерево начиная с такой сетки
+
+
+class FingerprintIndex:
+    """
+    Отпечатки, упакованные в плотную матрицу: rssi[точка, маяк] + mask[точка, маяк]
+    (маяк был виден при калибровке). Ошибка точки - средний квадрат разницы
+    по общим маякам, как в прежнем цикле; точки с < 3 общими маяками отбрасываются.
+
+    backend="brute"  - векторный перебор всех точек;
+    backend="kdtree" - scipy cKDTree по матрице RSSI, кандидаты (k * oversample)
+                       затем переранжируются точной ошибкой.
+    Дерево ранжирует по евклидову расстоянию по всем маякам, и это совпадает
+    с ошибкой по общим маякам (квадрат расстояния = число маяков * ошибка),
+    только когда и запрос, и каждая точка видят все маяки. Поэтому дерево
+    строится лишь для таких сеток ("auto" выбирает его при >= KDTREE_MIN_POINTS
+    точек), а запрос с пропущенными маяками всегда идёт перебором.
+    """
+
+    def __init__(self, fingerprints: dict, point_positions: dict, backend="auto", oversample=4):
+        names = [name for name in fingerprints if name in point_positions]
+        beacons = sorted({b for name in names for b in _fp_rssi(fingerprints[name])})
+        self.names = names
+        self.beacon_col = {b: i for i, b in enumerate(beacons)}
+        self.xy = np.array([point_positions[name] for name in names], dtype=float).reshape(-1, 2)
+
+        self.rssi = np.zeros((len(names), len(beacons)))
+        self.mask = np.zeros((len(names), len(beacons)), dtype=bool)
+        for i, name in enumerate(names):
+            for b, v in _fp_rssi(fingerprints[name]).items():
+                j = self.beacon_col[b]
+                self.rssi[i, j] = v
+                self.mask[i, j] = True
+
+        # все точки видели все маяки: только тогда дерево даёт точный ответ
+        dense = bool(self.mask.all())
+        if backend == "auto":
+            backend = "kdtree" if dense and len(names) >= KDTREE_MIN_POINTS else "brute"
+        elif backend == "kdtree" and not dense:
+            backend = "brute"
+        self.backend = backend
+        self.oversample = oversample
+        self._tree = None
+        if backend == "kdtree":
+            from scipy.spatial import cKDTree
+            self._tree = cKDTree(self.rssi)
+        elif backend != "brute":
+            raise ValueError(f"unknown backend: {backend}")
+
+    def __len__(self):
+        return len(self.names)
+
+    def vectorize(self, rssi_by_beacon: dict):
+        q = np.full(len(self.beacon_col), MISSING_RSSI)
+        qmask = np.zeros(len(self.beacon_col), dtype=bool)
+        for b, v in rssi_by_beacon.items():
+            j = self.beacon_col.get(b)
+            if j is not None:
+                q[j] = v
+                qmask[j] = True
+        return q, qmask
+
+    def errors(self, q, qmask, rows=None):
+        """Нормированная ошибка по общим маякам; inf там, где общих < 3"""
+        rssi = self.rssi if rows is None else self.rssi[rows]
+        common = self.mask if rows is None else self.mask[rows]
+        common = common & qmask
+        counts = common.sum(axis=1)
+        err = np.where(common, rssi - q, 0.0)
+        err = (err * err).sum(axis=1)
+        ok = counts >= MIN_COMMON_BEACONS
+        return np.where(ok, err / np.maximum(counts, 1), np.inf)
+
+    def knn(self, rssi_by_beacon: dict, k: int):
+        """Индексы k ближайших точек и их ошибки (по возрастанию ошибки)"""
+        q, qmask = self.vectorize(rssi_by_beacon)
+        if qmask.sum() < MIN_COMMON_BEACONS or not len(self):
+            return np.empty(0, dtype=int), np.empty(0)
+
+        if self._tree is not None and qmask.all():
+            m = min(len(self), k * self.oversample)
+            _, cand = self._tree.query(q, k=m)
+            cand = np.atleast_1d(cand)
+            err = self.errors(q, qmask, cand)
+            if np.isfinite(err).sum() >= k or m == len(self):
+                order = np.argsort(err)[:k]
+                idx, err = cand[order], err[order]
+                keep = np.isfinite(err)
+                return idx[keep], err[keep]
+
+        err = self.errors(q, qmask)
+        if len(err) > k:
+            idx = np.argpartition(err, k)[:k]
+        else:
+            idx = np.arange(len(err))
+        idx = idx[np.argsort(err[idx])]
+        idx = idx[np.isfinite(err[idx])]
+        return idx, err[idx]
+
+    def interpolate(self, idx, err):
+        """Взвешенное среднее координат соседей: вес = 1 / (ошибка + eps)"""
+        if not len(idx):
+            return float('nan'), float('nan')
+        w = 1.0 / (err + WEIGHT_EPS)
+        x, y = (self.xy[idx] * w[:, None]).sum(axis=0) / w.sum()
+        return float(x), float(y)
+
+
+def _fp_rssi(entry):
+    """Отпечаток точки: {маяк: rssi} или {"x", "y", "rssi": {маяк: rssi}}"""
+    rssi = entry["rssi"] if isinstance(entry.get("rssi"), dict) else entry
+    out = {}
+    for b, v in rssi.items():
+        if b in ("x", "y"):
+            continue
+        # fingerprints_calibrate мог записать [median, 2]
+        out[b] = float(v[0] if isinstance(v, (list, tuple)) else v)
+    return out
+
+
+def fingerprint_positions(fingerprints: dict, beacon_positions: dict) -> dict:
+    """
+    Координаты точек калибровки: явные x/y у отпечатка,
+    иначе точка "beacon_N" стоит в координатах маяка N.
+    """
+    positions = {}
+    for name, entry in fingerprints.items():
+        if "x" in entry and "y" in entry:
+            positions[name] = (float(entry["x"]), float(entry["y"]))
+            continue
+        try:
+            positions[name] = beacon_positions[int(name.split('_')[1])]
+        except (IndexError, ValueError, KeyError):
+            print(f"Fingerprint point {name} has no position, skipped.")
+    return positions
+
+
 class PositionCalculator:
-    def __init__(self, beacon_positions: dict, fingerprints: dict):
+    def __init__(self, beacon_positions: dict, fingerprints: dict, backend="auto"):
         self.beacon_positions = beacon_positions
         self.fingerprints = fingerprints
         self.k_neighbors = 3  # TUNE
-        print("Initialized with WEIGHTED K-NEAREST NEIGHBORS (Fingerprinting) method.")
+        self.index = FingerprintIndex(fingerprints, fingerprint_positions(fingerprints, beacon_positions), backend)
+        print(f"Initialized with WEIGHTED K-NEAREST NEIGHBORS (Fingerprinting) method, "
+              f"{len(self.index)} points, backend={self.index.backend}.")
 
     def get_pos(self, beacon_measurements):
         current_rssi_vector = {f"beacon_{m['id']}": m['rssi'] for m in beacon_measurements}
-        
-        point_errors = []
-        for point_name, fingerprint_vector in self.fingerprints.items():
-            error = 0
-            common_beacons_count = 0
-            for beacon_name, calibrated_rssi in fingerprint_vector.items():
-                if beacon_name in current_rssi_vector:
-                    error += (calibrated_rssi - current_rssi_vector[beacon_name])**2
-                    common_beacons_count += 1
-            
-            if common_beacons_count >= 3:
-                normalized_error = error / common_beacons_count
-                point_errors.append({'name': point_name, 'error': normalized_error})
-
-        if not point_errors:
-            return float('nan'), float('nan')
-
-        point_errors.sort(key=lambda x: x['error'])
-        k_nearest_neighbors = point_errors[:self.k_neighbors]
-
-        total_weight = 0
-        weighted_x = 0
-        weighted_y = 0
-
-        for neighbor in k_nearest_neighbors:
-            point_name = neighbor['name']
-            error = neighbor['error']
-            
-            # Превращаем ошибку в "вес доверия". Чем меньше ошибка, тем больше вес.
-            weight = 1.0 / (error + 0.001)
-            
-            beacon_id = int(point_name.split('_')[1])
-            position = self.beacon_positions[beacon_id]
-            
-            weighted_x += position[0] * weight
-            weighted_y += position[1] * weight
-            total_weight += weight
-
-        if total_weight == 0:
-            return float('nan'), float('nan')
-
-        final_x = weighted_x / total_weight
-        final_y = weighted_y / total_weight
-        
-        return final_x, final_y
\ No newline at end of file
+        idx, err = self.index.knn(current_rssi_vector, self.k_neighbors)
+        return self.index.interpolate(idx, err)
@@ -0,0 +1,107 @@
+# src/metadata_log.py
+# Журнал метаданных картинок: JSON lines, только дозапись.
+#
+# Каждая запись - одна строка в metadata.jsonl, запись стоит O(1) вне
+# зависимости от длины истории. Все записи держим в памяти (старые первыми),
+# чтение отдаёт их без обращения к диску. По умолчанию история хранится
+# целиком. Если задан max_records, в памяти остаются только последние
+# max_records записей, а compact() раз в интервал переписывает файл атомарно
+# (tmp + os.replace) без вытесненных; без предела compact() ничего не делает.
+# При старте обрезается недописанная последняя строка (падение посреди
+# записи), а старый metadata.json импортируется один раз.
+
+import json
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class MetadataLog:
+    def __init__(self, path: Path, legacy_path: Optional[Path] = None, max_records: Optional[int] = None):
+        self.path = Path(path)
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self._records: deque = deque()
+        self._lines = 0  # строк в файле, включая вытесненные из памяти
+        self._recover(legacy_path)
+        self._f = self.path.open("a", encoding="utf-8")
+
+    def _recover(self, legacy_path):
+        if not self.path.exists():
+            if legacy_path is not None and Path(legacy_path).exists():
+                try:
+                    with Path(legacy_path).open("r") as f:
+                        legacy = json.load(f)
+                except ValueError:
+                    legacy = []
+                # в metadata.json новые записи первыми
+                self._write_all(list(reversed(legacy)))
+            else:
+                self.path.touch()
+
+        good = 0
+        with self.path.open("rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    break
+                self._add(record)
+                self._lines += 1
+                good += len(raw)
+        if good != self.path.stat().st_size:
+            print(f"{self.path}: truncating damaged tail at byte {good}")
+            with self.path.open("r+b") as f:
+                f.truncate(good)
+
+    def _add(self, record: Dict):
+        self._records.append(record)
+        if self.max_records is not None and len(self._records) > self.max_records:
+            self._records.popleft()
+
+    def _write_all(self, records: List[Dict]):
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def append(self, record: Dict):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self._add(record)
+            self._lines += 1
+
+    def newest_first(self) -> List[Dict]:
+        with self._lock:
+            return list(reversed(self._records))
+
+    def latest(self) -> Optional[Dict]:
+        with self._lock:
+            return self._records[-1] if self._records else None
+
+    def __len__(self):
+        return len(self._records)
+
+    def compact(self):
+        """Переписывает файл, если в нём есть записи, вытесненные из памяти"""
+        with self._lock:
+            if self._lines <= len(self._records):
+                return False
+            self._f.close()
+            self._write_all(self._records)
+            self._f = self.path.open("a", encoding="utf-8")
+            self._lines = len(self._records)
+            return True
+
+    def close(self):
+        with self._lock:
+            self._f.close()
@@ -0,0 +1,130 @@
+# src/render_worker.py
+# Отрисовка static/plot.png в отдельном потоке.
+#
+# on_message только сообщает новую позицию (update), поток рисует не чаще
+# max_fps раз в секунду и берёт последнее состояние — промежуточные
+# обновления схлопываются. Статичный слой (оси, сетка, маяки, легенда)
+# рисуется один раз и восстанавливается из буфера, поверх рисуются только
+# путь и текущая точка. PNG пишется во временный файл и заменяется через
+# os.replace, так что server.py не отдаст недописанную картинку.
+
+import os
+import threading
+import time
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.image as mpimg
+
+PLOT_FILE = "static/plot.png"
+MAX_FPS = 2.0
+MARGIN = 2
+
+
+class PlotRenderer:
+    def __init__(self, beacon_positions: dict, out_path=PLOT_FILE, max_fps=MAX_FPS, on_frame=None):
+        self.out_path = out_path
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.on_frame = on_frame  # вызывается после каждого кадра (например, flush файла пути)
+
+        self.fig = Figure()
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self._draw_static(beacon_positions)
+
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._path_x = []
+        self._path_y = []
+        self._cur = None
+        self.updates = 0
+        self.frames = 0
+        self._thread = None
+
+    def _draw_static(self, beacon_positions):
+        ax = self.ax
+        beacon_x = [p[0] for p in beacon_positions.values()]
+        beacon_y = [p[1] for p in beacon_positions.values()]
+        ax.plot(beacon_x, beacon_y, 'b^', markersize=10, label='Beacons')
+        self.position_plot = ax.plot([], [], 'ro', markersize=8, label='Current', animated=True)[0]
+        self.f_plot = ax.plot([], [], 'ko', markersize=5, label='Path', animated=True)[0]
+        ax.set_xlabel('X Position')
+        ax.set_ylabel('Y Position')
+        ax.set_title('Real-time Position Tracking')
+        ax.grid(True)
+        ax.legend()
+        if beacon_x and beacon_y:
+            ax.set_xlim(min(beacon_x) - MARGIN, max(beacon_x) + MARGIN)
+            ax.set_ylim(min(beacon_y) - MARGIN, max(beacon_y) + MARGIN)
+
+        # animated-артисты в полный draw не попадают: получаем чистый фон
+        self.canvas.draw()
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    # ---- вызывается из потока MQTT ----
+
+    def update(self, x, y):
+        with self._lock:
+            if self._cur is not None:
+                self._path_x.append(self._cur[0])
+                self._path_y.append(self._cur[1])
+            self._cur = (x, y)
+            self.updates += 1
+        self._dirty.set()
+
+    # ---- поток отрисовки ----
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="plot-render", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._dirty.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._dirty.wait()
+            if self._stop.is_set():
+                break
+            self._dirty.clear()
+            started = time.monotonic()
+            try:
+                self.render()
+            except Exception as e:
+                print(f"Render error: {e}")
+            # ограничение частоты кадров; обновления за это время схлопнутся
+            rest = self.min_interval - (time.monotonic() - started)
+            if rest > 0:
+                self._stop.wait(rest)
+        # последний кадр с финальным состоянием
+        if self.updates:
+            self.render()
+
+    def render(self):
+        with self._lock:
+            path_x = np.array(self._path_x)
+            path_y = np.array(self._path_y)
+            cur = self._cur
+        self.f_plot.set_data(path_x, path_y)
+        self.position_plot.set_data([cur[0]] if cur else [], [cur[1]] if cur else [])
+
+        self.canvas.restore_region(self._background)
+        self.ax.draw_artist(self.f_plot)
+        self.ax.draw_artist(self.position_plot)
+
+        tmp = self.out_path + ".tmp"
+        mpimg.imsave(tmp, np.asarray(self.canvas.buffer_rgba()), format="png")
+        os.replace(tmp, self.out_path)
+        self.frames += 1
+        if self.on_frame is not None:
+            self.on_frame()
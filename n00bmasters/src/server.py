@@ -1,6 +1,5 @@
 # main.py
 import os
-import json
 import threading
 from typing import Dict
 from fastapi import FastAPI, HTTPException
@@ -12,11 +11,14 @@ from datetime import datetime
 from pathlib import Path
 import traceback
 
+from metadata_log import MetadataLog
+
 #bin/uvicorn server:app --port 8080 --host 127.0.0.1 --reload
 
 IMAGES_DIR = Path("src/static")
 PLOT_PATH = IMAGES_DIR / "plot.png"
-METADATA_FILE = Path("metadata.json")
+METADATA_FILE = Path("metadata.json")  # legacy format, imported once
+METADATA_LOG_FILE = Path("metadata.jsonl")
 JOB_ID = "image_job"
 
 
@@ -32,28 +34,23 @@ app.add_middleware(
 # serve static files (index.html should be placed at ./static/index.html or adjust accordingly)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# thread-safe metadata access & interval
-_meta_lock = threading.Lock()
+# metadata: append-only log (metadata.jsonl) with in-memory index
 _interval_lock = threading.Lock()
 CURRENT_INTERVAL = 10  # default seconds
+COMPACT_INTERVAL = 300  # seconds between metadata log compactions
+# optional cap on kept metadata records (METADATA_MAX_RECORDS); unset keeps the full history
+METADATA_MAX_RECORDS = int(os.environ["METADATA_MAX_RECORDS"]) if os.environ.get("METADATA_MAX_RECORDS") else None
 
-if not METADATA_FILE.exists():
-    with METADATA_FILE.open("w") as f:
-        json.dump([], f)
+metadata_log = MetadataLog(METADATA_LOG_FILE, legacy_path=METADATA_FILE, max_records=METADATA_MAX_RECORDS)
 
 
 def read_metadata():
-    with _meta_lock:
-        with METADATA_FILE.open("r") as f:
-            return json.load(f)
+    """Newest first, same shape as the old metadata.json"""
+    return metadata_log.newest_first()
 
 
 def append_metadata(record: Dict):
-    with _meta_lock:
-        data = read_metadata()
-        data.insert(0, record)  # newest first
-        with METADATA_FILE.open("w") as f:
-            json.dump(data, f, indent=2)
+    metadata_log.append(record)
 
 
 def generate_plot_file():
@@ -95,16 +92,24 @@ def job_generate():
 
 scheduler = BackgroundScheduler()
 scheduler.add_job(job_generate, "interval", seconds=CURRENT_INTERVAL, id=JOB_ID, next_run_time=None)
+scheduler.add_job(metadata_log.compact, "interval", seconds=COMPACT_INTERVAL, id="metadata_compact")
 scheduler.start()
 
 
 @app.on_event("startup")
 async def startup_event():
     # ensure at least one plot exists and metadata has an entry
-    if len(read_metadata()) == 0:
+    if len(metadata_log) == 0:
         job_generate()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    scheduler.shutdown(wait=False)
+    metadata_log.compact()
+    metadata_log.close()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index():
     """
@@ -124,10 +129,10 @@ async def list_images():
 
 @app.get("/images/latest")
 async def latest_image():
-    data = read_metadata()
-    if not data:
+    latest = metadata_log.latest()
+    if latest is None:
         raise HTTPException(status_code=404, detail="No images yet")
-    return JSONResponse(data[0])
+    return JSONResponse(latest)
 
 
 @app.get("/static_plot")
@@ -40,11 +40,24 @@ def save_path(req: SavePathRequest, sm: SessionManager = Depends(
 
 @router.get("/beacons")
 def get_beacons(sm: SessionManager = Depends(get_session_manager)) -> Dict[str, Any]:
-    from app.services.config_loader import ConfigLoader
-    beacons = ConfigLoader().load_beacons_from_csv("standart.beacons")
+    beacons = sm.config_loader.load_beacons_from_csv("standart.beacons")
     return {"beacons": beacons}
 
 
+@router.get("/pipeline/stats")
+def pipeline_stats(sm: SessionManager = Depends(get_session_manager)) -> Dict[str, Any]:
+    """Отставание обработки сканов и рассылки в WS"""
+    return sm.stats()
+
+
+@router.get("/calibration")
+def calibration(sm: SessionManager = Depends(get_session_manager)) -> Dict[str, Any]:
+    """Действующие параметры модели RSSI -> расстояние"""
+    model = sm.positioning.rssi_model
+    model.reload()
+    return model.describe()
+
+
 # @router.get("/session/{session_id}/info", response_model=Union[SessionInfo, Dict[str, Any]])
 # def session_info(session_id: str, sm: SessionManager = Depends(get_session_manager)):
 #     info = sm.get_session_info(session_id)
@@ -59,11 +72,6 @@ async def ws_endpoint(websocket: WebSocket,
     await websocket.accept()
     session_id = None
 
-    if not sm.active_session:
-        await websocket.send_json({"type": "error",
-                                   "message": "no active session"})
-        return
-
     try:
         # ждём команду subscribe
         data = await websocket.receive_json()
@@ -75,8 +83,12 @@ async def ws_endpoint(websocket: WebSocket,
             await websocket.close()
             return
 
+        if not sm.add_websocket_connection(data["sessionId"], websocket):
+            await websocket.send_json({"type": "error",
+                                       "message": "no active session"})
+            await websocket.close()
+            return
         session_id = data["sessionId"]
-        sm.add_websocket_connection(session_id, websocket)
         await websocket.send_json({
             "type": "session_status",
             "sessionId": session_id,
@@ -32,6 +32,7 @@ async def on_startup():
     # сохранить loop для фоновых задач и MQTT broadcast
     loop = asyncio.get_running_loop()
     session_manager.set_loop(loop)
+    session_manager.start()
 
     # старт MQTT клиента
     mqtt_client.connect(
@@ -48,4 +49,5 @@ async def on_startup():
 @app.on_event("shutdown")
 async def on_shutdown():
     mqtt_client.disconnect()
+    session_manager.shutdown()
     print("Shutdown complete.")
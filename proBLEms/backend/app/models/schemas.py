@@ -12,6 +12,7 @@ class ScannerData(BaseModel):
     """Данные от устройства-сканера"""
     beaconReadings: List[BeaconReading]
     timestamp: Optional[float] = None
+    deviceId: Optional[str] = None
 
 
 class Position(BaseModel):
@@ -25,6 +26,8 @@ class Position(BaseModel):
 class SessionConfig(BaseModel):
     """Конфигурация новой сессии"""
     frequency: float = 5.0
+    # устройства сессии; None — все устройства
+    deviceIds: Optional[List[str]] = None
 
 
 class SessionInfo(BaseModel):
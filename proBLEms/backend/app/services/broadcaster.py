@@ -0,0 +1,177 @@
+import asyncio
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import WebSocket
+
+MAX_BROADCAST_FPS = 20.0
+CLIENT_QUEUE_SIZE = 8
+
+
+class ClientChannel:
+    """
+    Очередь отправки одного WebSocket-клиента. Отправкой занимается своя
+    задача, поэтому медленный клиент не задерживает остальных; при
+    заполнении очереди выбрасывается самый старый кадр.
+    """
+
+    def __init__(self, websocket: WebSocket,
+                 on_dead: Callable[[WebSocket], None],
+                 maxsize: int = CLIENT_QUEUE_SIZE):
+        self.websocket = websocket
+        self.on_dead = on_dead
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.sent = 0
+        self.dropped = 0
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def push(self, payload: str):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+
+    async def _run(self):
+        try:
+            while True:
+                payload = await self.queue.get()
+                await self.websocket.send_text(payload)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.on_dead(self.websocket)
+
+    def close(self):
+        self.task.cancel()
+
+
+class Broadcaster:
+    """
+    Рассылка позиций в WebSocket не чаще max_fps кадров в секунду.
+
+    Поток-обработчик вызывает publish: позиция кладётся в «последние» по
+    (сессия, устройство), будя цикл событий не больше одного раза за кадр.
+    Задача в цикле событий забирает накопленное, сериализует каждое
+    сообщение один раз и раскладывает по очередям клиентов сессии.
+    Промежуточные позиции одного устройства внутри кадра схлопываются.
+    """
+
+    def __init__(self, max_fps: float = MAX_BROADCAST_FPS,
+                 client_queue_size: int = CLIENT_QUEUE_SIZE,
+                 on_client_dead: Optional[Callable[[WebSocket], None]] = None):
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.client_queue_size = client_queue_size
+        # по умолчанию отвалившийся клиент просто убирается из рассылки
+        self.on_client_dead = on_client_dead or self.remove_client
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._scheduled = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # sessionId -> каналы; меняется только в цикле событий
+        self._channels: Dict[str, List[ClientChannel]] = {}
+        self.published = 0
+        self.coalesced = 0
+        self.frames = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Вызывается из цикла событий (startup)"""
+        if self._task is not None and not self._task.done():
+            return
+        self.loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for channels in self._channels.values():
+            for ch in channels:
+                ch.close()
+        self._channels = {}
+
+    # ---- клиенты (из цикла событий) ----
+
+    def add_client(self, session_id: str, websocket: WebSocket):
+        if self.loop is None:
+            return
+        ch = ClientChannel(websocket, self.on_client_dead,
+                           self.client_queue_size)
+        self._channels[session_id] = \
+            self._channels.get(session_id, []) + [ch]
+
+    def remove_client(self, websocket: WebSocket):
+        for session_id, channels in list(self._channels.items()):
+            keep = []
+            for ch in channels:
+                if ch.websocket is websocket:
+                    ch.close()
+                else:
+                    keep.append(ch)
+            if keep:
+                self._channels[session_id] = keep
+            else:
+                del self._channels[session_id]
+
+    def drop_session(self, session_id: str):
+        for ch in self._channels.pop(session_id, []):
+            ch.close()
+
+    # ---- из потока-обработчика ----
+
+    def publish(self, session_id: str, device_id: str,
+                message: Dict[str, Any]):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        with self._lock:
+            self.published += 1
+            devices = self._pending.setdefault(session_id, {})
+            if device_id in devices:
+                self.coalesced += 1
+            devices[device_id] = message
+            if self._scheduled:
+                return
+            self._scheduled = True
+        loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            started = loop.time()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._scheduled = False
+
+            for session_id, devices in pending.items():
+                channels = self._channels.get(session_id)
+                if not channels:
+                    continue
+                for message in devices.values():
+                    payload = json.dumps(message, ensure_ascii=False)
+                    for ch in channels:
+                        ch.push(payload)
+            self.frames += 1
+
+            # ограничение частоты кадров; новые позиции за это время схлопнутся
+            rest = self.min_interval - (loop.time() - started)
+            if rest > 0:
+                await asyncio.sleep(rest)
+
+    def stats(self) -> Dict[str, Any]:
+        channels = [ch for chs in self._channels.values() for ch in chs]
+        return {
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "frames": self.frames,
+            "clients": len(channels),
+            "client_backlog": sum(ch.queue.qsize() for ch in channels),
+            "client_sent": sum(ch.sent for ch in channels),
+            "client_dropped": sum(ch.dropped for ch in channels),
+        }
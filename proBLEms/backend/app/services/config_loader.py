@@ -1,25 +1,34 @@
 import csv
-import json
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
+import numpy as np
+
+from app.services.map_registry import BeaconMap, MapRegistry
+
 
 class ConfigLoader:
     def __init__(self, config_dir: str = "data/maps"):
         self.config_dir = Path(config_dir)
         self.config_dir.mkdir(parents=True, exist_ok=True)
+        # карты разбираются один раз, до изменения файла
+        self.maps = MapRegistry(lambda path: self._load_csv(path, ";"))
+
+    def get_map(self, map_file: str) -> BeaconMap:
+        return self.maps.get(self.config_dir / map_file)
 
     def load_beacons_from_csv(self, map_file: str, delimiter: str = ";") -> List[Dict[str, Any]]:
-        return self._load_csv(Path(self.config_dir / map_file), delimiter)
+        """Список маяков из кэша карт; не изменять"""
+        return self.get_map(map_file).beacons
 
     def load_beacons(self, map_id: str, delimiter: str = ";") -> List[Dict[str, Any]]:
         """Сначала ищем {mapId}.csv, затем {mapId}.beacons (оба — CSV с ';')."""
         csv_path = self.config_dir / f"{map_id}.csv"
         bea_path = self.config_dir / f"{map_id}.beacons"
         if csv_path.exists():
-            return self._load_csv(csv_path, delimiter)
+            return self.maps.get(csv_path).beacons
         if bea_path.exists():
-            return self._load_csv(bea_path, delimiter)
+            return self.maps.get(bea_path).beacons
         raise FileNotFoundError(f"Map files not found: {csv_path.name} or {bea_path.name}")
 
     def _load_csv(self, path: Path, default_delimiter: str) -> List[Dict[str, Any]]:
@@ -61,22 +70,17 @@ class ConfigLoader:
             print(f"Warning: Failed to parse beacon row {row}: {e}")
             return None
 
-    def save_path_to_file(self, positions: List[Dict[str, Any]],
-                          filename: str, session_id: str):
-        """Сохраняет маршрут в .path файл"""
+    def path_file(self, session_id: str, filename: str) -> Path:
+        """Путь к .path файлу маршрута сессии"""
         paths_dir = Path(f"data/paths/{session_id}")
         paths_dir.mkdir(parents=True, exist_ok=True)
+        return paths_dir / f"{filename}.path"
 
-        xy_data = [
-            {key.upper(): item[key] for key in ['x', 'y'] if key in item}
-            for item in positions
-        ]
-
-        fieldnames = ['X', 'Y']
-        file_path = paths_dir / f"{filename}.path"
+    def save_route_to_file(self, xy: np.ndarray, filename: str,
+                           session_id: str) -> Path:
+        """Сохраняет маршрут (массив (n, 2)) в .path файл"""
+        file_path = self.path_file(session_id, filename)
         with file_path.open("w", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=';')
-            writer.writeheader()
-            writer.writerows(xy_data)
-
+            f.write("X;Y\n")
+            np.savetxt(f, xy, fmt="%.6f", delimiter=";")
         return file_path
@@ -0,0 +1,63 @@
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class BeaconMap:
+    """
+    Разобранная карта маяков: координаты в массиве (n, 2), имя -> индекс
+    и исходный список dict (для API). Объект не меняется после создания,
+    поэтому его можно отдавать нескольким сессиям и потокам.
+    """
+
+    def __init__(self, name: str, beacons: List[Dict[str, Any]],
+                 version: Tuple[int, int] = (0, 0)):
+        self.name = name
+        self.version = version  # (mtime_ns, size) файла карты
+        self.beacons = beacons
+        self.ids = [str(b["id"]) for b in beacons]
+        self.index = {beacon_id: i for i, beacon_id in enumerate(self.ids)}
+        self.xy = np.array([(float(b["x"]), float(b["y"])) for b in beacons],
+                           dtype=np.float64).reshape(-1, 2)
+        self.xy.setflags(write=False)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class MapRegistry:
+    """
+    Кэш карт маяков: каждый файл разбирается один раз и перечитывается,
+    только если изменились его mtime или размер.
+    """
+
+    def __init__(self, parse: Callable[[Path], List[Dict[str, Any]]]):
+        self._parse = parse
+        self._maps: Dict[Path, BeaconMap] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, path: Path) -> BeaconMap:
+        path = Path(path)
+        st = path.stat()
+        version = (st.st_mtime_ns, st.st_size)
+        cached: Optional[BeaconMap] = self._maps.get(path)
+        if cached is not None and cached.version == version:
+            return cached
+        with self._lock:
+            cached = self._maps.get(path)
+            if cached is not None and cached.version == version:
+                return cached
+            beacon_map = BeaconMap(path.name, self._parse(path), version)
+            self._maps[path] = beacon_map
+            self.loads += 1
+            return beacon_map
+
+    def invalidate(self, path: Optional[Path] = None):
+        with self._lock:
+            if path is None:
+                self._maps.clear()
+            else:
+                self._maps.pop(Path(path), None)
@@ -5,6 +5,7 @@ from typing import Optional, Dict, Any
 import paho.mqtt.client as mqtt
 
 from app.mqtt_config import MQTT_CONFIG
+from app.services.scan_frame import decode_frame, is_frame
 from app.services.session_manager import SessionManager
 
 
@@ -37,6 +38,8 @@ class MQTTClient:
             self.is_connected = True
             print("[MQTT] Connected")
             client.subscribe(MQTT_CONFIG["topic_scan"])
+            # устройства могут публиковать в indoor/scan/data/<deviceId>
+            client.subscribe(MQTT_CONFIG["topic_scan"] + "/+")
         else:
             print(f"[MQTT] Connection failed with code {rc}")
 
@@ -47,31 +50,38 @@ class MQTTClient:
     def _on_message(self, client, userdata, msg):
 
         try:
-            payload = msg.payload.decode("utf-8")
-            data = json.loads(payload)
+            if is_frame(msg.payload):
+                # двоичные сводки окна от платы
+                data = decode_frame(msg.payload)
+            else:
+                data = json.loads(msg.payload.decode("utf-8"))
             topic = msg.topic
 
-            if topic == "indoor/scan/data":
+            scan_topic = MQTT_CONFIG["topic_scan"]
+            if topic == scan_topic:
+                self._handle_scan_data(data)
+            elif topic.startswith(scan_topic + "/"):
+                data.setdefault("deviceId", topic[len(scan_topic) + 1:])
                 self._handle_scan_data(data)
             # elif topic.startswith("indoor/control/"):
             #     self._handle_control(topic, data)
 
         except json.JSONDecodeError as e:
             print(f"[MQTT] JSON decode error: {e}")
+        except ValueError as e:
+            print(f"[MQTT] frame decode error: {e}")
         except Exception as e:
             print(f"[MQTT] message error: {e}")
 
     def _handle_scan_data(self, data: Dict[str, Any]):
-        # обязательные поля
-        for f in ("beaconReadings",):
-            if f not in data:
-                print("[MQTT] invalid scan data (missing fields)")
-                return
+        # обязательные поля: расстояния (JSON) или сводки RSSI (кадр платы)
+        if "beaconReadings" not in data and "beaconSummaries" not in data:
+            print("[MQTT] invalid scan data (missing fields)")
+            return
 
         data.setdefault("timestamp", time.time())
-        result = self.session_manager.process_scan_data(data)
-        if result.get("status") != "processed":
-            print(f"[MQTT] processing failed: {result.get('message')}")
+        # расчёт позиции — в потоке-обработчике SessionManager
+        self.session_manager.submit_scan(data)
 
     # def _handle_control(self, topic: str, data: Dict[str, Any]):
     #     command = topic.split("/")[-1]
@@ -0,0 +1,57 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class PositionStore:
+    """
+    Маршрут устройства в колонках float64 (x, y, ts).
+    Память выделяется заранее и удваивается при заполнении, поэтому
+    добавление точки — запись в массив без создания dict на каждую позицию.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        capacity = max(int(capacity), 1)
+        self._x = np.empty(capacity, dtype=np.float64)
+        self._y = np.empty(capacity, dtype=np.float64)
+        self._ts = np.empty(capacity, dtype=np.float64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._x.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self._x.nbytes + self._y.nbytes + self._ts.nbytes
+
+    def _grow(self):
+        new_capacity = self.capacity * 2
+        for name in ("_x", "_y", "_ts"):
+            old = getattr(self, name)
+            new = np.empty(new_capacity, dtype=np.float64)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def append(self, x: float, y: float, ts: float):
+        if self._size == self.capacity:
+            self._grow()
+        i = self._size
+        self._x[i] = x
+        self._y[i] = y
+        self._ts[i] = ts
+        self._size = i + 1
+
+    def last(self) -> Optional[Dict[str, float]]:
+        if not self._size:
+            return None
+        i = self._size - 1
+        return {"x": float(self._x[i]), "y": float(self._y[i]),
+                "timestamp": float(self._ts[i])}
+
+    def xy(self) -> np.ndarray:
+        """Копия маршрута в виде массива (n, 2)"""
+        return np.column_stack((self._x[:self._size], self._y[:self._size]))
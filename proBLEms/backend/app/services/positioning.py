@@ -1,7 +1,18 @@
 import math
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 import numpy as np
 
+from app.services.map_registry import BeaconMap
+from app.services.rssi_model import PathLossModel
+
+MAX_DISTANCE = 20.0  # измерения дальше не используем
+WLS_EPS = 1e-3
+WLS_LAMBDA = 1e-3    # регуляризация на случай плохой геометрии
+WLS_TOL = 1e-4       # м, критерий сходимости по шагу
+# пределы дисперсии измерения для Kalman2D, м^2
+MIN_MEASUREMENT_VAR = 0.01
+MAX_MEASUREMENT_VAR = 100.0
+
 
 class Kalman1D:
     """Простой 1D Калман для сглаживания"""
@@ -12,15 +23,17 @@ class Kalman1D:
         self.R = r  # шум измерения
         self.initialized = False
 
-    def update(self, measurement: float) -> float:
+    def update(self, measurement: float, r: Optional[float] = None) -> float:
+        """r - дисперсия этого измерения; по умолчанию постоянная self.R"""
         if not self.initialized:
             self.x = measurement
             self.initialized = True
 
+        R = self.R if r is None else r
         # prediction
         self.P = self.P + self.Q
         # update
-        K = self.P / (self.P + self.R)
+        K = self.P / (self.P + R)
         self.x = self.x + K * (measurement - self.x)
         self.P = (1 - K) * self.P
         return self.x
@@ -31,110 +44,277 @@ class Kalman2D:
         self.fx = Kalman1D(q, r)
         self.fy = Kalman1D(q, r)
 
-    def update(self, x: float, y: float) -> Tuple[float, float]:
-        return self.fx.update(x), self.fy.update(y)
+    def update(self, x: float, y: float,
+               cov: Optional[List[List[float]]] = None) -> Tuple[float, float]:
+        """
+        cov - ковариация фикса 2x2 из calculate_position; фильтры по осям
+        независимы, поэтому берём только диагональ.
+        """
+        if cov is None:
+            return self.fx.update(x), self.fy.update(y)
+        return (self.fx.update(x, _clamp_var(cov[0][0])),
+                self.fy.update(y, _clamp_var(cov[1][1])))
+
+
+def _clamp_var(v: float) -> float:
+    if not math.isfinite(v):
+        return MAX_MEASUREMENT_VAR
+    return min(max(v, MIN_MEASUREMENT_VAR), MAX_MEASUREMENT_VAR)
 
 
 class PositioningService:
     """
-    Взвешенная нелинейная трилатерация (Гаусс–Ньютон) + оценка RMSE.
+    Взвешенная нелинейная трилатерация (Гаусс–Ньютон) + оценка RMSE
+    и ковариации фикса. Решатель векторизован по пачке наборов измерений:
+    calculate_positions считает много сканов одним вызовом. RSSI из сводок
+    окна платы переводится в расстояния здесь, по калиброванной модели.
     """
 
-    def __init__(self):
+    def __init__(self, rssi_model: Optional[PathLossModel] = None):
         self.kalman = Kalman2D(q=0.003, r=2)
+        self.rssi_model = rssi_model or PathLossModel()
+
+    def readings_from_summaries(self, summaries: List[Dict[str, Any]]) \
+            -> List[Dict[str, Any]]:
+        """
+        summaries: [{'name','count','median','mad','min','max'}, ...] (RSSI)
+        Возвращает [{'name','distance',...}, ...] для calculate_position
+        """
+        return self.rssi_model.to_readings(summaries)
 
     def calculate_position(self, readings: List[Dict[str, Any]],
-                           beacons: List[Dict[str, Any]]) -> Dict[str, float]:
+                           beacons: Union[BeaconMap, List[Dict[str, Any]]]) -> Dict[str, Any]:
         """
-        readings: [{'beaconId','distance'}, ...]
-        beacons:  [{'id','x','y'}, ...]
-        Возвращает {'x','y','accuracy'}
+        readings: [{'name','distance'}, ...]
+        beacons:  BeaconMap из реестра карт или [{'id','x','y'}, ...]
+        Возвращает {'x','y','accuracy','covariance'}
         """
         if not readings or not beacons:
             raise ValueError("No readings or beacons")
 
-        # карта маяков
-        beacon_map = {str(b["id"]): b for b in beacons}
-
-        # нормализуем ключи измерений (поддержим и старое 'name' на всякий случай)
-        usable = [r for r in readings if r["name"] in beacon_map and r[
-            "distance"] <= 20.0]
+        beacon_map = self._as_map(beacons)
+        idx, dists = self._usable(readings, beacon_map)
 
         # минимально 3
-        if len(usable) < 3:
+        if len(idx) < 3:
             raise ValueError("At least 3 beacons required for trilateration")
 
-        # сортируем по ближним (НЕ reverse)
-        usable.sort(key=lambda r: r["distance"])
+        pts = beacon_map.xy[idx]
+        x, y, cov, rmse = self._gauss_newton_wls_one(
+            pts[:, 0].tolist(), pts[:, 1].tolist(), dists)
+        return self._result((x, y), cov, rmse)
+
+    def calculate_positions(self, readings_list: List[List[Dict[str, Any]]],
+                            beacons: Union[BeaconMap, List[Dict[str, Any]]]) \
+            -> List[Optional[Dict[str, Any]]]:
+        """
+        Пачка сканов одним вызовом решателя (повтор записи, много сессий).
+        Для скана, где меньше 3 пригодных маяков, возвращается None.
+        """
+        beacon_map = self._as_map(beacons)
+        rows = [self._usable(readings or [], beacon_map)
+                for readings in readings_list]
+        ok = [i for i, (idx, _) in enumerate(rows) if len(idx) >= 3]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        if not ok:
+            return results
+
+        # выравниваем до максимального числа маяков; лишнее закрыто маской
+        n = max(len(rows[i][0]) for i in ok)
+        idx = np.zeros((len(ok), n), dtype=np.intp)
+        d = np.ones((len(ok), n))
+        mask = np.zeros((len(ok), n), dtype=bool)
+        for k, i in enumerate(ok):
+            m = len(rows[i][0])
+            idx[k, :m] = rows[i][0]
+            d[k, :m] = rows[i][1]
+            mask[k, :m] = True
 
-        # берём до 6 ближайших (обычно 4 достаточно)
-        top = usable[:]
+        xy, cov, rmse = self._gauss_newton_wls(beacon_map.xy[idx], d, mask)
+        for k, i in enumerate(ok):
+            results[i] = self._result(xy[k], cov[k], rmse[k])
+        return results
 
-        pts: List[Tuple[float, float]] = []
+    @staticmethod
+    def _as_map(beacons: Union[BeaconMap, List[Dict[str, Any]]]) -> BeaconMap:
+        # список dict разбираем здесь; BeaconMap уже готов к расчёту
+        return beacons if isinstance(beacons, BeaconMap) \
+            else BeaconMap("", beacons)
+
+    @staticmethod
+    def _usable(readings: List[Dict[str, Any]],
+                beacon_map: BeaconMap) -> Tuple[List[int], List[float]]:
+        index = beacon_map.index
+        idx: List[int] = []
         dists: List[float] = []
-        for reading in top:
-            beacon = beacon_map[reading["name"]]
-            pts.append((float(beacon["x"]), float(beacon["y"])))
-            dists.append(float(reading["distance"]))
+        for reading in readings:
+            i = index.get(reading["name"])
+            if i is not None and reading["distance"] <= MAX_DISTANCE:
+                idx.append(i)
+                dists.append(float(reading["distance"]))
+        return idx, dists
 
-        # Гаусс–Ньютон c весами (веса ~ 1/d^2)
-        x, y = self._gauss_newton_wls(np.array(pts), np.array(dists))
+    @staticmethod
+    def _result(xy, cov, rmse: float) -> Dict[str, Any]:
+        return {"x": float(xy[0]), "y": float(xy[1]),
+                "accuracy": float(rmse),
+                "covariance": [[float(cov[0][0]), float(cov[0][1])],
+                               [float(cov[1][0]), float(cov[1][1])]]}
 
-        # RMSE по невязкам
-        pred = np.sqrt(
-            (np.array(pts)[:, 0] - x) ** 2 + (np.array(pts)[:, 1] - y) ** 2)
-        rmse = float(np.sqrt(np.mean((pred - dists) ** 2)))
-        return {"x": float(x), "y": float(y), "accuracy": float(rmse)}
+    @staticmethod
+    def _gauss_newton_wls_one(px: List[float], py: List[float],
+                              dists: List[float], iters: int = 30) \
+            -> Tuple[float, float, List[List[float]], float]:
+        """
+        То же, что _gauss_newton_wls, для одного набора. Маяков обычно
+        4-8, и на таких размерах суммы на чистом Python быстрее, чем
+        вызовы NumPy: нормальные уравнения 2x2 копятся в скалярах.
+        """
+        n = len(dists)
+        w = [1.0 / max(d, WLS_EPS) ** 2 for d in dists]
+        w_sum = sum(w)
+        x = sum(wi * bx for wi, bx in zip(w, px)) / w_sum
+        y = sum(wi * by for wi, by in zip(w, py)) / w_sum
+
+        def normal_equations():
+            hxx = hxy = hyy = gx = gy = rr = s2 = 0.0
+            for i in range(n):
+                dx = x - px[i]
+                dy = y - py[i]
+                ri = math.hypot(dx, dy)
+                r = ri - dists[i]
+                ri = max(ri, WLS_EPS)
+                jx = dx / ri
+                jy = dy / ri
+                wi = w[i]
+                hxx += wi * jx * jx
+                hxy += wi * jx * jy
+                hyy += wi * jy * jy
+                gx += wi * jx * r
+                gy += wi * jy * r
+                rr += r * r
+                s2 += wi * r * r
+            return hxx, hxy, hyy, gx, gy, rr, s2
+
+        for _ in range(iters):
+            hxx, hxy, hyy, gx, gy, _rr, _s2 = normal_equations()
+            axx = hxx + WLS_LAMBDA
+            ayy = hyy + WLS_LAMBDA
+            det = axx * ayy - hxy * hxy
+            ddx = (hxy * gy - ayy * gx) / det
+            ddy = (hxy * gx - axx * gy) / det
+            x += ddx
+            y += ddy
+            if math.hypot(ddx, ddy) < WLS_TOL:
+                break
+
+        hxx, hxy, hyy, _gx, _gy, rr, s2 = normal_equations()
+        s2 /= max(n - 2, 1)
+        det = hxx * hyy - hxy * hxy
+        if abs(det) > 1e-12:
+            cov = [[s2 * hyy / det, -s2 * hxy / det],
+                   [-s2 * hxy / det, s2 * hxx / det]]
+        else:
+            cov = [[math.nan, math.nan], [math.nan, math.nan]]
+        return x, y, cov, math.sqrt(rr / n)
 
     def _gauss_newton_wls(self, pts: np.ndarray, dists: np.ndarray,
-                          iters: int = 30) -> Tuple[float, float]:
+                          mask: Optional[np.ndarray] = None,
+                          iters: int = 30) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
-        Нелинейный WLS:
+        Нелинейный WLS для пачки из B наборов по n маяков:
           минимизируем sum(w_i * (||p - P_i|| - d_i)^2),
-          w_i = 1 / max(d_i, eps)^2.
-        """
-        eps = 1e-3
-        # начальная оценка — взв. среднее якорей по 1/d^2
-        w0 = 1.0 / np.maximum(dists, eps) ** 2
-        x = np.average(pts[:, 0], weights=w0)
-        y = np.average(pts[:, 1], weights=w0)
+          w_i = 1 / max(d_i, eps)^2 (0 для закрытых маской).
+        pts (B, n, 2), dists (B, n), mask (B, n) или None.
 
-        for _ in range(iters):
-            dx = x - pts[:, 0]
-            dy = y - pts[:, 1]
-            ri = np.sqrt(dx * dx + dy * dy)  # текущие расстояния
-            # защищаемся от нуля
-            ri_safe = np.maximum(ri, eps)
+        Нормальные уравнения 2x2 собираются прямо из сумм и решаются явно,
+        без матрицы весов n x n и np.linalg; все рабочие массивы выделяются
+        один раз до итераций. Наборы, которые сошлись, дальше не двигаются.
 
-            # невязки
-            r = ri - dists
+        Возвращает xy (B, 2), ковариацию (B, 2, 2) = s^2 * H^-1, где
+        s^2 = sum(w r^2) / (n - 2), и RMSE невязок (B,).
+        """
+        px, py = pts[..., 0], pts[..., 1]
+        w = 1.0 / np.maximum(dists, WLS_EPS) ** 2
+        if mask is not None:
+            w = np.where(mask, w, 0.0)
+            n_used = mask.sum(axis=1)
+        else:
+            n_used = np.full(dists.shape[0], dists.shape[1])
 
-            # Якобиан (dr/dx, dr/dy) для каждого i
-            J = np.stack([dx / ri_safe, dy / ri_safe], axis=1) # nx2
+        # начальная оценка — взв. среднее якорей по 1/d^2
+        w_sum = w.sum(axis=1)
+        x = (w * px).sum(axis=1) / w_sum
+        y = (w * py).sum(axis=1) / w_sum
 
-            # веса
-            W = np.diag(1.0 / np.maximum(dists, eps) ** 2) # nxn
+        shape = dists.shape
+        dx, dy = np.empty(shape), np.empty(shape)
+        ri, r = np.empty(shape), np.empty(shape)
+        jx, jy, tmp = np.empty(shape), np.empty(shape), np.empty(shape)
+        wjx, wjy = np.empty(shape), np.empty(shape)
+        active = np.ones(shape[0], dtype=bool)
+        all_active = True
 
-            # шаг ГН: (J^T W J) Δ = - J^T W r
-            JT_W = J.T @ W # 2xn
-            H = JT_W @ J # 2x2
-            g = JT_W @ r # 2x1
+        def residuals():
+            np.subtract(x[:, None], px, out=dx)
+            np.subtract(y[:, None], py, out=dy)
+            np.hypot(dx, dy, out=ri)
+            np.subtract(ri, dists, out=r)
+            # Якобиан (dr/dx, dr/dy); защищаемся от нуля
+            np.maximum(ri, WLS_EPS, out=tmp)
+            np.divide(dx, tmp, out=jx)
+            np.divide(dy, tmp, out=jy)
+            np.multiply(w, jx, out=wjx)
+            np.multiply(w, jy, out=wjy)
 
-            # регуляризация на случай плохой геометрии
-            lam = 1e-3
-            H_reg = H + lam * np.eye(2) # 2x2
+        def row_dot(a, b):
+            return np.einsum("ij,ij->i", a, b)
 
-            try:
-                delta = -np.linalg.solve(H_reg, g)
-            except np.linalg.LinAlgError:
-                break
+        for _ in range(iters):
+            residuals()
+            hxx = row_dot(wjx, jx)
+            hxy = row_dot(wjx, jy)
+            hyy = row_dot(wjy, jy)
+            gx = row_dot(wjx, r)
+            gy = row_dot(wjy, r)
 
-            # апдейт
-            x += float(delta[0])
-            y += float(delta[1])
+            # шаг ГН: (J^T W J + lam I) Δ = - J^T W r, решение 2x2 явно
+            axx = hxx + WLS_LAMBDA
+            ayy = hyy + WLS_LAMBDA
+            det = axx * ayy - hxy * hxy
+            ddx = (hxy * gy - ayy * gx) / det
+            ddy = (hxy * gx - axx * gy) / det
+            if not all_active:
+                ddx[~active] = 0.0
+                ddy[~active] = 0.0
+            x += ddx
+            y += ddy
 
             # критерий сходимости
-            if np.linalg.norm(delta) < 1e-4:
+            active &= np.hypot(ddx, ddy) >= WLS_TOL
+            all_active = active.all()
+            if not all_active and not active.any():
                 break
 
-        return x, y
+        residuals()
+        hxx = row_dot(wjx, jx)
+        hxy = row_dot(wjx, jy)
+        hyy = row_dot(wjy, jy)
+        np.multiply(w, r, out=tmp)
+        s2 = row_dot(tmp, r) / np.maximum(n_used - 2, 1)
+        det = hxx * hyy - hxy * hxy
+        det = np.where(np.abs(det) > 1e-12, det, np.nan)
+        cov = np.empty((shape[0], 2, 2))
+        cov[:, 0, 0] = s2 * hyy / det
+        cov[:, 1, 1] = s2 * hxx / det
+        cov[:, 0, 1] = cov[:, 1, 0] = -s2 * hxy / det
+
+        if mask is not None:
+            np.multiply(r, r, out=tmp)
+            tmp[~mask] = 0.0
+            rmse = np.sqrt(tmp.sum(axis=1) / n_used)
+        else:
+            rmse = np.sqrt(np.mean(r * r, axis=1))
+
+        return np.column_stack((x, y)), cov, rmse
@@ -0,0 +1,41 @@
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class RouteWriter:
+    """
+    Пишет маршрут в .path (X;Y) по мере поступления точек.
+    Файл держим открытым, сбрасываем на диск не чаще flush_interval секунд,
+    поэтому остановка сессии не требует перезаписи всего маршрута.
+    """
+
+    def __init__(self, file_path: Path, flush_interval: float = 1.0):
+        self.file_path = Path(file_path)
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self._f = self.file_path.open("w", encoding="utf-8")
+        self._f.write("X;Y\n")
+        self._last_flush = time.monotonic()
+        self.points = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._f.closed
+
+    def write(self, x: float, y: float, now: Optional[float] = None):
+        self._f.write(f"{x:.6f};{y:.6f}\n")
+        self.points += 1
+        now = time.monotonic() if now is None else now
+        if now - self._last_flush >= self.flush_interval:
+            self._f.flush()
+            self._last_flush = now
+
+    def flush(self):
+        if not self._f.closed:
+            self._f.flush()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# значения, которые раньше были зашиты в прошивку (calculate_distance)
+DEFAULT_TX_POWER = -45.0
+DEFAULT_PATH_LOSS_N = 2.0
+CALIBRATION_FILE = os.getenv("RSSI_CALIBRATION", "data/calibration.json")
+CHECK_INTERVAL = 1.0  # с, как часто проверять файл калибровки
+
+
+class PathLossModel:
+    """
+    Логарифмическая модель затухания d = 10 ** ((tx_power - rssi) / (10 n))
+    с параметрами по умолчанию и поправками для отдельных маяков.
+
+    Параметры читаются из JSON-файла
+        {"tx_power": -45, "n": 2.0,
+         "beacons": {"beacon_1": {"tx_power": -52, "n": 2.2}}}
+    и перечитываются, когда меняются его mtime или размер, поэтому для
+    новой калибровки достаточно поправить файл, без перепрошивки платы.
+    Если файла нет, действуют значения по умолчанию.
+    """
+
+    def __init__(self, path: Optional[str] = CALIBRATION_FILE):
+        self.path = Path(path) if path else None
+        self.tx_power = DEFAULT_TX_POWER
+        self.n = DEFAULT_PATH_LOSS_N
+        self._beacons: Dict[str, Tuple[float, float]] = {}
+        self._version: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.reload()
+
+    def reload(self, force: bool = False):
+        if self.path is None:
+            return
+        try:
+            st = self.path.stat()
+            version = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            version = None
+        with self._lock:
+            self._checked = time.monotonic()
+            if version == self._version and not force:
+                return
+            self._version = version
+            if version is None:
+                self._apply({})
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._apply(json.load(f))
+                self.loads += 1
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                # битый файл: оставляем прежние параметры
+                print(f"[RSSI] calibration error in {self.path}: {e}")
+
+    def _apply(self, cfg: Dict[str, Any]):
+        tx_power = float(cfg.get("tx_power", DEFAULT_TX_POWER))
+        n = float(cfg.get("n", DEFAULT_PATH_LOSS_N))
+        beacons = {}
+        for name, p in (cfg.get("beacons") or {}).items():
+            beacons[str(name)] = (float(p.get("tx_power", tx_power)),
+                                  float(p.get("n", n)))
+        self.tx_power, self.n, self._beacons = tx_power, n, beacons
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._checked >= CHECK_INTERVAL:
+            self.reload()
+
+    def params(self, name: str) -> Tuple[float, float]:
+        return self._beacons.get(name, (self.tx_power, self.n))
+
+    def distance(self, name: str, rssi: float) -> float:
+        tx_power, n = self.params(name)
+        return 10 ** ((tx_power - rssi) / (10 * n))
+
+    def to_readings(self, summaries: List[Dict[str, Any]]) \
+            -> List[Dict[str, Any]]:
+        """
+        Сводки окна от платы -> [{'name','distance','rssi','mad','count'}].
+        Расстояние считается по медиане RSSI: она уже устойчива к выбросам,
+        которые раньше отсекал MAD-фильтр на плате.
+        """
+        self._maybe_reload()
+        readings = []
+        for s in summaries:
+            if not s.get("count"):
+                continue
+            rssi = float(s["median"])
+            readings.append({"name": s["name"],
+                             "distance": self.distance(s["name"], rssi),
+                             "rssi": rssi, "mad": s.get("mad"),
+                             "count": s["count"]})
+        return readings
+
+    def describe(self) -> Dict[str, Any]:
+        return {"file": str(self.path) if self.path else None,
+                "loaded": self._version is not None,
+                "tx_power": self.tx_power, "n": self.n,
+                "beacons": {name: {"tx_power": t, "n": n}
+                            for name, (t, n) in self._beacons.items()}}
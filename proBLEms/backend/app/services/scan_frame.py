@@ -0,0 +1,56 @@
+"""
+Двоичный кадр окна сканирования от платы (firmware/main.py).
+
+Little-endian. Заголовок, 5 байт:
+    magic   u8   0xB5
+    version u8   1
+    count   u8   число маяков в кадре
+    window  u16  длительность окна, мс
+Далее count записей:
+    name_len u8, name (name_len байт, ASCII)
+    samples  u16  число пакетов за окно
+    median   i16  медиана RSSI, 0.1 dBm
+    mad      u16  MAD RSSI (без множителя 1.4826), 0.1 dB
+    min      i8   минимальный RSSI, dBm
+    max      i8   максимальный RSSI, dBm
+
+JSON всегда начинается с '{', поэтому форматы различаются по первому байту.
+"""
+import struct
+from typing import Any, Dict, List
+
+FRAME_MAGIC = 0xB5
+FRAME_VERSION = 1
+
+_HEADER = struct.Struct("<BBBH")
+_RECORD = struct.Struct("<HhHbb")
+
+
+def is_frame(payload: bytes) -> bool:
+    return len(payload) >= _HEADER.size and payload[0] == FRAME_MAGIC
+
+
+def decode_frame(payload: bytes) -> Dict[str, Any]:
+    """
+    Возвращает {'windowMs', 'beaconSummaries': [{'name','count','median',
+    'mad','min','max'}, ...]}; RSSI в dBm. Битый кадр -> ValueError.
+    """
+    magic, version, count, window_ms = _HEADER.unpack_from(payload, 0)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError(f"unsupported frame {magic:#x} v{version}")
+
+    summaries: List[Dict[str, Any]] = []
+    pos = _HEADER.size
+    try:
+        for _ in range(count):
+            name_len = payload[pos]
+            name = bytes(payload[pos + 1:pos + 1 + name_len]).decode("ascii")
+            pos += 1 + name_len
+            samples, median, mad, lo, hi = _RECORD.unpack_from(payload, pos)
+            pos += _RECORD.size
+            summaries.append({"name": name, "count": samples,
+                              "median": median / 10.0, "mad": mad / 10.0,
+                              "min": lo, "max": hi})
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"truncated frame: {e}") from e
+    return {"windowMs": window_ms, "beaconSummaries": summaries}
@@ -0,0 +1,64 @@
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+
+class ScanQueue:
+    """
+    Очередь от потока MQTT к потоку-обработчику с ограничением по сканам.
+    put_scan не блокирует: при переполнении выбрасывается самый старый
+    скан (устаревшие позиции всё равно не нужны). Служебные задания
+    (сохранение, остановка) не выбрасываются и не учитываются в лимите.
+    Счётчики позволяют видеть отставание обработчика при всплесках.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: deque = deque()
+        self._scans = 0
+        self._cond = threading.Condition(threading.Lock())
+        self.enqueued = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self) -> int:
+        return self._scans
+
+    def put_scan(self, scan: Dict[str, Any]):
+        with self._cond:
+            if self._scans >= self.maxsize:
+                self._drop_oldest_scan()
+            self._items.append(scan)
+            self._scans += 1
+            self.enqueued += 1
+            if self._scans > self.high_water:
+                self.high_water = self._scans
+            self._cond.notify()
+
+    def put(self, item: Any):
+        """Служебное задание (кортеж) или None для остановки"""
+        with self._cond:
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self) -> Any:
+        with self._cond:
+            while not self._items:
+                self._cond.wait()
+            item = self._items.popleft()
+            if isinstance(item, dict):
+                self._scans -= 1
+            return item
+
+    def _drop_oldest_scan(self):
+        for i, item in enumerate(self._items):
+            if isinstance(item, dict):
+                del self._items[i]
+                self._scans -= 1
+                self.dropped += 1
+                return
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        return {"depth": self._scans, "maxsize": self.maxsize,
+                "enqueued": self.enqueued, "dropped": self.dropped,
+                "high_water": self.high_water}
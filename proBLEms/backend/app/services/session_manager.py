@@ -1,10 +1,10 @@
 import math
 import uuid
 import time
-import json
 import asyncio
 import threading
-from typing import Dict, List, Any, Optional
+import concurrent.futures
+from typing import Dict, List, Any, Optional, Callable
 
 from fastapi import WebSocket
 import paho.mqtt.client as mqtt
@@ -12,63 +12,204 @@ import paho.mqtt.client as mqtt
 from app.mqtt_config import MQTT_CONFIG
 from app.services.positioning import PositioningService, Kalman2D
 from app.services.config_loader import ConfigLoader
+from app.services.map_registry import BeaconMap
+from app.services.position_store import PositionStore
+from app.services.route_writer import RouteWriter
+from app.services.scan_queue import ScanQueue
+from app.services.broadcaster import Broadcaster
+
+DEFAULT_DEVICE = "default"
+SCAN_QUEUE_SIZE = 256
+
+
+class DeviceTrack:
+    """Состояние одного устройства внутри сессии: фильтр, маршрут, файл"""
+
+    def __init__(self, device_id: str, route_path):
+        self.device_id = device_id
+        self.kf = Kalman2D()  # фильтр на устройство
+        self.positions = PositionStore()
+        self.route = RouteWriter(route_path)
+        self.last_reading: List[Dict[str, Any]] = []
+
+    def close(self):
+        self.route.close()
+
+
+class TrackingSession:
+    """
+    Сессия отслеживания: маяки, устройства (deviceId -> DeviceTrack)
+    и подписанные WebSocket-клиенты.
+    """
+
+    def __init__(self, session_id: str, config: Dict[str, Any],
+                 beacon_map: BeaconMap, config_loader: ConfigLoader):
+        self.id = session_id
+        self.config = config
+        self.beacon_map = beacon_map
+        self.beacons = beacon_map.beacons
+        device_ids = config.get("deviceIds")
+        self.device_ids = set(device_ids) if device_ids else None
+        self.config_loader = config_loader
+        self.tracks: Dict[str, DeviceTrack] = {}
+        self.websockets: List[WebSocket] = []
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.status = "active"
+        self.tracking = False
+
+    def accepts(self, device_id: str) -> bool:
+        return self.device_ids is None or device_id in self.device_ids
+
+    def route_name(self, device_id: str, filename: Optional[str] = None) -> str:
+        filename = filename or self.id
+        if device_id == DEFAULT_DEVICE:
+            return filename
+        return f"{filename}_{device_id}"
+
+    def track(self, device_id: str) -> DeviceTrack:
+        track = self.tracks.get(device_id)
+        if track is None:
+            path = self.config_loader.path_file(
+                self.id, self.route_name(device_id))
+            track = self.tracks[device_id] = DeviceTrack(device_id, path)
+        return track
+
+    def points_count(self) -> int:
+        return sum(len(t.positions) for t in self.tracks.values())
+
+    def close(self):
+        for track in self.tracks.values():
+            track.close()
 
 
 class SessionManager:
     """
-    Держит активную сессию, ее позиции, WebSocket-подключения.
-    Потокобезопасно: MQTT callbacks могут приходить из другого потока (paho-mqtt).
-    Для отправки в WS используем event loop FastAPI.
+    Держит сессии (sessionId -> TrackingSession), их устройства и WebSocket-подключения.
+
+    Данные сканера из потока paho-mqtt только кладутся в очередь; позиции
+    считает один поток-обработчик. Словарь сессий заменяется целиком под
+    замком (copy-on-write), поэтому обработчик читает его без блокировок.
+    Все изменения состояния сессий (сохранение, остановка) тоже выполняются
+    в потоке-обработчике, через ту же очередь. Очередь ограничена: при
+    всплесках выбрасываются самые старые сканы, отставание видно в stats().
+    Позиции уходят в WS через Broadcaster в event loop FastAPI
+    (схлопывание до MAX_BROADCAST_FPS, своя очередь на клиента).
     """
 
     def __init__(self, loop: Optional[
             asyncio.AbstractEventLoop] = None):
-        self.mqtt_client = None
-        self.tracking_started = False
-        self.active_session: Dict[str, Any] = {}
-        self.websocket_connections: List[WebSocket] = []
+        self.mqqt_client = None
+        self._sessions: Dict[str, TrackingSession] = {}
         self.positioning = PositioningService()
         self.config_loader = ConfigLoader()
         self.loop = loop  # event loop FastAPI
         self._lock = threading.RLock()
+        self._scan_queue = ScanQueue(SCAN_QUEUE_SIZE)
+        self._worker: Optional[threading.Thread] = None
+        self.broadcaster = Broadcaster(
+            on_client_dead=self.remove_websocket_connection)
 
     def set_loop(self, loop: asyncio.AbstractEventLoop):
+        """Вызывается из event loop (startup): запускает рассылку"""
         self.loop = loop
+        self.broadcaster.start(loop)
 
     def set_mqqt_client(self, mqqt_client: mqtt.Client):
         self.mqqt_client = mqqt_client
 
+    # ---- поток-обработчик ----
+
+    def start(self):
+        """Запускает поток-обработчик сканов"""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(
+                target=self._scan_worker, name="scan-worker", daemon=True)
+            self._worker.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        self.broadcaster.stop()
+        worker = self._worker
+        if worker is None:
+            return
+        self._scan_queue.put(None)
+        worker.join(timeout)
+        self._worker = None
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            session.close()
+
+    def _worker_alive(self) -> bool:
+        return self._worker is not None and self._worker.is_alive() \
+            and threading.current_thread() is not self._worker
+
+    def _scan_worker(self):
+        while True:
+            item = self._scan_queue.get()
+            if item is None:
+                return
+            if isinstance(item, tuple):
+                fn, fut = item
+                try:
+                    fut.set_result(fn())
+                except Exception as e:
+                    fut.set_exception(e)
+                continue
+            result = self.process_scan_data(item)
+            if result.get("status") != "processed":
+                print(f"[SCAN] processing failed: {result.get('message')}")
+
+    def _call_on_worker(self, fn: Callable[[], Any]) -> "concurrent.futures.Future":
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+        if not self._worker_alive():
+            try:
+                fut.set_result(fn())
+            except Exception as e:
+                fut.set_exception(e)
+            return fut
+        self._scan_queue.put((fn, fut))
+        return fut
+
+    def submit_scan(self, scan_data: Dict[str, Any]):
+        """Вызывается из потока MQTT: только постановка в очередь"""
+        if self._worker is None:
+            self.process_scan_data(scan_data)
+        else:
+            self._scan_queue.put_scan(scan_data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"scan_queue": self._scan_queue.stats(),
+                "broadcast": self.broadcaster.stats()}
+
+    # ---- сессии ----
+
+    def get_session(self, session_id: str) -> Optional[TrackingSession]:
+        return self._sessions.get(session_id)
+
+    def has_session(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
     def start_session(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """Создаёт новую сессию отслеживания"""
-        if self.active_session:
-            return {
-                "sessionId": None,
-                "status": "error",
-                "message": f"Session already started"
-            }
-
         session_id = str(uuid.uuid4())
         try:
-            beacons = self.config_loader.load_beacons_from_csv(
-                "standart.beacons")
+            beacon_map = self.config_loader.get_map("standart.beacons")
+            session = TrackingSession(session_id, config, beacon_map,
+                                      self.config_loader)
             with self._lock:
-                self.active_session = {
-                    "id": session_id,
-                    "config": config,
-                    "beacons": beacons,
-                    "positions": [],
-                    "last_reading": [],
-                    "start_time": time.time(),
-                    "status": "active",
-                    "kf": Kalman2D(),  # фильтр на сессию
-                }
+                sessions = dict(self._sessions)
+                sessions[session_id] = session
+                self._sessions = sessions
             period_ms = int(1000 / float(config["frequency"]))
             print(period_ms)
             self.publish_scan_duration(period_ms)
             return {
                 "sessionId": session_id,
                 "status": "started",
-                "beacons_loaded": len(beacons),
+                "beacons_loaded": len(beacon_map),
                 "message": f"Session started with "
                            f"{config.get('frequency', 5.0)}Hz frequency",
             }
@@ -80,7 +221,7 @@ class SessionManager:
             }
 
     def publish_scan_duration(self, duration):
-        if not self.mqqt_client.is_connected():
+        if self.mqqt_client is None or not self.mqqt_client.is_connected():
             return
         try:
             self.mqqt_client.publish(MQTT_CONFIG["topic_config"], duration)
@@ -88,21 +229,24 @@ class SessionManager:
             print(f"[MQTT] publish error: {e}")
 
     async def stop_session(self, session_id: str) -> Dict[str, Any]:
-        """Останавливает сессию, закрывает WS"""
+        """Останавливает сессию, дописывает маршруты, закрывает WS"""
         with self._lock:
-            self.tracking_started = False
-        self.save_session_path(session_id, session_id)
-
-        with self._lock:
-            session = self.active_session.copy()
-            conns = self.websocket_connections.copy()
-            self.active_session.clear()
-            self.websocket_connections.clear()
-        if not session:
+            sessions = dict(self._sessions)
+            session = sessions.pop(session_id, None)
+            self._sessions = sessions
+        if session is None:
             return {"status": "error", "message": "Session not found"}
+        self.broadcaster.drop_session(session_id)
 
-        session["status"] = "stopped"
-        session["end_time"] = time.time()
+        def finish():
+            session.tracking = False
+            session.status = "stopped"
+            session.end_time = time.time()
+            session.close()
+            return session.points_count(), list(session.websockets)
+
+        points_count, conns = await asyncio.wrap_future(
+            self._call_on_worker(finish))
 
         for ws in conns:
             try:
@@ -110,75 +254,107 @@ class SessionManager:
             except Exception:
                 pass
 
-        duration = session["end_time"] - session["start_time"]
+        duration = session.end_time - session.start_time
         return {
             "status": "stopped",
             "sessionId": session_id,
-            "points_count": len(session["positions"]),
+            "points_count": points_count,
             "duration_seconds": round(duration, 2)
         }
 
     def process_scan_data(self, scan_data: Dict[str, Any]) -> Dict[str, Any]:
         """Обрабатывает данные от сканера, вычисляет позицию и рассылает WS"""
-        if not self.tracking_started:
+        device_id = str(scan_data.get("deviceId") or DEFAULT_DEVICE)
+        sessions = [s for s in self._sessions.values()
+                    if s.tracking and s.accepts(device_id)]
+        if not sessions:
             return {"status": "processed"}
 
         try:
-            pos = self.positioning.calculate_position(
-                readings=[r for r in scan_data["beaconReadings"]],
-                beacons=self.active_session["beacons"],
-            )
-            ts = scan_data.get("timestamp", time.time())
-
-            # сгладим
-            x_sm, y_sm = self.active_session["kf"].update(pos["x"], pos["y"])
-            position = {"x": x_sm, "y": y_sm,
-                        "accuracy": pos.get("accuracy", None), "timestamp": ts}
-
-            if len(self.active_session["positions"]) > 0:
-                prev_position = self.active_session["positions"][-1]
-                distance = math.hypot(position['x'] - prev_position['x'],
-                                      position['y'] - prev_position['y'])
-                if distance < 0.5:
-                    position = prev_position.copy()
+            if "beaconReadings" not in scan_data:
+                # двоичный кадр платы: расстояния по калибровке сервера
+                scan_data["beaconReadings"] = \
+                    self.positioning.readings_from_summaries(
+                        scan_data.get("beaconSummaries", []))
+            result: Dict[str, Any] = {"status": "processed"}
+            for session in sessions:
+                result = self._process_for_session(session, device_id,
+                                                   scan_data)
+            return result
+        except Exception as e:
+            return {"status": "error",
+                    "message": f"Position calculation failed: {e}"}
 
-            with self._lock:
-                self.active_session["positions"].append(position)
-                self.active_session["last_reading"] = \
-                    scan_data["beaconReadings"]
+    def _process_for_session(self, session: TrackingSession, device_id: str,
+                             scan_data: Dict[str, Any]) -> Dict[str, Any]:
+        pos = self.positioning.calculate_position(
+            readings=scan_data["beaconReadings"],
+            beacons=session.beacon_map,
+        )
+        ts = scan_data.get("timestamp", time.time())
+        track = session.track(device_id)
+
+        # сгладим; ковариация фикса задаёт шум измерения фильтра
+        x_sm, y_sm = track.kf.update(pos["x"], pos["y"],
+                                     pos.get("covariance"))
 
-            # WS broadcast — через event loop
-            msg = {
+        prev_position = track.positions.last()
+        if prev_position is not None:
+            distance = math.hypot(x_sm - prev_position['x'],
+                                  y_sm - prev_position['y'])
+            if distance < 0.5:
+                x_sm, y_sm = prev_position['x'], prev_position['y']
+
+        track.positions.append(x_sm, y_sm, ts)
+        track.route.write(x_sm, y_sm)
+        track.last_reading = scan_data["beaconReadings"]
+
+        position = {"x": x_sm, "y": y_sm,
+                    "accuracy": pos.get("accuracy", None), "timestamp": ts}
+
+        # WS broadcast — через Broadcaster в event loop
+        if session.websockets:
+            self.broadcaster.publish(session.id, device_id, {
                 "type": "position_update",
-                "sessionId": self.active_session["id"],
+                "sessionId": session.id,
+                "deviceId": device_id,
                 "position": position
-            }
-            if self.loop and not self.loop.is_closed():
-                asyncio.run_coroutine_threadsafe(self._broadcast(msg),
-                                                 self.loop)
+            })
 
-            return {
-                "status": "processed",
-                "position": pos,
-                "session_points": len(self.active_session["positions"])
-            }
-
-        except Exception as e:
-            return {"status": "error",
-                    "message": f"Position calculation failed: {e}"}
+        return {
+            "status": "processed",
+            "position": pos,
+            "session_points": len(track.positions)
+        }
 
     def save_session_path(self, session_id: str, filename: str) \
             -> Dict[str, Any]:
         """Сохраняет маршрут сессии в файл"""
-        if not self.active_session:
+        session = self.get_session(session_id)
+        if session is None:
             return {"status": "error", "message": "Session not found"}
 
+        def save():
+            files = []
+            points = 0
+            for device_id, track in session.tracks.items():
+                track.route.flush()
+                if filename == session_id:
+                    # этот маршрут уже пишется по ходу сессии
+                    files.append(str(track.route.file_path))
+                else:
+                    files.append(str(self.config_loader.save_route_to_file(
+                        track.positions.xy(),
+                        session.route_name(device_id, filename),
+                        session_id)))
+                points += len(track.positions)
+            return files, points
+
         try:
-            file_path = self.config_loader.save_path_to_file(
-                self.active_session["positions"], filename, session_id)
+            files, points = self._call_on_worker(save).result()
             return {"status": "saved",
-                    "file_path": str(file_path),
-                    "points_count": len(self.active_session["positions"])}
+                    "file_path": files[0] if len(files) == 1 else files,
+                    "points_count": points}
         except Exception as e:
             return {"status": "error", "message": f"Failed to save path: {e}"}
 
@@ -195,29 +371,21 @@ class SessionManager:
     #         "beaconsCount": len(session["beacons"]),
     #     }
 
-    def add_websocket_connection(self, session_id: str, websocket: WebSocket):
-        self.tracking_started = True
+    def add_websocket_connection(self, session_id: str,
+                                 websocket: WebSocket) -> bool:
+        session = self.get_session(session_id)
+        if session is None:
+            return False
         with self._lock:
-            self.websocket_connections.append(websocket)
+            session.websockets = session.websockets + [websocket]
+        self.broadcaster.add_client(session_id, websocket)
+        session.tracking = True
+        return True
 
     def remove_websocket_connection(self, websocket: WebSocket):
         with self._lock:
-            try:
-                self.websocket_connections.remove(websocket)
-            except ValueError:
-                pass
-
-    async def _broadcast(self, message: Dict[str, Any]):
-        """Асинхронная рассылка в WebSocket всем подписанным клиентам"""
-        payload = json.dumps(message, ensure_ascii=False)
-
-        dead = []
-        for ws in self.websocket_connections:
-            try:
-                await ws.send_text(payload)
-            except Exception:
-                dead.append(ws)
-
-        if dead:
-            for ws in dead:
-                self.remove_websocket_connection(ws)
+            for session in self._sessions.values():
+                if websocket in session.websockets:
+                    session.websockets = [ws for ws in session.websockets
+                                          if ws is not websocket]
+        self.broadcaster.remove_client(websocket)
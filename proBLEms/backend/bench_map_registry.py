@@ -0,0 +1,86 @@
+"""
+Бенчмарк реестра карт: /api/beacons и расчёт позиции до и после.
+
+До: каждый запрос создаёт ConfigLoader и заново разбирает CSV (с
+csv.Sniffer), calculate_position строит словарь маяков из списка dict.
+После: карта берётся из MapRegistry (перечитывается только при смене
+mtime), calculate_position получает BeaconMap с массивом координат.
+
+    python bench_map_registry.py [--requests 2000] [--solves 20000]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.api.routes import router  # noqa: E402
+from app.services.config_loader import ConfigLoader  # noqa: E402
+from app.services.positioning import PositioningService  # noqa: E402
+
+MAP_FILE = "standart.beacons"
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+
+    @app.get("/before/beacons")
+    def beacons_before():
+        # прежний обработчик /api/beacons
+        loader = ConfigLoader()
+        return {"beacons": loader._load_csv(loader.config_dir / MAP_FILE, ";")}
+
+    return app
+
+
+def timed(fn, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--solves", type=int, default=20000)
+    args = parser.parse_args()
+
+    client = TestClient(build_app())
+    assert client.get("/before/beacons").json() == client.get("/api/beacons").json()
+
+    print(f"/api/beacons, {args.requests} запросов:")
+    print(f"  до:    {timed(lambda: client.get('/before/beacons'), args.requests):8.1f} us/запрос")
+    print(f"  после: {timed(lambda: client.get('/api/beacons'), args.requests):8.1f} us/запрос")
+
+    loader = ConfigLoader()
+    print("разбор карты без HTTP:")
+    print(f"  до:    {timed(lambda: loader._load_csv(Path(loader.config_dir / MAP_FILE), ';'), args.requests):8.1f} us")
+    print(f"  после: {timed(lambda: loader.get_map(MAP_FILE), args.requests):8.1f} us")
+
+    beacon_map = loader.get_map(MAP_FILE)
+    beacons = beacon_map.beacons
+    rng = random.Random(0)
+    readings = [{"name": b["id"],
+                 "distance": max(math.hypot(1.0 - b["x"], 2.0 - b["y"]) * rng.uniform(0.9, 1.1), 0.1)}
+                for b in beacons]
+    service = PositioningService()
+    assert abs(service.calculate_position(readings, beacons)["x"]
+               - service.calculate_position(readings, beacon_map)["x"]) < 1e-9
+
+    print(f"calculate_position, {args.solves} решений, {len(beacons)} маяков:")
+    print(f"  список dict: {timed(lambda: service.calculate_position(readings, beacons), args.solves):8.1f} us")
+    print(f"  BeaconMap:   {timed(lambda: service.calculate_position(readings, beacon_map), args.solves):8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Бенчмарк конвейера скан -> позиция -> WebSocket при всплесках сканера.
+
+Поток «MQTT» подаёт сканы пачками (burst сканов подряд, затем пауза),
+поток-обработчик считает позиции, Broadcaster рассылает их двум
+фейковым клиентам: быстрому и медленному (задержка отправки). Печатает
+время submit_scan в потоке MQTT, отставание очереди сканов и статистику
+рассылки (схлопывание, кадры, потери у медленного клиента).
+
+    python bench_pipeline.py [--bursts 20] [--burst 500] [--pause 0.5]
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.config_loader import ConfigLoader  # noqa: E402
+from app.services.session_manager import SessionManager  # noqa: E402
+
+MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "data", "maps")
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.received = 0
+
+    async def send_text(self, payload: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+
+
+def make_scan(beacons, x, y, ts, rng):
+    readings = []
+    for b in beacons:
+        d = math.hypot(x - b["x"], y - b["y"])
+        readings.append({"name": b["id"],
+                         "distance": max(d * rng.uniform(0.8, 1.2), 0.1)})
+    return {"beaconReadings": readings, "timestamp": ts}
+
+
+def producer(sm, beacons, args, submit_times):
+    rng = random.Random(0)
+    x, y = 0.0, 0.0
+    for _ in range(args.bursts):
+        for _ in range(args.burst):
+            x += rng.gauss(0, 0.05)
+            y += rng.gauss(0, 0.05)
+            scan = make_scan(beacons, x, y, time.time(), rng)
+            started = time.perf_counter()
+            sm.submit_scan(scan)
+            submit_times.append(time.perf_counter() - started)
+        time.sleep(args.pause)
+
+
+async def run(args):
+    sm = SessionManager()
+    sm.config_loader = ConfigLoader(MAPS_DIR)
+    sm.set_loop(asyncio.get_running_loop())
+    sm.start()
+
+    res = sm.start_session({"frequency": 10})
+    session_id = res["sessionId"]
+    fast, slow = FakeWebSocket(0.0), FakeWebSocket(args.slow_delay)
+    sm.add_websocket_connection(session_id, fast)
+    sm.add_websocket_connection(session_id, slow)
+    beacons = sm.get_session(session_id).beacons
+
+    submit_times = []
+    max_depth = 0
+    thread = threading.Thread(target=producer,
+                              args=(sm, beacons, args, submit_times))
+    started = time.perf_counter()
+    thread.start()
+    while thread.is_alive() or len(sm._scan_queue):
+        max_depth = max(max_depth, len(sm._scan_queue))
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.5)
+    elapsed = time.perf_counter() - started
+
+    stats = sm.stats()
+    await sm.stop_session(session_id)
+    sm.shutdown()
+
+    t = np.array(submit_times)
+    q, b = stats["scan_queue"], stats["broadcast"]
+    print(f"{len(t)} сканов пачками по {args.burst} за {elapsed:.1f} с")
+    print(f"  submit_scan (поток MQTT): p50 {np.percentile(t, 50) * 1e6:.1f} us, "
+          f"p99 {np.percentile(t, 99) * 1e6:.1f} us, max {t.max() * 1e6:.1f} us")
+    print(f"  очередь сканов: предел {q['maxsize']}, пик {q['high_water']}, "
+          f"выброшено {q['dropped']} из {q['enqueued']}")
+    print(f"  рассылка: позиций {b['published']}, схлопнуто {b['coalesced']}, "
+          f"кадров {b['frames']}")
+    print(f"  клиенты: быстрый получил {fast.received}, "
+          f"медленный ({args.slow_delay * 1e3:.0f} ms/сообщение) {slow.received}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.5)
+    parser.add_argument("--slow-delay", type=float, default=0.2)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Бенчмарк формата данных платы: прежний JSON с расстояниями против
+двоичного кадра со сводками RSSI окна (firmware/main.py). Печатает размер
+сообщения и время разбора + перевода в расстояния на сервере.
+
+    python bench_scan_frame.py [--beacons 8] [--n 20000]
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.rssi_model import PathLossModel  # noqa: E402
+from app.services.scan_frame import (FRAME_MAGIC, FRAME_VERSION,  # noqa: E402
+                                     decode_frame)
+
+
+def make_payloads(beacons: int):
+    model = PathLossModel(None)
+    readings, frame = [], bytearray(
+        struct.pack("<BBBH", FRAME_MAGIC, FRAME_VERSION, beacons, 1000))
+    for i in range(beacons):
+        name = f"beacon_{i + 1}"
+        median = -60.5 - i
+        readings.append({"name": name,
+                         "distance": model.distance(name, median)})
+        raw = name.encode()
+        frame += bytes([len(raw)]) + raw
+        frame += struct.pack("<HhHbb", 12, round(median * 10), 25, -75, -52)
+    return json.dumps({"beaconReadings": readings}).encode(), bytes(frame)
+
+
+def timeit(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--beacons", type=int, default=8)
+    parser.add_argument("--n", type=int, default=20000)
+    args = parser.parse_args()
+
+    payload_json, payload_frame = make_payloads(args.beacons)
+    model = PathLossModel(None)
+
+    t_json = timeit(lambda: json.loads(payload_json.decode("utf-8")), args.n)
+    t_frame = timeit(lambda: model.to_readings(
+        decode_frame(payload_frame)["beaconSummaries"]), args.n)
+
+    print(f"{args.beacons} маяков в окне")
+    print(f"  JSON с расстояниями:  {len(payload_json)} байт, "
+          f"разбор {t_json * 1e6:.1f} us")
+    print(f"  кадр сводок RSSI:     {len(payload_frame)} байт, "
+          f"разбор + модель {t_frame * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Бенчмарк SessionManager: 8-часовая сессия на 10 Гц (288 000 сканов).
+
+Сканы подаются прямо в process_scan_data (как это делает поток-обработчик),
+маршрут пишется во временную папку. Печатает задержку обработки скана и
+память маршрута в PositionStore против прежнего списка dict.
+
+    python bench_session.py [--hours 8] [--hz 10]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.config_loader import ConfigLoader  # noqa: E402
+from app.services.session_manager import SessionManager  # noqa: E402
+
+MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "data", "maps")
+
+
+def make_scan(beacons, x, y, ts, rng):
+    readings = []
+    for b in beacons:
+        d = math.hypot(x - b["x"], y - b["y"])
+        readings.append({"name": b["id"],
+                         "distance": max(d * rng.uniform(0.8, 1.2), 0.1)})
+    return {"beaconReadings": readings, "timestamp": ts}
+
+
+def list_of_dicts_bytes(n):
+    tracemalloc.start()
+    positions = [{"x": float(i), "y": float(i), "accuracy": 0.5,
+                  "timestamp": 1.0 + i} for i in range(n)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del positions
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=8.0)
+    parser.add_argument("--hz", type=float, default=10.0)
+    args = parser.parse_args()
+
+    n = int(args.hours * 3600 * args.hz)
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        sm = SessionManager()
+        sm.config_loader = ConfigLoader(MAPS_DIR)
+        res = sm.start_session({"frequency": args.hz})
+        session = sm.get_session(res["sessionId"])
+        session.tracking = True
+        beacons = session.beacons
+
+        lo = np.array([min(b["x"] for b in beacons), min(b["y"] for b in beacons)])
+        hi = np.array([max(b["x"] for b in beacons), max(b["y"] for b in beacons)])
+        p = (lo + hi) / 2
+
+        latencies = np.empty(n)
+        tracemalloc.start()
+        ts = time.time()
+        for i in range(n):
+            p = np.clip(p + [rng.gauss(0, 0.05), rng.gauss(0, 0.05)], lo, hi)
+            scan = make_scan(beacons, p[0], p[1], ts + i / args.hz, rng)
+            started = time.perf_counter()
+            sm.process_scan_data(scan)
+            latencies[i] = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        track = session.tracks["default"]
+        route_size = os.path.getsize(track.route.file_path)
+        print(f"{n} сканов ({args.hours} ч на {args.hz} Гц)")
+        print(f"  задержка скана: p50 {np.percentile(latencies, 50) * 1e3:.3f} ms, "
+              f"p99 {np.percentile(latencies, 99) * 1e3:.3f} ms, "
+              f"max {latencies.max() * 1e3:.3f} ms")
+        print(f"  PositionStore: {len(track.positions)} точек, "
+              f"{track.positions.nbytes / 2**20:.1f} MiB (ёмкость {track.positions.capacity})")
+        print(f"  список dict (как раньше): {list_of_dicts_bytes(n) / 2**20:.1f} MiB")
+        print(f"  прирост памяти за сессию: {current / 2**20:.1f} MiB, пик {peak / 2**20:.1f} MiB")
+        print(f"  файл маршрута пишется по ходу: {route_size / 2**20:.1f} MiB")
+        sm.shutdown()
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Бенчмарк решателя PositioningService: прежний _gauss_newton_wls
+(np.diag весов n x n + np.linalg.solve на каждой итерации, один набор
+за вызов) против нового: одиночный calculate_position (нормальные
+уравнения 2x2 в скалярах) и пачка calculate_positions (векторизовано).
+
+Также сравнивает сглаживание Kalman2D с постоянным R и с ковариацией
+фикса в качестве шума измерения.
+
+    python bench_wls.py [--scans 5000]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.config_loader import ConfigLoader  # noqa: E402
+from app.services.positioning import PositioningService, Kalman2D, WLS_TOL  # noqa: E402
+
+MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "data", "maps")
+
+
+def old_gauss_newton_wls(pts, dists, iters=30):
+    # прежняя реализация, для сравнения
+    eps = 1e-3
+    w0 = 1.0 / np.maximum(dists, eps) ** 2
+    x = np.average(pts[:, 0], weights=w0)
+    y = np.average(pts[:, 1], weights=w0)
+    for _ in range(iters):
+        dx = x - pts[:, 0]
+        dy = y - pts[:, 1]
+        ri = np.sqrt(dx * dx + dy * dy)
+        ri_safe = np.maximum(ri, eps)
+        r = ri - dists
+        J = np.stack([dx / ri_safe, dy / ri_safe], axis=1)
+        W = np.diag(1.0 / np.maximum(dists, eps) ** 2)
+        JT_W = J.T @ W
+        H = JT_W @ J
+        g = JT_W @ r
+        H_reg = H + 1e-3 * np.eye(2)
+        try:
+            delta = -np.linalg.solve(H_reg, g)
+        except np.linalg.LinAlgError:
+            break
+        x += float(delta[0])
+        y += float(delta[1])
+        if np.linalg.norm(delta) < 1e-4:
+            break
+    return x, y
+
+
+def old_calculate_position(readings, beacons):
+    beacon_map = {str(b["id"]): b for b in beacons}
+    usable = [r for r in readings if r["name"] in beacon_map
+              and r["distance"] <= 20.0]
+    usable.sort(key=lambda r: r["distance"])
+    pts = np.array([(float(beacon_map[r["name"]]["x"]),
+                     float(beacon_map[r["name"]]["y"])) for r in usable])
+    dists = np.array([float(r["distance"]) for r in usable])
+    return old_gauss_newton_wls(pts, dists)
+
+
+def make_scans(beacons, n, rng):
+    """Проход по прямой туда-обратно; шум расстояний растёт с дальностью"""
+    xs = [b["x"] for b in beacons]
+    ys = [b["y"] for b in beacons]
+    truth, scans = [], []
+    for i in range(n):
+        t = (i % 400) / 400
+        t = 2 * t if t < 0.5 else 2 - 2 * t
+        x = min(xs) + 1 + t * (max(xs) - min(xs) - 2)
+        y = (min(ys) + max(ys)) / 2
+        readings = []
+        for b in beacons:
+            d = math.hypot(x - b["x"], y - b["y"])
+            readings.append({"name": b["id"],
+                             "distance": max(d + rng.gauss(0, 0.1 + 0.15 * d), 0.1)})
+        # ближние маяки слышны всегда, дальние - не в каждом скане
+        readings.sort(key=lambda r: r["distance"])
+        scans.append(readings[:rng.randint(3, len(readings))])
+        truth.append((x, y))
+    return scans, np.array(truth)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    res = fn()
+    return res, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scans", type=int, default=5000)
+    args = parser.parse_args()
+
+    beacon_map = ConfigLoader(MAPS_DIR).get_map("standart.beacons")
+    beacons = beacon_map.beacons
+    scans, truth = make_scans(beacons, args.scans, random.Random(0))
+    service = PositioningService()
+
+    old, t_old = timed(lambda: [old_calculate_position(s, beacons) for s in scans])
+    one, t_one = timed(lambda: [service.calculate_position(s, beacon_map) for s in scans])
+    batch, t_batch = timed(lambda: service.calculate_positions(scans, beacon_map))
+
+    diff = max(max(abs(a[0] - b["x"]), abs(a[1] - b["y"])) for a, b in zip(old, one))
+    # одиночный и пакетный решатели должны давать один и тот же фикс
+    same_xy = max(max(abs(a["x"] - b["x"]), abs(a["y"] - b["y"]))
+                  for a, b in zip(one, batch))
+    same_cov = max(float(np.nanmax(np.abs(np.subtract(a["covariance"], b["covariance"]))
+                                   / np.maximum(np.abs(a["covariance"]), 1e-12)))
+                   for a, b in zip(one, batch))
+    print(f"{len(scans)} сканов, {len(beacons)} маяков на карте")
+    print(f"  прежний решатель:   {t_old / len(scans) * 1e6:8.1f} us/скан")
+    print(f"  calculate_position: {t_one / len(scans) * 1e6:8.1f} us/скан")
+    print(f"  calculate_positions:{t_batch / len(scans) * 1e6:8.1f} us/скан (пачка)")
+    print(f"  макс. расхождение с прежним решателем: {diff:.2e} м")
+    print(f"  calculate_position против calculate_positions: x, y {same_xy:.2e} м, "
+          f"ковариация {same_cov:.2e} (отн.)")
+    # решатели останавливаются по шагу < WLS_TOL, поэтому совпадение с этой точностью
+    assert same_xy < WLS_TOL and same_cov < 1e-3, "одиночный и пакетный решатели расходятся"
+
+    # сглаживание: постоянный R против ковариации фикса
+    for label, use_cov in (("Kalman2D, постоянный R", False),
+                           ("Kalman2D, R из ковариации", True)):
+        kf = Kalman2D()
+        err = []
+        for fix, (tx, ty) in zip(one, truth):
+            x, y = kf.update(fix["x"], fix["y"],
+                             fix["covariance"] if use_cov else None)
+            err.append(math.hypot(x - tx, y - ty))
+        err = np.array(err)
+        print(f"  {label}: ошибка средняя {err.mean():.3f} м, p95 {np.percentile(err, 95):.3f} м")
+
+
+if __name__ == "__main__":
+    main()
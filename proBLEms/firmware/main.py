@@ -1,133 +1,232 @@
 import bluetooth
+import struct
+from array import array
 from micropython import const
 _IRQ_SCAN_RESULT = const(5)
 _IRQ_SCAN_DONE = const(6)
 import time
 import networking
-from networking import connect_wifi, connect_mqtt, check_messages, publish_data
+from networking import connect_wifi, connect_mqtt, check_messages, publish_frame
+
+# Плата больше не считает расстояния: за окно networking.scan_duration
+# копятся сырые RSSI по маякам, а на сервер уходит сводка окна
+# (число пакетов, медиана, MAD, min, max) в двоичном кадре. Перевод RSSI в
+# расстояние и калибровка - на сервере (backend/app/services/rssi_model.py).
+#
+# Кадр (little-endian): magic u8, version u8, count u8, window_ms u16;
+# далее на маяк: name_len u8, name, samples u16, median i16 (0.1 dBm),
+# mad u16 (0.1 dB), min i8, max i8. Разбор: backend/app/services/scan_frame.py
+
+FRAME_MAGIC = const(0xB5)
+FRAME_VERSION = const(1)
+FRAME_HEADER = const(5)
+RECORD_SIZE = const(8)
+
+BEACON_PREFIX = b"beacon"    # пустая строка - принимать любые имена
+MAX_BEACONS = const(16)
+NAME_MAX = const(16)
+WINDOW_SAMPLES = const(64)   # RSSI на маяк за окно для медианы и MAD
+
+# Сканирование непрерывное: окно = интервал, эфир слушается всё время
+SCAN_INTERVAL_US = const(100000)
+SCAN_WINDOW_US = const(100000)
 
 # Initialize Bluetooth
 ble = bluetooth.BLE()
 ble.active(True)
 
-beacon_distance_dict = {}
-output_distance = []
-scan_finished = False
+
+class BeaconWindow:
+    """
+    RSSI одного маяка за окно, два буфера: в активный пишет bt_irq, второй
+    в это время сводит main. Выборка хранится отсортированной (вставкой),
+    поэтому медиана берётся без сортировки. Если пакетов больше
+    WINDOW_SAMPLES, лишние учитываются только в count/min/max.
+    Слоты создаются при загрузке; имя маяка bt_irq копирует в name на месте.
+    """
+
+    def __init__(self):
+        self.name = bytearray(NAME_MAX)
+        self.name_len = 0
+        self.samples = (array('b', bytes(WINDOW_SAMPLES)),
+                        array('b', bytes(WINDOW_SAMPLES)))
+        self.count = array('H', (0, 0))
+        self.lo = array('b', (0, 0))
+        self.hi = array('b', (0, 0))
+
+    def add(self, buf, rssi):
+        n = self.count[buf]
+        if n == 0 or rssi < self.lo[buf]:
+            self.lo[buf] = rssi
+        if n == 0 or rssi > self.hi[buf]:
+            self.hi[buf] = rssi
+        if n < WINDOW_SAMPLES:
+            s = self.samples[buf]
+            i = n
+            while i > 0 and s[i - 1] > rssi:
+                s[i] = s[i - 1]
+                i -= 1
+            s[i] = rssi
+        if n < 0xFFFF:
+            self.count[buf] = n + 1
+
+
+# Все слоты выделяются при загрузке: в bt_irq нет аллокаций, а список не
+# меняется, пока take_window по нему идёт. Новый маяк bt_irq записывает в
+# slots[used] и только после этого увеличивает used, поэтому main видит
+# лишь полностью заполненные слоты.
+slots = [BeaconWindow() for _ in range(MAX_BEACONS)]
+used = 0                # занятые слоты, заполняются по порядку
+active = 0              # буфер, в который пишет bt_irq
+scanning = False
+
+frame = bytearray(FRAME_HEADER + MAX_BEACONS * (1 + NAME_MAX + RECORD_SIZE))
+deviations = array('h', bytes(2 * WINDOW_SAMPLES))
 
 
-# Define a callback function for scan results
 def bt_irq(event, data):
-    global beacon_distance_dict
-    global scan_finished
-    
+    global scanning
+
     if event == _IRQ_SCAN_RESULT:
         addr_type, addr, adv_type, rssi, adv_data = data
-        device_name = parse_ble_advertising_data(bytes(adv_data))
-        if (device_name):
-            if device_name in beacon_distance_dict:
-                beacon_distance_dict[device_name].append(calculate_distance(rssi))
-            else:
-                beacon_distance_dict[device_name] = [calculate_distance(rssi)]
-#                 print(f"Device found: {device_name} ({rssi})")
+        slot = find_slot(adv_data)
+        if slot is not None:
+            slot.add(active, rssi)
     elif event == _IRQ_SCAN_DONE:
-        for item in sorted(beacon_distance_dict.items()):
-            median = calculate_median(item[1])
-            mad = calculate_mad(item[1], median) * 1.4826
-            threshold = 2
-            lower_bound = median - threshold * mad
-            upper_bound = median + threshold * mad
-            filtered_mad = [dist for dist in item[1] if lower_bound <= dist <= upper_bound]
-            
-            filtered = [dist for dist in item[1] if abs(dist - median) <= 3.0]
-            
-            if (len(filtered_mad) != 0):
-                output_distance.append({"name": item[0], "distance": sum(filtered_mad) / len(filtered_mad)})
-        beacon_distance_dict.clear()
-        scan_finished = True
-        
-        
-def parse_ble_advertising_data(data):
+        scanning = False
+
+
+def find_slot(adv_data):
+    """
+    Слот маяка по Complete Local Name (0x09) или None. Вызывается из
+    bt_irq, поэтому имя сравнивается на месте (длина, затем байты), а
+    незнакомый маяк с нужным префиксом занимает следующий свободный слот.
+    """
+    global used
     index = 0
-    device_name = None
-    
-    while index < len(data):
-        # Читаем длину текущего AD-блока
-        length = data[index]
-        index += 1
-        
+    size = len(adv_data)
+    while index + 1 < size:
+        length = adv_data[index]
         if length == 0:
             break
-            
-        # Читаем тип AD-блока
-        ad_type = data[index]
-        index += 1
-        
-        # Данные AD-блока (длина минус 1 байт типа)
-        ad_data = data[index:index + length - 1]
-        
-        # Проверяем тип блока
-        if ad_type == 0x09:  # Complete Local Name
-            try:
-                device_name = ad_data.decode('utf-8')
-            except UnicodeDecodeError:
-                device_name = ad_data.hex()
-        
-        # Переходим к следующему блоку
-        index += length - 1
-    
-    return device_name
-
-
-def calculate_distance(rssi, tx_power=-45, n=2.0):
-    if rssi == 0:
-        return -1.0  # Неверное значение
-    
-    ratio = (tx_power - rssi) / (10 * n)
-    distance = 10 ** ratio
-    return distance
-
-
-def calculate_median(data):
-    sorted_data = sorted(data)
-    n = len(sorted_data)
-    
-    if n % 2 == 1:
-        return sorted_data[n // 2]
-    else:
-        mid1 = sorted_data[n // 2 - 1]
-        mid2 = sorted_data[n // 2]
-        return (mid1 + mid2) / 2
-
-
-def calculate_mad(data_array, median_value):
-    absolute_deviations = [abs(x - median_value) for x in data_array]
-    return calculate_median(absolute_deviations)
+        if adv_data[index + 1] == 0x09:
+            start = index + 2
+            n = length - 1
+            if n > NAME_MAX or start + n > size:
+                return None
+            for k in range(used):
+                slot = slots[k]
+                if slot.name_len != n:
+                    continue
+                name = slot.name
+                j = 0
+                while j < n and adv_data[start + j] == name[j]:
+                    j += 1
+                if j == n:
+                    return slot
+            prefix = len(BEACON_PREFIX)
+            if used >= MAX_BEACONS or n < prefix:
+                return None
+            for j in range(prefix):
+                if adv_data[start + j] != BEACON_PREFIX[j]:
+                    return None
+            slot = slots[used]
+            name = slot.name
+            for j in range(n):
+                name[j] = adv_data[start + j]
+            slot.name_len = n
+            used += 1       # слот виден main только теперь, когда заполнен
+            return slot
+        index += 1 + length
+    return None
+
+
+def summarize(slot, buf):
+    """(median*10, mad*10) по отсортированной выборке, целочисленно"""
+    n = min(slot.count[buf], WINDOW_SAMPLES)
+    s = slot.samples[buf]
+    # медиана в половинах dBm, чтобы остаться в целых
+    median2 = s[n // 2] * 2 if n % 2 else s[n // 2 - 1] + s[n // 2]
+    d = deviations
+    for i in range(n):
+        v = abs(s[i] * 2 - median2)
+        j = i
+        while j > 0 and d[j - 1] > v:
+            d[j] = d[j - 1]
+            j -= 1
+        d[j] = v
+    mad2 = d[n // 2] * 2 if n % 2 else d[n // 2 - 1] + d[n // 2]
+    # median2 - в 0.5 dBm, mad2 - в 0.25 dB
+    return median2 * 5, (mad2 * 5 + 1) // 2
+
+
+def take_window(window_ms):
+    """Переключает буфер и собирает кадр по закрытому окну; длина кадра"""
+    global active
+    buf = active
+    active = 1 - active     # bt_irq дальше пишет во второй буфер
+
+    pos = FRAME_HEADER
+    count = 0
+    for k in range(used):   # used читается один раз, новые слоты - в следующем окне
+        slot = slots[k]
+        if slot.count[buf] == 0:
+            continue
+        median10, mad10 = summarize(slot, buf)
+        n = slot.name_len
+        frame[pos] = n
+        frame[pos + 1:pos + 1 + n] = memoryview(slot.name)[:n]
+        pos += 1 + n
+        struct.pack_into("<HhHbb", frame, pos, slot.count[buf], median10,
+                         mad10, slot.lo[buf], slot.hi[buf])
+        pos += RECORD_SIZE
+        slot.count[buf] = 0
+        count += 1
+    struct.pack_into("<BBBH", frame, 0, FRAME_MAGIC, FRAME_VERSION, count,
+                     min(window_ms, 0xFFFF))
+    return pos
+
+
+def start_scan():
+    global scanning
+    # duration 0 - сканировать, пока не остановят
+    ble.gap_scan(0, SCAN_INTERVAL_US, SCAN_WINDOW_US)
+    scanning = True
 
 
 def main():
-    global output_distance, scan_finished
-    
     if not connect_wifi():
         return
-     
+
     client = connect_mqtt()
     if not client:
         return
-    
+
     # Register the callback
     ble.irq(bt_irq)
+    start_scan()
 
-    # Start scanning for devices
+    window_start = time.ticks_ms()
+    deadline = time.ticks_add(window_start, networking.scan_duration)
     while True:
-        check_messages(client)
-        output_distance.clear()
-        scan_finished = False
-        print("\n-------------------------------\n")
-        ble.gap_scan(networking.scan_duration, 100000, 100000)
-        while not scan_finished:
-            time.sleep_ms(10)
-
-        publish_data(client, {"beaconReadings": output_distance})
-            
-            
-main()        
+        if not scanning:
+            start_scan()
+
+        wait = time.ticks_diff(deadline, time.ticks_ms())
+        if wait > 0:
+            time.sleep_ms(min(wait, 10))
+            continue
+
+        now = time.ticks_ms()
+        size = take_window(time.ticks_diff(now, window_start))
+        publish_frame(client, memoryview(frame)[:size])
+        check_messages(client)  # новый scan_duration - со следующего окна
+
+        window_start = now
+        deadline = time.ticks_add(deadline, networking.scan_duration)
+        if time.ticks_diff(deadline, now) <= 0:
+            # отстали (долгая публикация) - окно отсчитываем от текущего момента
+            deadline = time.ticks_add(now, networking.scan_duration)
+
+
+main()
@@ -100,3 +100,14 @@ def publish_data(client, data):
     except Exception as e:
         print("Ошибка публикации:", e)
         return False
+
+
+def publish_frame(client, frame):
+    """Публикация двоичного кадра окна (см. main.py)"""
+    try:
+        client.publish(MQTT_TOPIC, frame)
+        print("Окно отправлено:", frame[2], "маяков,", len(frame), "байт")
+        return True
+    except Exception as e:
+        print("Ошибка публикации:", e)
+        return False
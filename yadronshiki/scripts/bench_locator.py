@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# bench_locator.py — сравнение точности и скорости: estimate_position_3byrssi vs LocatorEngine
+#
+#   python bench_locator.py                         # синтетические сообщения вдоль маршрута
+#   python bench_locator.py --payloads rec.jsonl    # записанные beacons/discovered
+#
+# Запись сообщений: mosquitto_sub -t beacons/discovered > rec.jsonl
+# У записанных сообщений нет истинной позиции, поэтому для них печатается
+# скорость и расхождение двух методов; точность считается на синтетике.
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+import numpy as np
+
+import locator
+from locator_engine import (
+    DEFAULT_PATHLOSS_EXP,
+    DEFAULT_TX_POWER,
+    LocatorEngine,
+    location_by_three,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def rssi_to_distance(rssi, beacon_name, calibration):
+    """
+    Перевод RSSI->расстояние по логарифмической модели.
+    Использует параметры из calibration если есть, иначе значения по умолчанию.
+    """
+    try:
+        rssi = float(rssi)
+    except Exception:
+        rssi = 0.0
+    if beacon_name in calibration:
+        try:
+            P_tx = float(calibration[beacon_name].get("P_tx", DEFAULT_TX_POWER))
+            n = float(calibration[beacon_name].get("n", DEFAULT_PATHLOSS_EXP))
+        except Exception:
+            P_tx = DEFAULT_TX_POWER
+            n = DEFAULT_PATHLOSS_EXP
+    else:
+        P_tx = DEFAULT_TX_POWER
+        n = DEFAULT_PATHLOSS_EXP
+    if n == 0:
+        n = DEFAULT_PATHLOSS_EXP
+    # Защита: если RSSI экстремальный, ограничим экспоненту
+    try:
+        d = 10 ** ((P_tx - rssi) / (10.0 * n))
+    except OverflowError:
+        d = float('inf')
+    return d
+
+
+# --- исходный вариант: 3 маяка по RSSI + location_by_three (для сравнения с LocatorEngine) ---
+def estimate_position_3byrssi(measurements: dict, beacons: dict, calibration: dict):
+    """
+    Выбираем 3 маяка по RSSI (наибольший RSSI) и применяем location_by_three.
+    """
+    if not measurements:
+        return None
+
+    # Сортируем по RSSI по убыванию (больший RSSI = сильнее). RSSI обычно отрицательные.
+    sorted_items = sorted(measurements.items(), key=lambda kv: float(kv[1]), reverse=True)
+    top3 = sorted_items[:3]
+    if len(top3) < 3:
+        return None
+
+    names = [t[0] for t in top3]
+    rssis = [float(t[1]) for t in top3]
+
+    # Попытка исправить регистр имени, если не найден
+    for i, name in enumerate(names):
+        if name not in beacons:
+            found = None
+            for key in beacons:
+                if key.lower() == name.lower():
+                    found = key
+                    break
+            if found:
+                names[i] = found
+            else:
+                return None
+
+    coords = [beacons[n] for n in names]
+    # перевод RSSI->расстояние (для расчётов)
+    dists = [rssi_to_distance(r, n, calibration) for r, n in zip(rssis, names)]
+
+    # вызываем вашу функцию (исправленную)
+    return location_by_three(coords[0], coords[1], coords[2], dists[0], dists[1], dists[2])
+
+
+
+def measurements_from_payload(data):
+    measurements = {}
+    for b in data.get("beacons", []):
+        name = b.get("name") or b.get("addr")
+        if name is None:
+            continue
+        try:
+            measurements[name] = float(b.get("rssi"))
+        except (TypeError, ValueError):
+            continue
+    return measurements
+
+
+def load_recorded(path):
+    payloads = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                payloads.append((measurements_from_payload(json.loads(line)), None))
+            except ValueError:
+                continue
+    return payloads
+
+
+def synthesize(engine, count, sigma, seed=1):
+    """Случайное блуждание внутри маяков + RSSI по модели калибровки с шумом"""
+    rng = random.Random(seed)
+    lo = engine.coords.min(axis=0)
+    hi = engine.coords.max(axis=0)
+    p = (lo + hi) / 2.0
+    payloads = []
+    for _ in range(count):
+        p = np.clip(p + [rng.gauss(0, 0.3), rng.gauss(0, 0.3)], lo, hi)
+        d = np.maximum(np.hypot(*(engine.coords - p).T), 0.1)
+        rssi = engine.p_tx - 10.0 * engine.n * np.log10(d)
+        measurements = {}
+        for i, name in enumerate(engine.names):
+            if rng.random() < 0.2:  # часть маяков пропадает из скана
+                continue
+            measurements[name] = round(float(rssi[i]) + rng.gauss(0, sigma))
+        payloads.append((measurements, (float(p[0]), float(p[1]))))
+    return payloads
+
+
+def run(name, fn, payloads):
+    started = time.perf_counter()
+    results = [fn(m) for m, _ in payloads]
+    elapsed = time.perf_counter() - started
+    errors = [
+        math.hypot(r[0] - t[0], r[1] - t[1])
+        for r, (_, t) in zip(results, payloads) if r is not None and t is not None
+    ]
+    line = f"{name:>22}: {len(payloads) / elapsed:9.0f} msg/s"
+    if errors:
+        line += (f", ошибка mean {np.mean(errors):.2f} м, median {np.median(errors):.2f} м, "
+                 f"p90 {np.percentile(errors, 90):.2f} м")
+    line += f", без решения: {sum(r is None for r in results)}"
+    print(line)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--beacons", default=os.path.join(HERE, "..", "standart.beacons"))
+    parser.add_argument("--calibration", default=os.path.join(HERE, "calibration.json"))
+    parser.add_argument("--payloads", help="JSON-lines с записанными сообщениями beacons/discovered")
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--sigma", type=float, default=3.0, help="шум RSSI синтетики, дБ")
+    args = parser.parse_args()
+
+    locator.FILE_BEACONS = args.beacons
+    locator.FILE_CALIBRATION = args.calibration
+    beacons = locator.load_beacons()
+    calibration = locator.load_calibration()
+    engine = LocatorEngine(beacons, calibration)
+
+    if args.payloads:
+        payloads = load_recorded(args.payloads)
+        print(f"записанные сообщения: {len(payloads)}")
+    else:
+        payloads = synthesize(engine, args.count, args.sigma)
+        print(f"синтетика: {len(payloads)} сообщений, шум {args.sigma} дБ")
+
+    old = run("top-3 location_by_three",
+              lambda m: estimate_position_3byrssi(m, beacons, calibration), payloads)
+    new = run("LocatorEngine (WLS)", engine.locate, payloads)
+
+    diff = [math.hypot(a[0] - b[0], a[1] - b[1]) for a, b in zip(old, new) if a and b]
+    if diff:
+        print(f"расхождение методов: median {np.median(diff):.2f} м")
+
+
+if __name__ == "__main__":
+    main()
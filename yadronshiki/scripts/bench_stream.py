@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# bench_stream.py — пропускная способность локатора без брокера
+#
+#   python bench_stream.py [--devices 10] [--count 20000]
+#
+# Сообщения генерируются заранее и подаются прямо в handle_message, как это
+# делает paho. Для сравнения тот же поток прогоняется через старую схему:
+# open(..., "a") + print на каждое сообщение. Отдельно меряется только запись
+# маршрута: позиции решаются заранее, и в цикле остаётся лишь open+print
+# против PathWriter.write, без решателя и разбора JSON.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+import locator
+from bench_locator import synthesize
+from locator_engine import LocatorEngine
+from path_writer import LatestPositions, PathWriter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_payloads(engine, devices, count):
+    rng = random.Random(2)
+    per_device = [synthesize(engine, count // devices + 1, 3.0, seed=d) for d in range(devices)]
+    payloads = []
+    for i in range(count):
+        d = rng.randrange(devices)
+        measurements, _ = per_device[d][i // devices]
+        beacons = [{"name": k, "rssi": v} for k, v in measurements.items()]
+        payloads.append(json.dumps({"device": f"esp_{d}", "ts": i, "beacons": beacons}).encode())
+    return payloads
+
+
+def legacy_handle(engine, path, payload):
+    data = json.loads(payload.decode("utf-8"))
+    measurements = {b["name"]: float(b["rssi"]) for b in data["beacons"]}
+    pos = engine.locate(measurements)
+    if pos:
+        x, y = pos
+        print(f"Позиция контроллера: ({x:.3f}, {y:.3f})")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"{x:.3f};{y:.3f}\n")
+
+
+def legacy_write(path, x, y):
+    print(f"Позиция контроллера: ({x:.3f}, {y:.3f})")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"{x:.3f};{y:.3f}\n")
+
+
+def solve_all(engine, payloads):
+    fixes = []
+    for p in payloads:
+        data = json.loads(p.decode("utf-8"))
+        pos = engine.locate({b["name"]: float(b["rssi"]) for b in data["beacons"]})
+        if pos:
+            fixes.append((data["device"], pos[0], pos[1]))
+    return fixes
+
+
+def bench_writes(tmp, fixes):
+    """Только запись маршрута: секунды на open+print и на PathWriter"""
+    legacy_dir = os.path.join(tmp, "legacy")
+    os.makedirs(legacy_dir)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for device, x, y in fixes:
+            legacy_write(os.path.join(legacy_dir, f"standart_{device}.path"), x, y)
+    legacy = time.perf_counter() - started
+
+    writer = PathWriter(os.path.join(tmp, "writes", "standart.path"))
+    writer.start()
+    started = time.perf_counter()
+    for device, x, y in fixes:
+        writer.write(device, x, y)
+    writer.close()
+    return legacy, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+
+    locator.FILE_BEACONS = os.path.join(HERE, "..", "standart.beacons")
+    locator.FILE_CALIBRATION = os.path.join(HERE, "calibration.json")
+    engine = LocatorEngine(locator.load_beacons(), locator.load_calibration())
+    payloads = make_payloads(engine, args.devices, args.count)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "standart.path")
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for p in payloads:
+                legacy_handle(engine, base, p)
+        legacy = time.perf_counter() - started
+
+        writer = PathWriter(base)
+        writer.start()
+        positions = LatestPositions()
+        userdata = {"engine": engine, "writer": writer, "positions": positions}
+        started = time.perf_counter()
+        for p in payloads:
+            locator.handle_message(userdata, locator.TOPIC, p)
+        writer.close()
+        streamed = time.perf_counter() - started
+
+        files = sorted(f for f in os.listdir(tmp) if f != "standart.path")
+        print(f"{len(payloads)} сообщений от {args.devices} устройств")
+        print(f"  open+print на сообщение: {len(payloads) / legacy:8.0f} msg/s")
+        print(f"  PathWriter + API в памяти: {len(payloads) / streamed:8.0f} msg/s")
+        print(f"  файлов маршрутов: {len(files)}, устройств в API: {len(positions.snapshot())}")
+
+        fixes = solve_all(engine, payloads)
+        legacy_w, streamed_w = bench_writes(tmp, fixes)
+        print(f"только запись маршрута, {len(fixes)} позиций:")
+        print(f"  open+print на позицию:   {len(fixes) / legacy_w:8.0f} writes/s")
+        print(f"  PathWriter.write:        {len(fixes) / streamed_w:8.0f} writes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,19 @@
 # calibrate.py
+import argparse
 import csv
-import math
-import json
-from collections import defaultdict
-import numpy as np
+
+from streaming_calibration import StreamingCalibrator, RESERVOIR_SIZE
 
 INPUT_CSV = "rssi_measurements.csv"   # columns: beacon_name,distance_m,rssi
 OUTPUT_JSON = "calibration.json"
 
-def load_measurements(path):
-    data = defaultdict(list)
+
+def iter_measurements(path):
+    """Построчно отдаёт (beacon, d, rssi) — файл целиком в память не читается"""
     with open(path, newline='', encoding='utf-8') as f:
         reader = csv.reader(f)
         for row in reader:
-            if not row:
+            if not row or len(row) < 3:
                 continue
             if row[0].strip().lower() == 'beacon_name':  # только шапку пропускаем
                 continue
@@ -25,45 +25,44 @@ def load_measurements(path):
                 continue
             if d <= 0:
                 continue
-            data[name].append((d, rssi))
-    return data
+            yield name, d, rssi
+
 
+def report(result):
+    for beacon, cal in result.items():
+        samples = cal["samples"]
+        if samples < 5:
+            print(f"[WARN] мало данных для {beacon}: {samples} (лучше >=20)")
+        se = ""
+        if "n_se" in cal:
+            se = f" (±{cal['P_tx_se']:.2f} dBm, n ±{cal['n_se']:.3f})"
+        print(f"{beacon}: P_tx={cal['P_tx']:.2f} dBm, n={cal['n']:.3f}{se}, "
+              f"r2={cal['r2']:.3f}, samples={samples}, method={cal['method']}")
 
-def fit_tx_n(pairs):
-    xs = np.array([math.log10(d) for d, _ in pairs])
-    ys = np.array([rssi for _, rssi in pairs])
-    if len(xs) < 2:
-        return None
-    b, a = np.polyfit(xs, ys, 1)
-    P_tx = float(a)
-    n = float(-b / 10.0)
-    y_pred = a + b * xs
-    residuals = ys - y_pred
-    ss_res = np.sum(residuals**2)
-    ss_tot = np.sum((ys - np.mean(ys))**2)
-    r2 = 1 - ss_res/ss_tot if ss_tot > 0 else 0.0
-    return {"P_tx": P_tx, "n": n, "r2": float(r2), "samples": len(pairs)}
 
 def main():
-    data = load_measurements(INPUT_CSV)
-    result = {}
-    for beacon, pairs in data.items():
-        if len(pairs) < 2:
-            print(f"[ERROR] слишком мало данных для {beacon}: {len(pairs)} (нужно хотя бы 2)")
-            continue
-        elif len(pairs) < 5:
-            print(f"[WARN] мало данных для {beacon}: {len(pairs)} (лучше >=20)")
-        cal = fit_tx_n(pairs)
-        if cal:
-            result[beacon] = cal
-            print(f"{beacon}: P_tx={cal['P_tx']:.2f} dBm, n={cal['n']:.3f}, "
-                  f"r2={cal['r2']:.3f}, samples={cal['samples']}")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default=INPUT_CSV)
+    parser.add_argument("--output", default=OUTPUT_JSON)
+    parser.add_argument("--reservoir", type=int, default=RESERVOIR_SIZE,
+                        help="размер выборки на маяк для робастной переоценки")
+    args = parser.parse_args()
+
+    calibrator = StreamingCalibrator(reservoir_size=args.reservoir)
+    for name, d, rssi in iter_measurements(args.input):
+        calibrator.add(name, d, rssi)
+
+    for beacon, st in calibrator.beacons.items():
+        if st.count < 2:
+            print(f"[ERROR] слишком мало данных для {beacon}: {st.count} (нужно хотя бы 2)")
+
+    result = calibrator.results()
     if not result:
         print("[ERROR] нет данных для сохранения, calibration.json не будет обновлён")
         return
-    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    print("Калибровка сохранена в", OUTPUT_JSON)
+    report(result)
+    calibrator.write_json(args.output)
+    print("Калибровка сохранена в", args.output)
 
 if __name__ == "__main__":
     main()
@@ -3,17 +3,30 @@ import paho.mqtt.client as mqtt
 import json
 import csv
 import argparse
-import time
+import os
+
+from calibrate import report
+from streaming_calibration import StreamingCalibrator
 
 BROKER = "193.106.150.201"
 PORT = 1883
 TOPIC = "beacons/discovered"
 OUTPUT_CSV = "rssi_measurements.csv"
+OUTPUT_JSON = "calibration.json"
+STATE_JSON = "calibration_state.json"
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--distance", type=float, required=True, help="Фактическое расстояние (м) от контроллера до маяков")
+parser.add_argument("--write-interval", type=float, default=5.0, help="Как часто обновлять calibration.json (с)")
+parser.add_argument("--no-raw", action="store_true", help="Не сохранять сырые измерения в CSV")
+parser.add_argument("--reset", action="store_true", help="Начать калибровку заново, забыв прошлые расстояния")
 args = parser.parse_args()
 
+calibrator = StreamingCalibrator()
+raw_file = None
+raw_writer = None
+
+
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
         print("Подключились к брокеру")
@@ -26,24 +39,45 @@ def on_message(client, userdata, msg):
         data = json.loads(msg.payload.decode("utf-8"))
         if "beacons" not in data:
             return
-        with open(OUTPUT_CSV, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            for b in data["beacons"]:
-                writer.writerow([b["name"], args.distance, b["rssi"]])
-        print(f"Сохранили {len(data['beacons'])} измерений при d={args.distance} м")
+        for b in data["beacons"]:
+            calibrator.add(b["name"], args.distance, b["rssi"])
+            if raw_writer is not None:
+                raw_writer.writerow([b["name"], args.distance, b["rssi"]])
+        if calibrator.maybe_write_json(OUTPUT_JSON, args.write_interval) is not None:
+            calibrator.save_state(STATE_JSON)
+            if raw_file is not None:
+                raw_file.flush()
+            total = sum(st.count for st in calibrator.beacons.values())
+            print(f"Калибровка обновлена: {len(calibrator.beacons)} маяков, {total} измерений (d={args.distance} м)")
     except Exception as e:
         print("Ошибка обработки:", e)
 
 def main():
-    with open(OUTPUT_CSV, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["beacon_name", "distance_m", "rssi"])
+    global raw_file, raw_writer
+    if not args.reset and calibrator.load_state(STATE_JSON):
+        print(f"Продолжаем калибровку из {STATE_JSON}")
+
+    if not args.no_raw:
+        new_file = not os.path.exists(OUTPUT_CSV)
+        raw_file = open(OUTPUT_CSV, "a", newline="", encoding="utf-8")
+        raw_writer = csv.writer(raw_file)
+        if new_file:
+            raw_writer.writerow(["beacon_name", "distance_m", "rssi"])
 
     client = mqtt.Client()
     client.on_connect = on_connect
     client.on_message = on_message
     client.connect(BROKER, PORT, 60)
-    client.loop_forever()
+    try:
+        client.loop_forever()
+    except KeyboardInterrupt:
+        client.disconnect()
+    finally:
+        result = calibrator.write_json(OUTPUT_JSON)
+        calibrator.save_state(STATE_JSON)
+        if raw_file is not None:
+            raw_file.close()
+        report(result)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# locator_engine.py — модель RSSI->расстояние с предрасчитанными таблицами калибровки
+# и взвешенный МНК по всем видимым маякам (location_by_three — начальное приближение)
+
+import math
+from operator import itemgetter
+
+import numpy as np
+
+DEFAULT_TX_POWER = -59.0
+DEFAULT_PATHLOSS_EXP = 2.0
+DEFAULT_SIGMA_RSSI = 4.0
+
+MIN_BEACONS = 3
+MAX_ITER = 6
+STEP_EPS = 1e-2
+LM_LAMBDA = 0.1       # начальное демпфирование Левенберга-Марквардта
+LM_UP = 10.0          # шаг не уменьшил невязку: демпфирование сильнее
+LM_DOWN = 0.3         # шаг принят: демпфирование слабее
+MIN_RANGE = 0.1
+MAX_RANGE = 100.0
+BOUNDS_MARGIN = 0.25
+
+
+def normalize_name(name):
+    return str(name).strip().lower()
+
+
+# --- вспомогательные геометрические функции ---
+def dist(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def location_by_three(c1, c2, c3, r1, r2, r3):
+    """
+    Оценка позиции по трём центрам c1,c2,c3 и радиусам r1,r2,r3.
+    Использует простые геометрические эвристики:
+      - если есть пересечения пар кругов — берём средние точки пересечений и усредняем;
+      - если пересечений нет, но есть перекрытия пар — берём смещённые точки вдоль векторов центров;
+      - если вообще нет перекрытий — используем взвешенный по 1/r центроид.
+    Возвращает [x, y] или None.
+    """
+    # расстояния между центрами
+    d12 = dist(c1, c2)
+    d13 = dist(c1, c3)
+    d23 = dist(c2, c3)
+
+    overlap12 = d12 < (r1 + r2)
+    overlap13 = d13 < (r1 + r3)
+    overlap23 = d23 < (r2 + r3)
+
+    count = int(overlap12) + int(overlap13) + int(overlap23)
+
+    def unit_vec(a, b):
+        dx = b[0] - a[0]
+        dy = b[1] - a[1]
+        mag = math.hypot(dx, dy)
+        if mag == 0:
+            return (0.0, 0.0)
+        return (dx / mag, dy / mag)
+
+    def avg_point(pts):
+        if not pts:
+            return None
+        sx = sum(p[0] for p in pts)
+        sy = sum(p[1] for p in pts)
+        n = len(pts)
+        return (sx / n, sy / n)
+
+    # helper: средняя точка пересечения двух окружностей (усреднение двух пересечений)
+    def mid_of_circle_intersection(a, b, ra, rb):
+        from math import sqrt
+        x0, y0 = a
+        x1, y1 = b
+        dx = x1 - x0
+        dy = y1 - y0
+        d = math.hypot(dx, dy)
+        if d == 0:
+            return None
+        # проверяем наличие пересечения
+        if d > (ra + rb) or d < abs(ra - rb):
+            return None
+        # расстояние от a до линии, проходящей через точки пересечения
+        a_len = (ra * ra - rb * rb + d * d) / (2 * d)
+        h2 = max(0.0, ra * ra - a_len * a_len)
+        xm = x0 + a_len * dx / d
+        ym = y0 + a_len * dy / d
+        if h2 == 0:
+            return (xm, ym)
+        h = sqrt(h2)
+        rx = -dy * (h / d)
+        ry = dx * (h / d)
+        p1 = (xm + rx, ym + ry)
+        p2 = (xm - rx, ym - ry)
+        # возвращаем усреднённую точку пересечения
+        return ((p1[0] + p2[0]) / 2.0, (p1[1] + p2[1]) / 2.0)
+
+    # 1) если все три пары перекрываются — используем точки, смещённые от центров (по радиусу) и усреднение
+    if count == 3:
+        u12 = unit_vec(c1, c2)
+        u13 = unit_vec(c1, c3)
+        u23 = unit_vec(c2, c3)
+        c12 = (c1[0] + r1 * u12[0], c1[1] + r1 * u12[1])
+        c13 = (c1[0] + r1 * u13[0], c1[1] + r1 * u13[1])
+        c32 = (c2[0] + r2 * u23[0], c2[1] + r2 * u23[1])
+        to13 = (c13[0] - c12[0], c13[1] - c12[1])
+        to32 = (c32[0] - c12[0], c32[1] - c12[1])
+        centrevec = (2.0 / 3.0 * (to13[0] + to32[0]), 2.0 / 3.0 * (to13[1] + to32[1]))
+        return [round(centrevec[0] + c12[0], 6), round(centrevec[1] + c12[1], 6)]
+
+    # 2) если есть хотя бы одна пара пересечения (точки пересечения), усредняем найденные midpoints
+    midpoints = []
+    m12 = mid_of_circle_intersection(c1, c2, r1, r2)
+    if m12:
+        midpoints.append(m12)
+    m13 = mid_of_circle_intersection(c1, c3, r1, r3)
+    if m13:
+        midpoints.append(m13)
+    m23 = mid_of_circle_intersection(c2, c3, r2, r3)
+    if m23:
+        midpoints.append(m23)
+    if midpoints:
+        p = avg_point(midpoints)
+        return [round(p[0], 6), round(p[1], 6)]
+
+    # 3) если нет пересечений, но есть пары, которые перекрываются (count == 1 or 2)
+    if count in (1, 2):
+        pts = []
+        pairs = [
+            (c1, c2, r1, r2, d12),
+            (c1, c3, r1, r3, d13),
+            (c2, c3, r2, r3, d23),
+        ]
+        for (ca, cb, ra, rb, dab) in pairs:
+            if dab < (ra + rb):
+                # точка вдоль вектора от ca к cb, смещённая пропорционально радиусам
+                if ra + rb == 0:
+                    t = 0.5
+                else:
+                    t = ra / (ra + rb)
+                pts.append((ca[0] + t * (cb[0] - ca[0]), ca[1] + t * (cb[1] - ca[1])))
+        if pts:
+            p = avg_point(pts)
+            return [round(p[0], 6), round(p[1], 6)]
+        # если count == 2, но по какой-то причине pts пуст — падём к следующему блоку
+
+    # 4) нет пересечений и нет перекрытий — используем взвешенный центроид центров (вес ~ 1/r)
+    centers = [c1, c2, c3]
+    radii = [r1, r2, r3]
+    weights = []
+    for r in radii:
+        if r <= 0 or not (r == r):  # защита от нуля/NaN
+            weights.append(1.0)
+        else:
+            weights.append(1.0 / r)
+    wsum = sum(weights)
+    if wsum == 0:
+        return None
+    cx = sum(w * c[0] for w, c in zip(weights, centers)) / wsum
+    cy = sum(w * c[1] for w, c in zip(weights, centers)) / wsum
+    return [round(cx, 6), round(cy, 6)]
+
+
+class LocatorEngine:
+    """
+    Хранит маяки и калибровку в виде массивов, индексированных один раз:
+      - names_index: нормализованное имя -> индекс;
+      - coords (N, 2), p_tx (N,), n (N,) — параметры по индексу;
+      - params — те же параметры кортежами обычных float для расчёта.
+    Имена нормализуются при загрузке, поэтому на сообщение приходится один
+    dict-lookup на маяк вместо линейного поиска и разбора calibration.
+    Маяков в сообщении обычно до десятка, и на таких размерах расчёт на
+    скалярах быстрее вызовов NumPy, поэтому сообщение целиком считается
+    без массивов.
+    """
+
+    def __init__(self, beacons, calibration=None, sigma_rssi=DEFAULT_SIGMA_RSSI):
+        calibration = calibration or {}
+        cal_by_name = {normalize_name(k): v for k, v in calibration.items()}
+
+        self.names = list(beacons)
+        self.names_index = {}
+        self.coords = np.zeros((len(self.names), 2))
+        self.p_tx = np.full(len(self.names), DEFAULT_TX_POWER)
+        self.n = np.full(len(self.names), DEFAULT_PATHLOSS_EXP)
+        self.sigma_rssi = float(sigma_rssi)
+
+        for i, name in enumerate(self.names):
+            self.names_index[name] = i
+            self.names_index.setdefault(normalize_name(name), i)
+            self.coords[i] = beacons[name]
+            cal = cal_by_name.get(normalize_name(name))
+            if not cal:
+                continue
+            try:
+                p_tx = float(cal.get("P_tx", DEFAULT_TX_POWER))
+                n = float(cal.get("n", DEFAULT_PATHLOSS_EXP))
+            except (TypeError, ValueError):
+                continue
+            self.p_tx[i] = p_tx
+            self.n[i] = n if n > 0 else DEFAULT_PATHLOSS_EXP
+
+        # (x, y, P_tx, 10 * n) по индексу маяка
+        self.params = [(float(x), float(y), float(p_tx), 10.0 * float(n))
+                       for (x, y), p_tx, n in zip(self.coords, self.p_tx, self.n)]
+
+        # решение ищем в прямоугольнике маяков с запасом
+        if len(self.names):
+            lo = self.coords.min(axis=0)
+            hi = self.coords.max(axis=0)
+            margin = max(float((hi - lo).max()) * BOUNDS_MARGIN, 1.0)
+            self.bounds_lo = (float(lo[0]) - margin, float(lo[1]) - margin)
+            self.bounds_hi = (float(hi[0]) + margin, float(hi[1]) + margin)
+        else:
+            self.bounds_lo = (-math.inf, -math.inf)
+            self.bounds_hi = (math.inf, math.inf)
+
+    def index_of(self, name):
+        """Индекс маяка по имени (без учёта регистра) или None"""
+        i = self.names_index.get(name)
+        if i is None:
+            i = self.names_index.get(normalize_name(name))
+        return i
+
+    def rows(self, measurements):
+        """
+        dict name->rssi -> [(rssi, x, y, d, w), ...] для известных маяков:
+        расстояние по логарифмической модели и вес 1 / var(d), где
+        sigma(d) = d * ln10 * sigma_rssi / (10 * n).
+        """
+        rows = []
+        sigma_k = math.log(10) * self.sigma_rssi
+        for name, value in measurements.items():
+            i = self.index_of(name)
+            if i is None:
+                continue
+            try:
+                rssi = float(value)
+            except (TypeError, ValueError):
+                continue
+            x, y, p_tx, ten_n = self.params[i]
+            exp = min(max((p_tx - rssi) / ten_n, -3.0), 3.0)
+            d = min(max(10.0 ** exp, MIN_RANGE), MAX_RANGE)
+            sigma_d = max(d * sigma_k / ten_n, 1e-3)
+            rows.append((rssi, x, y, d, 1.0 / (sigma_d * sigma_d)))
+        return rows
+
+    def initial_guess(self, rows):
+        """location_by_three по трём сильнейшим маякам"""
+        top = sorted(rows, key=itemgetter(0), reverse=True)[:3]
+        (_, x1, y1, r1, _), (_, x2, y2, r2, _), (_, x3, y3, r3, _) = top
+        p = location_by_three((x1, y1), (x2, y2), (x3, y3), r1, r2, r3)
+        if p is None:
+            return (x1 + x2 + x3) / 3.0, (y1 + y2 + y3) / 3.0
+        return float(p[0]), float(p[1])
+
+    def solve(self, rows):
+        """
+        Взвешенный МНК по всем видимым маякам, шаги Левенберга-Марквардта.
+        rows - результат rows(); остаток r_i = |p - c_i| - d_i с весом w_i.
+
+        Нормальные уравнения 2x2 копятся за один проход вместе с невязкой и
+        решаются явно. Не больше MAX_ITER итераций; шаг, который не уменьшил
+        невязку, не принимается, а демпфирование растёт.
+        Возвращает [x, y] или None.
+        """
+        if len(rows) < MIN_BEACONS:
+            return None
+        px, py = self.initial_guess(rows)
+        (lo_x, lo_y), (hi_x, hi_y) = self.bounds_lo, self.bounds_hi
+        hypot = math.hypot
+
+        def normal_equations(x, y):
+            """Невязка и нормальные уравнения 2x2 в точке (x, y) за один проход"""
+            cost = h00 = h01 = h11 = g0 = g1 = 0.0
+            for _, xi, yi, di, wi in rows:
+                dx = x - xi
+                dy = y - yi
+                r_est = hypot(dx, dy)
+                if r_est < 1e-6:
+                    r_est = 1e-6
+                res = di - r_est
+                jx = dx / r_est
+                jy = dy / r_est
+                wjx = wi * jx
+                wjy = wi * jy
+                cost += wi * res * res
+                h00 += wjx * jx
+                h01 += wjx * jy
+                h11 += wjy * jy
+                g0 += wjx * res
+                g1 += wjy * res
+            return cost, h00, h01, h11, g0, g1
+
+        cost, h00, h01, h11, g0, g1 = normal_equations(px, py)
+        lam = LM_LAMBDA
+        for _ in range(MAX_ITER):
+            a00 = h00 * (1.0 + lam)
+            a11 = h11 * (1.0 + lam)
+            det = a00 * a11 - h01 * h01
+            if abs(det) < 1e-12:
+                break
+            nx = min(max(px + (a11 * g0 - h01 * g1) / det, lo_x), hi_x)
+            ny = min(max(py + (a00 * g1 - h01 * g0) / det, lo_y), hi_y)
+            trial = normal_equations(nx, ny)
+            if trial[0] >= cost:
+                lam *= LM_UP
+                continue
+            lam *= LM_DOWN
+            moved = math.hypot(nx - px, ny - py)
+            px, py = nx, ny
+            cost, h00, h01, h11, g0, g1 = trial
+            if moved < STEP_EPS:
+                break
+        if not (math.isfinite(px) and math.isfinite(py)):
+            return None
+        return [round(px, 6), round(py, 6)]
+
+    def locate(self, measurements):
+        """dict name->rssi -> [x, y] или None"""
+        return self.solve(self.rows(measurements))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# path_writer.py — буферизованная запись маршрутов по устройствам
+#
+# Для каждого устройства держим открытый файл с буфером, строки пишутся в память,
+# на диск — по таймеру (flush_interval) или при переполнении буфера. Устройство
+# по умолчанию пишет в исходный путь (standart.path), остальные — в каталог
+# devices_dir (по умолчанию рядом с исходным путём), в <имя>_<устройство>.path.
+#
+# Идентификатор устройства приходит извне, поэтому открытых файлов не больше
+# max_open: давно не писавшиеся закрываются (LRU) и при следующей записи
+# открываются заново в режиме дозаписи.
+
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+DEFAULT_DEVICE = "default"
+FLUSH_INTERVAL = 1.0
+BUFFER_SIZE = 64 * 1024
+MAX_OPEN_FILES = 64
+
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def safe_device_name(device):
+    """Имя устройства для файла; если пришлось заменять символы, добавляется
+    crc32 исходного имени, чтобы "a/b" и "a_b" не попали в один файл"""
+    device = str(device)
+    name = _SAFE_RE.sub("_", device).strip("._") or DEFAULT_DEVICE
+    if name != device:
+        name = f"{name}-{zlib.crc32(device.encode('utf-8')):08x}"
+    return name
+
+
+class PathWriter:
+    def __init__(self, base_path, devices_dir=None, flush_interval=FLUSH_INTERVAL,
+                 buffer_size=BUFFER_SIZE, max_open=MAX_OPEN_FILES):
+        self.base_path = base_path
+        self.devices_dir = devices_dir or os.path.dirname(base_path)
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.max_open = max(1, max_open)
+        self._files = OrderedDict()  # абсолютный путь -> файл, от давних к свежим
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def path_for(self, device):
+        if device == DEFAULT_DEVICE:
+            return os.path.abspath(self.base_path)
+        stem, ext = os.path.splitext(os.path.basename(self.base_path))
+        name = f"{stem}_{safe_device_name(device)}{ext or '.path'}"
+        return os.path.abspath(os.path.join(self.devices_dir, name))
+
+    def _file(self, device):
+        path = self.path_for(device)
+        f = self._files.get(path)
+        if f is not None:
+            self._files.move_to_end(path)
+            return f
+        while len(self._files) >= self.max_open:
+            _, old = self._files.popitem(last=False)
+            old.close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = open(path, "a", encoding="utf-8", buffering=self.buffer_size)
+        self._files[path] = f
+        return f
+
+    def write(self, device, x, y):
+        line = f"{x:.3f};{y:.3f}\n"
+        with self._lock:
+            self._file(device).write(line)
+
+    def flush(self):
+        with self._lock:
+            for f in self._files.values():
+                f.flush()
+
+    def open_files(self):
+        with self._lock:
+            return list(self._files)
+
+    def start(self):
+        """Фоновый поток, сбрасывающий буферы раз в flush_interval секунд"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._flush_loop, name="path-writer", daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print("Ошибка записи маршрута:", e)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+
+class LatestPositions:
+    """Последняя позиция каждого устройства в памяти (для HTTP API)"""
+
+    def __init__(self):
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def update(self, device, x, y, beacons=0, ts=None):
+        entry = {
+            "device": device,
+            "x": x,
+            "y": y,
+            "beacons": beacons,
+            "ts": time.time() if ts is None else ts,
+        }
+        with self._lock:
+            prev = self._positions.get(device)
+            entry["count"] = prev["count"] + 1 if prev else 1
+            self._positions[device] = entry
+
+    def get(self, device):
+        with self._lock:
+            entry = self._positions.get(device)
+            return dict(entry) if entry else None
+
+    def snapshot(self):
+        with self._lock:
+            return {k: dict(v) for k, v in self._positions.items()}
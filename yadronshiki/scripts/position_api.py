@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# position_api.py — HTTP API с последними позициями устройств из памяти
+#
+#   GET /positions           -> {"device": {"x": .., "y": .., "ts": .., ...}, ...}
+#   GET /positions/<device>  -> {"x": .., "y": .., "ts": .., ...} или 404
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+def make_handler(positions):
+    class PositionHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path == "/positions":
+                self._send(200, positions.snapshot())
+            elif path.startswith("/positions/"):
+                entry = positions.get(unquote(path[len("/positions/"):]))
+                if entry is None:
+                    self._send(404, {"error": "device not found"})
+                else:
+                    self._send(200, entry)
+            else:
+                self._send(404, {"error": "not found"})
+
+        def _send(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PositionHandler
+
+
+def serve_positions(positions, host="0.0.0.0", port=8080):
+    """Запускает HTTP-сервер в фоновом потоке и возвращает его"""
+    server = ThreadingHTTPServer((host, port), make_handler(positions))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="position-api", daemon=True)
+    thread.start()
+    print(f"HTTP API позиций: http://{host}:{port}/positions")
+    return server
@@ -0,0 +1,194 @@
+# streaming_calibration.py
+# Потоковая калибровка модели RSSI = P_tx - 10 * n * log10(d) по маякам.
+#
+# На каждый маяк храним только:
+#   - достаточную статистику для МНК по x = log10(d), y = rssi
+#     (счётчик, средние и ко-моменты по Уэлфорду — устойчиво на миллионах точек);
+#   - резервуарную выборку фиксированного размера для робастной (Huber) переоценки.
+# Память — O(число маяков), итоговый расчёт не зависит от длины сессии.
+
+import json
+import math
+import os
+import random
+import time
+
+import numpy as np
+
+RESERVOIR_SIZE = 1000
+HUBER_K = 1.345
+HUBER_ITERS = 20
+MIN_SAMPLES = 2
+
+
+class BeaconStats:
+    def __init__(self, reservoir_size=RESERVOIR_SIZE, rng=None):
+        self.count = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.cxx = 0.0
+        self.cxy = 0.0
+        self.cyy = 0.0
+        self.reservoir_size = reservoir_size
+        self.reservoir = []
+        self.rng = rng or random.Random()
+
+    def add(self, d, rssi):
+        if d <= 0:
+            return
+        x = math.log10(d)
+        y = float(rssi)
+        self.count += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / self.count
+        self.mean_y += dy / self.count
+        self.cxx += dx * (x - self.mean_x)
+        self.cxy += dx * (y - self.mean_y)
+        self.cyy += dy * (y - self.mean_y)
+
+        # Algorithm R
+        if len(self.reservoir) < self.reservoir_size:
+            self.reservoir.append((x, y))
+        else:
+            j = self.rng.randrange(self.count)
+            if j < self.reservoir_size:
+                self.reservoir[j] = (x, y)
+
+    def fit_ols(self):
+        """МНК по накопленной статистике: P_tx, n, r2 и стандартные ошибки"""
+        if self.count < MIN_SAMPLES or self.cxx <= 0:
+            return None
+        b = self.cxy / self.cxx
+        a = self.mean_y - b * self.mean_x
+        ss_res = max(self.cyy - b * self.cxy, 0.0)
+        r2 = 1.0 - ss_res / self.cyy if self.cyy > 0 else 0.0
+        res = {"P_tx": a, "n": -b / 10.0, "r2": r2, "samples": self.count}
+        if self.count > 2:
+            s2 = ss_res / (self.count - 2)
+            res["P_tx_se"] = math.sqrt(s2 * (1.0 / self.count + self.mean_x ** 2 / self.cxx))
+            res["n_se"] = math.sqrt(s2 / self.cxx) / 10.0
+        return res
+
+    def fit_huber(self):
+        """Huber IRLS по резервуару; None, если разброса по расстоянию нет"""
+        if len(self.reservoir) < MIN_SAMPLES:
+            return None
+        xy = np.asarray(self.reservoir, dtype=float)
+        x, y = xy[:, 0], xy[:, 1]
+        if np.ptp(x) <= 0:
+            return None
+        X = np.column_stack([np.ones_like(x), x])
+        w = np.ones_like(x)
+        coef = np.zeros(2)
+        for _ in range(HUBER_ITERS):
+            sw = np.sqrt(w)
+            new_coef, *_ = np.linalg.lstsq(X * sw[:, None], y * sw, rcond=None)
+            r = y - X @ new_coef
+            scale = np.median(np.abs(r - np.median(r))) / 0.6745
+            if scale <= 1e-9:
+                coef = new_coef
+                break
+            u = np.abs(r) / (HUBER_K * scale)
+            w = np.where(u <= 1.0, 1.0, 1.0 / np.maximum(u, 1e-12))
+            if np.allclose(new_coef, coef, atol=1e-6):
+                coef = new_coef
+                break
+            coef = new_coef
+        a, b = float(coef[0]), float(coef[1])
+        r = y - (a + b * x)
+        ss_tot = float(np.sum((y - y.mean()) ** 2))
+        r2 = 1.0 - float(np.sum(r ** 2)) / ss_tot if ss_tot > 0 else 0.0
+        inliers = float(np.mean(w >= 1.0))
+        return {"P_tx": a, "n": -b / 10.0, "r2": r2, "inliers": inliers, "reservoir": len(x)}
+
+    def result(self):
+        """Итог для calibration.json: робастная оценка, если есть, иначе МНК"""
+        ols = self.fit_ols()
+        if ols is None:
+            return None
+        huber = self.fit_huber()
+        res = dict(ols)
+        res["method"] = "ols"
+        if huber is not None and huber["n"] > 0:
+            res.update({"P_tx": huber["P_tx"], "n": huber["n"], "r2": huber["r2"], "method": "huber"})
+            res["huber"] = huber
+            res["ols"] = {"P_tx": ols["P_tx"], "n": ols["n"], "r2": ols["r2"]}
+        return res
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_x": self.mean_x,
+            "mean_y": self.mean_y,
+            "cxx": self.cxx,
+            "cxy": self.cxy,
+            "cyy": self.cyy,
+            "reservoir": self.reservoir,
+        }
+
+    @classmethod
+    def from_dict(cls, data, reservoir_size=RESERVOIR_SIZE, rng=None):
+        st = cls(reservoir_size, rng)
+        st.count = int(data["count"])
+        st.mean_x = float(data["mean_x"])
+        st.mean_y = float(data["mean_y"])
+        st.cxx = float(data["cxx"])
+        st.cxy = float(data["cxy"])
+        st.cyy = float(data["cyy"])
+        st.reservoir = [tuple(p) for p in data.get("reservoir", [])][:reservoir_size]
+        return st
+
+
+class StreamingCalibrator:
+    def __init__(self, reservoir_size=RESERVOIR_SIZE, seed=None):
+        self.reservoir_size = reservoir_size
+        self.rng = random.Random(seed)
+        self.beacons = {}
+        self._last_write = 0.0
+
+    def add(self, beacon, d, rssi):
+        st = self.beacons.get(beacon)
+        if st is None:
+            st = self.beacons[beacon] = BeaconStats(self.reservoir_size, self.rng)
+        st.add(d, rssi)
+
+    def results(self):
+        res = {}
+        for name, st in self.beacons.items():
+            cal = st.result()
+            if cal is not None:
+                res[name] = cal
+        return res
+
+    def write_json(self, path):
+        """Атомарно перезаписывает calibration.json; возвращает результаты"""
+        res = self.results()
+        if res:
+            _atomic_write_json(path, res)
+        self._last_write = time.monotonic()
+        return res
+
+    def maybe_write_json(self, path, interval):
+        if time.monotonic() - self._last_write >= interval:
+            return self.write_json(path)
+        return None
+
+    def save_state(self, path):
+        _atomic_write_json(path, {name: st.to_dict() for name, st in self.beacons.items()})
+
+    def load_state(self, path):
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for name, st in data.items():
+            self.beacons[name] = BeaconStats.from_dict(st, self.reservoir_size, self.rng)
+        return True
+
+
+def _atomic_write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)